@@ -1,29 +1,86 @@
+import asyncio
+import math
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from pydantic import ValidationError
 
 from app.core.config import settings
+from app.core.rate_limit import RateLimiter
+from app.core.security import TokenCache
 from app.crud.user import get_user
 from app.schemas.token import TokenData
+from app.rag.concurrency import check_admission, current_tenant
+from app.rag.llm_factory import get_llm_router
 from app.schemas.user import User
+from app.utils.timing import stage
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/auth/token"
 )
 
-def get_current_user(token: str = Depends(reusable_oauth2)) -> User:
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        token_data = TokenData(**payload)
-    except (jwt.JWTError, ValidationError):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Could not validate credentials",
-        )
-    user = get_user(username=token_data.sub)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+# Users of recently verified tokens, so repeated requests skip decoding and the user lookup
+_user_cache: TokenCache[User] = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL_SECONDS)
+
+_rate_limiter = RateLimiter(settings.RATE_LIMIT_PER_MINUTE, settings.RATE_LIMIT_BURST)
+
+async def get_current_user(token: str = Depends(reusable_oauth2)) -> User:
+    with stage("auth"):
+        key = TokenCache.key(token)
+        user = _user_cache.get(key)
+        if user is not None:
+            return user
+
+        try:
+            payload = jwt.decode(
+                token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+            )
+            token_data = TokenData(**payload)
+        except (jwt.JWTError, ValidationError):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Could not validate credentials",
+            )
+        # The user store may block; keep it off the event loop
+        user_in_db = await asyncio.to_thread(get_user, username=token_data.sub)
+        if not user_in_db:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        user = User.model_validate(user_in_db, from_attributes=True)
+        _user_cache.set(key, user, payload.get("exp"))
+        return user
+
+def max_batch_items() -> int:
+    """Questions one batch may hold: no more than a full token bucket can pay for."""
+    if settings.RATE_LIMIT_ENABLED:
+        return min(settings.BATCH_MAX_ITEMS, settings.RATE_LIMIT_BURST)
+    return settings.BATCH_MAX_ITEMS
+
+async def get_admitted_user(current_user: User = Depends(get_current_user)) -> User:
+    """
+    The current user, once their request passes admission control for the LLM:
+    their token bucket must have a token left and at least one provider must
+    have room in its queue for them. Otherwise the request fails at once with
+    429 and a Retry-After header instead of waiting for a slot.
+
+    Buckets and queues live in each worker process, so with N workers a user
+    can get up to N times the configured rate and queue depth.
+    """
+    return admit_user(current_user)
+
+def admit_user(current_user: User, cost: int = 1) -> User:
+    """Admission control of get_admitted_user for a request making cost LLM generations."""
+    if settings.RATE_LIMIT_ENABLED:
+        retry_after = _rate_limiter.acquire(current_user.username, cost)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+    # The providers the router actually built; a fallback without credentials is left out of it
+    check_admission(current_user.username, get_llm_router().providers)
+    # LLM calls made for this request queue under the user's share of each provider
+    current_tenant.set(current_user.username)
+    return current_user
@@ -6,16 +6,16 @@ from fastapi.security import OAuth2PasswordRequestForm
 from app.core.security import create_access_token
 from app.core.config import settings
 from app.schemas.token import Token
-from app.crud.user import authenticate_user
+from app.crud.user import aauthenticate_user
 
 router = APIRouter()
 
 @router.post("/token", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await aauthenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
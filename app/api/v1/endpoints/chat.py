@@ -1,36 +1,105 @@
-from fastapi import APIRouter, Depends
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
 from app.api import deps
 from app.schemas.user import User
-from app.schemas.chat import ChatRequest, ChatResponse, DeliaRequest, DeliaResponse
-from app.rag.chain import get_rag_chain, query_delia
+from app.core.config import settings
+from app.schemas.chat import ChatRequest, ChatResponse, DeliaBatchRequest, DeliaRequest, DeliaResponse
+from app.rag.chain import query_general, query_delia, astream_general, astream_delia
+from app.rag.batch import BatchItem, abatch_delia
+from app.utils.streaming import STREAM_MEDIA_TYPES, encode_events, encode_jsonl, start_stream
 
 router = APIRouter()
 
+# Headers that keep proxies from buffering the event stream
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
 @router.post("/", response_model=ChatResponse)
-def chat_endpoint(
+async def chat_endpoint(
     request: ChatRequest,
-    current_user: User = Depends(deps.get_current_user)
+    current_user: User = Depends(deps.get_admitted_user)
 ):
     """
     General chat endpoint to interact with the RAG chain.
     This endpoint maintains backward compatibility and provides general RAG functionality.
     """
-    chain = get_rag_chain()
-    answer = chain.invoke(request.question)
+    answer = await query_general(request.question)
     return {"answer": answer}
 
 @router.post("/delia", response_model=DeliaResponse)
-def delia_endpoint(
+async def delia_endpoint(
     request: DeliaRequest,
-    current_user: User = Depends(deps.get_current_user)
+    current_user: User = Depends(deps.get_admitted_user)
 ):
     """
     DELIA-specific endpoint for EDSL PowerCurve™ expert assistance.
     This endpoint provides specialized EDSL validation, correction, and guidance.
     """
-    result = query_delia(
+    result = await query_delia(
         question=request.question,
         user_level=request.user_level
     )
     return DeliaResponse(**result)
+
+@router.post("/stream")
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    format: Literal["sse", "ndjson"] = Query("sse"),
+    current_user: User = Depends(deps.get_admitted_user)
+):
+    """
+    Streaming version of the general chat endpoint.
+    Tokens are sent as they are generated, as Server-Sent Events or NDJSON.
+    """
+    events = await start_stream(astream_general(request.question))
+    return StreamingResponse(
+        encode_events(events, format),
+        media_type=STREAM_MEDIA_TYPES[format],
+        headers=STREAM_HEADERS,
+    )
+
+@router.post("/delia/stream")
+async def delia_stream_endpoint(
+    request: DeliaRequest,
+    format: Literal["sse", "ndjson"] = Query("sse"),
+    current_user: User = Depends(deps.get_admitted_user)
+):
+    """
+    Streaming version of the DELIA endpoint.
+    Sends "token" events while generating, a "code_block" event with its validation
+    as each EDSL block closes, and trailing "validation" and "done" events.
+    """
+    events = await start_stream(astream_delia(request.question, request.user_level))
+    return StreamingResponse(
+        encode_events(events, format),
+        media_type=STREAM_MEDIA_TYPES[format],
+        headers=STREAM_HEADERS,
+    )
+
+@router.post("/delia/batch")
+async def delia_batch_endpoint(
+    request: DeliaBatchRequest,
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Answers a list of DELIA questions in one call, for regression sets and bulk evaluation.
+    Results are streamed as JSON lines in completion order, each with the index and id of
+    its question, the DeliaResponse fields, a per-item error and per-stage timings.
+    Every question takes a token from the user's rate limit bucket.
+    """
+    if not request.items:
+        raise HTTPException(status_code=422, detail="The batch has no questions")
+    max_items = deps.max_batch_items()
+    if len(request.items) > max_items:
+        raise HTTPException(status_code=413, detail=f"A batch holds at most {max_items} questions")
+    deps.admit_user(current_user, len(request.items))
+
+    items = [BatchItem(question=i.question, user_level=i.user_level, id=i.id) for i in request.items]
+    max_concurrency = min(request.max_concurrency or settings.BATCH_MAX_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY)
+    return StreamingResponse(
+        encode_jsonl(abatch_delia(items, max_concurrency)),
+        media_type=STREAM_MEDIA_TYPES["ndjson"],
+        headers=STREAM_HEADERS,
+    )
@@ -1,74 +1,135 @@
+import logging
 import os
 import shutil
+import uuid
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Response
 
 from app.api import deps
 from app.schemas.user import User
-from app.rag.loader import load_document
-from app.rag.chunking import chunk_documents
-from app.db.vector_store import get_vector_store
-from typing import List
+from app.rag.ingestion import JobQueueFullError, get_job_manager
+from app.rag.pipeline import expand_archive, is_supported
+from app.db.catalog import get_catalog
+from app.db.vector_store import bump_corpus_version, reset_collection
+from typing import List, Optional
 from app.schemas.document_info import DatabaseStats
+from app.schemas.ingestion import IngestionJobAccepted, IngestionJobStatus
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.post("/upload")
+@router.post("/upload", response_model=IngestionJobAccepted, status_code=202)
 def upload_document(
     file: UploadFile = File(...),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
-    Upload a document, process it, and store it in the vector database.
+    Upload a document and queue it for processing.
+    Parsing, chunking, embedding and storage happen in the background;
+    use the returned job id with /documents/jobs/{job_id} to follow progress.
     """
     # Validate file
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file selected")
+    if not is_supported(file.filename):
+        raise HTTPException(status_code=400, detail=f"Unsupported file: {file.filename}")
     
     # Create a temporary directory
     temp_dir = Path("temp_docs")
     temp_dir.mkdir(exist_ok=True)
     
     # Create unique temporary file path
-    import uuid
     unique_filename = f"{uuid.uuid4()}_{file.filename}"
     temp_file_path = temp_dir / unique_filename
 
     try:
-        # Save the uploaded file temporarily
+        # Save the uploaded file temporarily; the job removes it once processed
         with temp_file_path.open("wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
 
-        # 1. Load the document
-        docs = load_document(str(temp_file_path))
-        if not docs:
-            raise HTTPException(status_code=400, detail="Could not load document.")
+        job = get_job_manager().submit([(str(temp_file_path), file.filename)])
+
+    except JobQueueFullError as e:
+        os.remove(temp_file_path)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    except Exception as e:
+        logger.error(f"Error queuing file {file.filename}: {e}")
+        if temp_file_path.exists():
+            os.remove(temp_file_path)
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+    return IngestionJobAccepted(
+        job_id=job.id,
+        status=job.status,
+        message=f"Document '{file.filename}' queued for processing.",
+    )
+
+@router.post("/upload/bulk", response_model=IngestionJobAccepted, status_code=202)
+def upload_documents_bulk(
+    files: List[UploadFile] = File(...),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Upload many documents, or zip archives of documents, as a single ingestion job.
+    Files go through a pipeline where parsing, chunking, embedding and storage
+    of different files overlap. Unsupported files inside archives are skipped.
+    """
+    temp_dir = Path("temp_docs") / uuid.uuid4().hex
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    queued = []
+
+    try:
+        for upload in files:
+            if not upload.filename:
+                continue
+            temp_file_path = temp_dir / f"{len(queued)}_{os.path.basename(upload.filename)}"
+            with temp_file_path.open("wb") as buffer:
+                shutil.copyfileobj(upload.file, buffer)
 
-        # 2. Chunk the document
-        chunks = chunk_documents(docs)
+            if upload.filename.lower().endswith(".zip"):
+                queued.extend(expand_archive(str(temp_file_path), str(temp_dir / temp_file_path.stem)))
+                os.remove(temp_file_path)
+            elif is_supported(upload.filename):
+                queued.append((str(temp_file_path), upload.filename))
+            else:
+                raise HTTPException(status_code=400, detail=f"Unsupported file: {upload.filename}")
 
-        # 3. Store in vector database
-        vector_store = get_vector_store()
-        vector_store.add_documents(chunks)
+        if not queued:
+            raise HTTPException(status_code=400, detail="No supported documents found")
 
-        return {"message": f"Document '{file.filename}' uploaded and processed successfully."}
+        job = get_job_manager().submit(queued, name=f"{len(queued)} files", temp_dir=str(temp_dir))
 
     except HTTPException:
-        # Re-raise HTTP exceptions
+        shutil.rmtree(temp_dir, ignore_errors=True)
         raise
+    except JobQueueFullError as e:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
     except Exception as e:
-        # Log the error and raise HTTP exception
-        print(f"Error processing file {file.filename}: {e}")
+        logger.error(f"Error queuing bulk upload: {e}")
+        shutil.rmtree(temp_dir, ignore_errors=True)
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
-    finally:
-        # Clean up the temporary file
-        try:
-            if temp_file_path.exists() and temp_file_path.is_file():
-                os.remove(temp_file_path)
-        except Exception as cleanup_error:
-            print(f"Warning: Could not clean up temporary file {temp_file_path}: {cleanup_error}")
+    return IngestionJobAccepted(
+        job_id=job.id,
+        status=job.status,
+        message=f"{len(queued)} documents queued for processing.",
+    )
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobStatus)
+def get_ingestion_job(
+    job_id: str,
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Get the status and progress of a document ingestion job.
+    """
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return IngestionJobStatus(**job.to_dict())
 
 @router.get("/database/stats", response_model=DatabaseStats)
 def get_database_stats(
@@ -76,36 +137,12 @@ def get_database_stats(
 ):
     """
     Get relevant information about the vector database state.
+    Figures come from the document catalog maintained at ingestion time.
     """
-    vector_store = get_vector_store()
-    
-    # Get the underlying collection from ChromaDB
-    collection = vector_store._collection
-    
-    # Get all documents from the collection
     try:
-        documents = collection.get()
-        total_chunks = len(documents["ids"]) if documents["ids"] else 0
-        
-        # Get embedding dimension if there are any embeddings
-        embedding_dimension = 0
-        if documents["embeddings"] and len(documents["embeddings"]) > 0:
-            embedding_dimension = len(documents["embeddings"][0])
-        
-        # Count unique documents based on metadata source
-        unique_sources = set()
-        if documents["metadatas"]:
-            for metadata in documents["metadatas"]:
-                if metadata and "source" in metadata:
-                    unique_sources.add(metadata["source"])
-        
-        stats = {
-            "total_documents": len(unique_sources),
-            "total_chunks": total_chunks,
-            "embedding_dimension": embedding_dimension,
-        }
+        stats = get_catalog().stats()
     except Exception as e:
-        # Handle empty collection or other errors
+        logger.error(f"Could not read document catalog: {e}")
         stats = {
             "total_documents": 0,
             "total_chunks": 0,
@@ -120,48 +157,37 @@ def clear_database(
 ):
     """
     Clear all documents from the vector database.
+    Queries switch to an empty collection at once; the old one is dropped in the background.
     """
-    vector_store = get_vector_store()
-    
-    # Get the underlying collection and delete all documents
-    collection = vector_store._collection
     try:
-        # Get all document IDs first
-        documents = collection.get()
-        if documents["ids"]:
-            # Delete all documents by their IDs
-            collection.delete(ids=documents["ids"])
+        chunks_removed = reset_collection()
     except Exception as e:
-        # Collection might be empty or not exist
-        pass
+        logger.error(f"Error clearing the vector database: {e}")
+        raise HTTPException(status_code=500, detail=f"Could not clear the vector database: {e}")
+
+    # Forget the manifests so the next upload re-indexes every file
+    get_catalog().clear()
+
+    # Invalidate answers computed against the previous corpus
+    bump_corpus_version()
     
-    return {"message": "Vector database cleared successfully"}
+    return {"message": "Vector database cleared successfully", "chunks_removed": chunks_removed}
 
 @router.get("/list", response_model=List[str])
 def list_documents(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    cursor: Optional[str] = None,
     current_user: User = Depends(deps.get_current_user)
 ):
     """
     List all document names that have been uploaded.
+    With `limit`, results are paginated: pass the `X-Next-Cursor` response
+    header as `cursor` to get the next page.
     """
-    vector_store = get_vector_store()
-    
-    # Get the underlying collection from ChromaDB
-    collection = vector_store._collection
-    document_names = set()
-    
-    try:
-        # Get all documents from the collection
-        documents = collection.get()
-        
-        if documents["metadatas"]:
-            for metadata in documents["metadatas"]:
-                if metadata and "source" in metadata:
-                    # Extract just the filename from the path
-                    filename = os.path.basename(metadata["source"])
-                    document_names.add(filename)
-    except Exception as e:
-        # Handle empty collection or other errors
-        pass
-    
-    return sorted(list(document_names))
+    documents, next_cursor = get_catalog().list_documents(limit=limit, cursor=cursor)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    # Extract just the filename from the source
+    return [os.path.basename(document["source"]) for document in documents]
@@ -0,0 +1,93 @@
+"""
+Batch DELIA questions from the command line, e.g. for nightly regression sets.
+
+Usage:
+    python -m app.cli.batch questions.jsonl --output results.jsonl
+    python -m app.cli.batch requests.jsonl --id-field request_id --question-field body
+    python -m app.cli.batch -q "¿Cómo compruebo si un valor es nulo?" -q "¿Qué es un Data Dictionary?"
+
+Each line of a JSONL file is either a JSON string (the question) or an
+object with the question, an optional id and an optional user_level.
+Questions are answered in-process through the same path as
+/chat/delia/batch, and results are written as JSON lines in completion
+order, each with its per-stage timings and an "error" when it failed.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List, TextIO
+
+from app.core.config import settings
+from app.rag.batch import BatchItem, abatch_delia
+
+
+def load_items(path: Path, question_field: str, id_field: str, user_level: str) -> List[BatchItem]:
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, str):
+                items.append(BatchItem(question=entry, user_level=user_level, id=str(line_number)))
+                continue
+            if question_field not in entry:
+                raise ValueError(f"{path}:{line_number}: no {question_field!r} field")
+            items.append(BatchItem(
+                question=entry[question_field],
+                user_level=entry.get("user_level", user_level),
+                id=str(entry.get(id_field, line_number)),
+            ))
+    return items
+
+
+async def run(items: List[BatchItem], concurrency: int, out: TextIO) -> int:
+    failed = 0
+    async for result in abatch_delia(items, concurrency):
+        failed += bool(result.get("error"))
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+    return failed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Answer a batch of DELIA questions.")
+    parser.add_argument("file", nargs="?", type=Path, help="JSONL file of questions")
+    parser.add_argument("-q", "--question", action="append", default=[], help="A question; may be repeated")
+    parser.add_argument("--question-field", default="question")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--user-level", default="intermediate", help="For questions that don't set their own")
+    parser.add_argument(
+        "--concurrency", type=int, default=settings.BATCH_MAX_CONCURRENCY,
+        help="Questions in flight, capped at LLM_MAX_WAITING_PER_USER",
+    )
+    parser.add_argument("--output", type=Path, help="Write the results here instead of stdout")
+    args = parser.parse_args()
+
+    try:
+        items = load_items(args.file, args.question_field, args.id_field, args.user_level) if args.file else []
+    except (OSError, ValueError) as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    items += [BatchItem(question=q, user_level=args.user_level, id=f"q{n}") for n, q in enumerate(args.question, 1)]
+    if not items:
+        print("No questions given.", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        failed = asyncio.run(run(items, args.concurrency, out))
+    finally:
+        if args.output:
+            out.close()
+
+    print(f"Answered {len(items) - failed}/{len(items)} questions in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return 0 if not failed else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Bulk ingestion from the command line.
+
+Usage:
+    python -m app.cli.ingest manual.pdf glossary.xlsx manuals/ edsl_docs.zip
+
+Directories are scanned recursively and zip archives are expanded. All
+files go through the same pipelined ingestion used by /documents/upload/bulk.
+"""
+import argparse
+import multiprocessing
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+from app.core.config import settings
+from app.db.vector_store import bump_corpus_version
+from app.rag.ingestion import IngestionJob
+from app.rag.pipeline import IngestionPipeline, expand_archive, is_supported
+
+
+def collect_files(paths: List[str], extract_dir: str) -> List[Tuple[str, str]]:
+    """Resolves the command line arguments into (path, display name) pairs."""
+    files = []
+    for raw in paths:
+        path = Path(raw)
+        candidates = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+        for candidate in candidates:
+            if candidate.suffix.lower() == ".zip":
+                files.extend(expand_archive(str(candidate), str(Path(extract_dir) / candidate.stem)))
+            elif is_supported(candidate.name):
+                files.append((str(candidate), candidate.name))
+            elif not path.is_dir():
+                print(f"Skipping unsupported file: {candidate}", file=sys.stderr)
+    return files
+
+
+def report(job: IngestionJob, stop: threading.Event, interval: float) -> None:
+    while not stop.wait(interval):
+        print(
+            f"files {job.files_parsed}/{job.files_total}  pages {job.pages_parsed}  "
+            f"chunks embedded {job.chunks_embedded}/{job.chunks_total}  written {job.chunks_written}",
+            file=sys.stderr,
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Ingest documents into the vector database.")
+    parser.add_argument("paths", nargs="+", help="Files, directories or zip archives")
+    parser.add_argument("--parse-workers", type=int, default=settings.INGEST_PARSE_WORKERS)
+    parser.add_argument("--embed-workers", type=int, default=settings.INGEST_EMBED_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_EMBED_BATCH_SIZE)
+    parser.add_argument("--pages-per-task", type=int, default=settings.INGEST_PDF_PAGES_PER_TASK)
+    parser.add_argument("--progress-interval", type=float, default=2.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as extract_dir:
+        files = collect_files(args.paths, extract_dir)
+        if not files:
+            print("No supported documents found.", file=sys.stderr)
+            return 1
+
+        job = IngestionJob(filename=f"{len(files)} files", file_paths=[], files=files, files_total=len(files))
+        stop = threading.Event()
+        reporter = threading.Thread(target=report, args=(job, stop, args.progress_interval), daemon=True)
+        started = time.perf_counter()
+
+        with ProcessPoolExecutor(
+            max_workers=args.parse_workers, mp_context=multiprocessing.get_context("spawn")
+        ) as parse_pool:
+            pipeline = IngestionPipeline(
+                parse_pool,
+                parse_concurrency=args.parse_workers,
+                embed_batch_size=args.batch_size,
+                embed_workers=args.embed_workers,
+                pages_per_task=args.pages_per_task,
+            )
+            reporter.start()
+            try:
+                pipeline.run(files, job)
+            finally:
+                stop.set()
+                if job.chunks_written or job.chunks_deleted:
+                    bump_corpus_version()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Ingested {job.files_parsed}/{job.files_total} files ({job.files_unchanged} unchanged), "
+        f"{job.pages_parsed} pages, {job.chunks_written} chunks written, {job.chunks_unchanged} unchanged, "
+        f"{job.chunks_deleted} deleted in {elapsed:.1f}s"
+    )
+    for name, error in job.failed_files.items():
+        print(f"Failed: {name}: {error}", file=sys.stderr)
+    return 0 if not job.failed_files else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+User account management from the command line.
+
+Usage:
+    python -m app.cli.users add alice --email alice@example.com --full-name "Alice"
+    python -m app.cli.users delete alice
+    python -m app.cli.users list
+
+Accounts are written to the store configured by USER_STORE_BACKEND. The
+password is read from the terminal, or from stdin with --password-stdin.
+"""
+import argparse
+import getpass
+import sys
+
+from app.crud.user import create_user, delete_user, list_usernames
+from app.schemas.user import UserCreate
+
+
+def read_password(from_stdin: bool) -> str:
+    if from_stdin:
+        return sys.stdin.readline().rstrip("\n")
+    password = getpass.getpass("Password: ")
+    if password != getpass.getpass("Repeat password: "):
+        raise ValueError("Passwords do not match")
+    return password
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Manage the user accounts of the API.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="Create a user, or change the password of an existing one")
+    add.add_argument("username")
+    add.add_argument("--email")
+    add.add_argument("--full-name")
+    add.add_argument("--password-stdin", action="store_true", help="Read the password from stdin")
+
+    delete = commands.add_parser("delete", help="Delete a user")
+    delete.add_argument("username")
+
+    commands.add_parser("list", help="List the usernames")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        try:
+            password = read_password(args.password_stdin)
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        if not password:
+            print("The password cannot be empty.", file=sys.stderr)
+            return 1
+        create_user(UserCreate(username=args.username, email=args.email, full_name=args.full_name, password=password))
+        print(f"Saved user {args.username}")
+    elif args.command == "delete":
+        if not delete_user(args.username):
+            print(f"No such user: {args.username}", file=sys.stderr)
+            return 1
+        print(f"Deleted user {args.username}")
+    else:
+        for username in list_usernames():
+            print(username)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,22 +13,131 @@ class Settings(BaseSettings):
     BACKEND_CORS_ORIGINS: list[str] = ["http://localhost:3000"]
 
     # LLM
-    LLM_PROVIDER: str = "ollama"  # openai, anthropic, gemini, ollama
+    LLM_PROVIDER: str = "ollama"  # openai, anthropic, gemini, ollama, stub (local, for load tests)
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "")
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     OLLAMA_API_BASE_URL: str = os.getenv("OLLAMA_API_BASE_URL", "http://localhost:11434")
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "deepseek-r1:8b")
+    OLLAMA_KEEP_ALIVE: str = "30m"  # how long Ollama keeps the model, and its prompt cache, loaded
 
+    # Provider-side caching of the static system prompt: a cache point on Anthropic, keep_alive on Ollama.
+    # Anthropic only caches prefixes of 1024 tokens or more and the DELIA instructions are close to that;
+    # python -m benchmarks.prompt_cache_benchmark prints their size and the time to first token with and without
+    PROMPT_CACHE_ENABLED: bool = True
+
+    # Stub provider used by load tests (LLM_PROVIDER=stub)
+    STUB_LLM_FIRST_TOKEN_MS: float = 200
+    STUB_LLM_TOKEN_MS: float = 5
+    STUB_EMBEDDING_LATENCY_MS: float = 5
+    STUB_EMBEDDING_DIMENSION: int = 384
+
+    # LLM routing: LLM_PROVIDER plus fallbacks, each call goes to the fastest healthy one by p50 latency
+    # and fails over to the next; python -m benchmarks.router_benchmark exercises it with simulated providers
+    LLM_FALLBACK_PROVIDERS: list[str] = []
+    LLM_HEDGE_AFTER_SECONDS: float = 0  # also ask the next provider after this long, 0 disables
+    LLM_ROUTER_WINDOW: int = 100  # calls kept per provider for latency and error rate
+    LLM_ROUTER_MAX_ERROR_RATE: float = 0.5
+    LLM_ROUTER_COOLDOWN_SECONDS: float = 30
+
+    # LLM concurrency (max in-flight calls per provider)
+    LLM_DEFAULT_CONCURRENCY: int = 32
+    LLM_CONCURRENCY_LIMITS: dict[str, int] = {
+        "openai": 64,
+        "anthropic": 64,
+        "gemini": 64,
+        "ollama": 4,
+    }
+
+    # Per-user admission control: token bucket per user, then a weighted fair queue per provider
+    # Admission limits are enforced per worker process: with N workers the effective limits are N times these
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_PER_MINUTE: float = 60  # sustained chat requests per user
+    RATE_LIMIT_BURST: int = 20
+    LLM_MAX_WAITING_PER_USER: int = 8  # calls one user may queue per provider before getting 429, 0 = unlimited
+    LLM_MAX_WAITING: int = 512  # calls queued per provider before everyone gets 429, 0 = unlimited
+    LLM_BUSY_RETRY_AFTER_SECONDS: int = 5
+    LLM_USER_WEIGHTS: dict[str, float] = {}  # share of the provider slots per username, 1 by default
+
+    # Batch question API
+    BATCH_MAX_ITEMS: int = 20  # each question takes a rate limit token, so at most RATE_LIMIT_BURST when enabled
+    BATCH_MAX_CONCURRENCY: int = 4  # questions of one batch in flight, capped at LLM_MAX_WAITING_PER_USER
+    # A question turned away by a busy provider is retried after its Retry-After (app.rag.batch.BUSY_RETRIES)
+
+    # Embeddings cache and query micro-batching
+    EMBEDDING_CACHE_SIZE: int = 10000  # in-memory LRU entries, 0 disables
+    EMBEDDING_CACHE_PATH: str = ""  # optional SQLite file, e.g. ./cache/embeddings.sqlite3
+    EMBEDDING_BATCH_WINDOW_MS: float = 5  # 0 disables batching of concurrent queries
+    EMBEDDING_MAX_BATCH_SIZE: int = 64
+
+    # Answer cache
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_BACKEND: str = "memory"  # memory, sqlite
+    ANSWER_CACHE_PATH: str = "./cache/answers.sqlite3"
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0  # e.g. 0.97 serves close general questions; never used for DELIA, 0 = exact only
+    # Identical questions in flight (same normalized text, user level and corpus version) share one retrieval
+    # and generation; streams are fanned out to every client from their first event
+    COALESCE_REQUESTS: bool = True
+
+    # Document ingestion
+    INGEST_MAX_CONCURRENT_JOBS: int = 2
+    INGEST_MAX_PENDING_JOBS: int = 100
+    INGEST_PARSE_WORKERS: int = 2  # processes used to parse documents
+    INGEST_PDF_PAGES_PER_TASK: int = 16  # pages of a PDF parsed by each worker task
+    INGEST_EMBED_BATCH_SIZE: int = 64
+    INGEST_EMBED_WORKERS: int = 2  # concurrent embedding requests per job
+    INGEST_JOB_STORE_PATH: str = "./data/ingest_jobs.sqlite3"  # job status shared by all API workers
 
     # Vector Store
-    CHROMA_HOST: str = "localhost"
+    # chroma (embedded), chroma-http, numpy (memory-mapped in process, flat or IVF);
+    # python -m benchmarks.vector_store_benchmark compares them on the same corpus
+    VECTOR_STORE_BACKEND: str = "chroma"
+    CHROMA_HOST: str = "localhost"  # chroma-http server
     CHROMA_PORT: int = 8002
+    CHROMA_HTTP_POOL_SIZE: int = 32  # keep-alive connections to the Chroma server
+    NUMPY_INDEX_IVF_MIN_ROWS: int = 50000  # live chunks above which the numpy index searches an IVF partition
+    NUMPY_INDEX_NPROBE: int = 16  # IVF lists scanned per query
+    # Seconds a replaced collection is kept after a reset so in-flight queries can finish
+    VECTOR_STORE_DROP_GRACE_SECONDS: float = 30
+
+    # Retrieval
+    RETRIEVAL_MODE: str = "hybrid"  # vector, hybrid (vector + BM25 fused by reciprocal rank)
+    RETRIEVAL_FETCH_K: int = 20  # candidates taken from each retriever before fusion
+    LEXICAL_INDEX_PATH: str = "./chroma_db/lexical.sqlite3"
+    LEXICAL_INDEX_MMAP_BYTES: int = 256 * 1024 * 1024
+    # none, lexical, cross-encoder (requires sentence-transformers); python -m benchmarks.rerank_benchmark
+    # weighs its cost against the prompt tokens it saves
+    RERANKER: str = "none"
+    RERANK_CANDIDATES: int = 20  # chunks retrieved for the reranker, which keeps the best retrieval_k
+    RERANKER_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    CONTEXT_TOKEN_ENCODING: str = "cl100k_base"  # tiktoken encoding used to budget the prompt context
+
+    # Warm-up at startup; /ready answers 503 until it has finished
+    WARMUP_ENABLED: bool = True
+    WARMUP_GENERATION: bool = True  # also send a short prompt to every LLM provider to load the model; only the primary must answer
+    WARMUP_STEP_TIMEOUT_SECONDS: float = 300  # first load of a large local model can take minutes
+    WARMUP_RETRY_SECONDS: float = 30
+
+    # Observability
+    METRICS_ENABLED: bool = True  # Prometheus text format at /metrics
 
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "a_very_secret_key")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # User accounts
+    USER_STORE_BACKEND: str = "sqlite"  # sqlite, postgres (requires psycopg[pool])
+    USER_STORE_PATH: str = "./data/users.sqlite3"
+    USER_STORE_DSN: str = ""  # e.g. postgresql://rag:secret@db:5432/rag
+    USER_STORE_POOL_SIZE: int = 10  # postgres connections per worker
+    USER_STORE_SEED_DEMO_USER: bool = False  # create testuser/testpassword when the store is empty; development only
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 60  # how long other workers' changes take to show up
+    TOKEN_CACHE_SIZE: int = 10000  # verified tokens kept with their user, 0 disables
+    TOKEN_CACHE_TTL_SECONDS: float = 60  # how long a user change can take to reach cached tokens
+    PASSWORD_HASH_WORKERS: int = 2  # threads running bcrypt for logins
 
     class Config:
         case_sensitive = True
@@ -0,0 +1,56 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List
+
+from app.utils.metrics import Counter
+
+RATE_LIMITED = Counter("rate_limited_requests_total", "Requests rejected by the per-user rate limit.")
+
+
+class RateLimiter:
+    """
+    One token bucket per key: each holds up to burst tokens, refills at
+    rate_per_minute and every admitted request takes one. Keys are kept in a
+    bounded LRU; a bucket evicted after being idle would have refilled anyway.
+
+    Buckets are kept in memory and are not shared between worker processes.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        burst: int,
+        max_keys: int = 100000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()  # key -> [tokens, last refill]
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, cost: float = 1.0) -> float:
+        """
+        Takes cost tokens from the key's bucket. Returns 0 when the request is
+        admitted, otherwise the seconds until enough tokens are available.
+        """
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            missing = cost - bucket[0]
+        RATE_LIMITED.inc()
+        return missing / self.rate if self.rate > 0 else 60.0
@@ -1,5 +1,11 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, Generic, Optional, Tuple, TypeVar
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -8,6 +14,59 @@ from app.core.config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt is deliberately slow; a small dedicated pool keeps a burst of logins
+# from taking every thread the API uses for blocking work
+_password_executor: Optional[ThreadPoolExecutor] = None
+_password_executor_lock = threading.Lock()
+
+T = TypeVar("T")
+
+
+class TokenCache(Generic[T]):
+    """
+    Bounded LRU of values derived from verified tokens, keyed by the token's
+    digest so raw tokens are never kept in memory. An entry expires at the
+    earlier of the token's own expiry and ttl_seconds after it was stored.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, T]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[T]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: T, token_expires_at: Optional[float] = None) -> None:
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     to_encode = data.copy()
@@ -22,5 +81,21 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def _get_password_executor() -> ThreadPoolExecutor:
+    global _password_executor
+
+    if _password_executor is None:
+        with _password_executor_lock:
+            if _password_executor is None:
+                _password_executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+                )
+    return _password_executor
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the password hashing pool, keeping bcrypt off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_password_executor(), verify_password, plain_password, hashed_password)
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
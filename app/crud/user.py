@@ -1,20 +1,31 @@
-from typing import Optional
+import asyncio
+from typing import List, Optional
 
-from app.core.security import verify_password, get_password_hash
-from app.schemas.user import UserInDB
+from app.core.security import averify_password, get_password_hash, verify_password
+from app.db.user_store import get_user_store
+from app.schemas.user import UserCreate, UserInDB
 
-# In-memory user "database"
-DUMMY_USERS_DB: dict[str, UserInDB] = {
-    "testuser": UserInDB(
-        username="testuser",
-        email="test@example.com",
-        full_name="Test User",
-        hashed_password=get_password_hash("testpassword")
+def get_user(username: str) -> Optional[UserInDB]:
+    return get_user_store().get_user(username)
+
+def create_user(user: UserCreate) -> UserInDB:
+    """
+    Create a user, or replace the one with the same username.
+    """
+    user_in_db = UserInDB(
+        username=user.username,
+        email=user.email,
+        full_name=user.full_name,
+        hashed_password=get_password_hash(user.password),
     )
-}
+    get_user_store().save_user(user_in_db)
+    return user_in_db
 
-def get_user(username: str) -> Optional[UserInDB]:
-    return DUMMY_USERS_DB.get(username)
+def delete_user(username: str) -> bool:
+    return get_user_store().delete_user(username)
+
+def list_usernames() -> List[str]:
+    return get_user_store().list_usernames()
 
 def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
     """
@@ -26,3 +37,14 @@ def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
     if not verify_password(password, user.hashed_password):
         return None
     return user
+
+async def aauthenticate_user(username: str, password: str) -> Optional[UserInDB]:
+    """
+    Async variant of authenticate_user; the lookup and the bcrypt check run off the event loop.
+    """
+    user = await asyncio.to_thread(get_user, username)
+    if not user:
+        return None
+    if not await averify_password(password, user.hashed_password):
+        return None
+    return user
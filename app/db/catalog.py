@@ -0,0 +1,258 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.db.vector_store import CHROMA_PERSIST_DIR, get_collection
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = Path(CHROMA_PERSIST_DIR) / "catalog.sqlite3"
+
+# Page size used when rebuilding the catalog from an existing collection
+BACKFILL_PAGE_SIZE = 1000
+
+# Uploads used to be indexed under their temporary path, temp_docs/<uuid4>_<file name>
+_LEGACY_SOURCE = re.compile(r"^(?:.*[/\\])?[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}_(.+)$")
+
+_DOCUMENT_COLUMNS = ("source", "content_hash", "chunk_count", "total_chars", "size_bytes", "ingested_at")
+
+# Global variable to store the catalog instance
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+class DocumentCatalog:
+    """
+    Manifest of what has been indexed for each source document: the hash of
+    the file contents, the ids of the chunks written for it and summary
+    figures (chunk count, characters, file size, ingest time).
+
+    Ingestion uses it to skip unchanged files and to upsert or delete only the
+    chunks that changed; the stats and listing endpoints read it instead of
+    scanning the vector collection, so they cost O(number of documents).
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                source TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL,
+                ingested_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT NOT NULL,
+                source TEXT NOT NULL,
+                PRIMARY KEY (chunk_id, source)
+            );
+            CREATE INDEX IF NOT EXISTS chunks_source ON chunks(source);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        # A chunk shared by identical files is listed under each of them; catalogs
+        # from before chunk ids were derived from file contents had one source per chunk
+        if [row[5] for row in self._conn.execute("PRAGMA table_info(chunks)")] == [1, 0]:
+            self._conn.executescript(
+                """
+                BEGIN;
+                ALTER TABLE chunks RENAME TO chunks_old;
+                CREATE TABLE chunks (
+                    chunk_id TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    PRIMARY KEY (chunk_id, source)
+                );
+                INSERT INTO chunks SELECT chunk_id, source FROM chunks_old;
+                DROP TABLE chunks_old;
+                CREATE INDEX IF NOT EXISTS chunks_source ON chunks(source);
+                COMMIT;
+                """
+            )
+        # Columns added after the first version of the catalog
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(documents)")}
+        for column in ("total_chars", "size_bytes"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE documents ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+        self._lock = threading.Lock()
+
+    def get_document(self, source: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_DOCUMENT_COLUMNS)} FROM documents WHERE source = ?",
+                (source,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(_DOCUMENT_COLUMNS, row))
+
+    def get_chunk_ids(self, source: str) -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT chunk_id FROM chunks WHERE source = ?", (source,)).fetchall()
+        return {row[0] for row in rows}
+
+    def indexed_chunk_ids(self, chunk_ids: List[str], exclude_source: Optional[str] = None) -> Set[str]:
+        """Returns the ids among chunk_ids recorded for any document, or for any but exclude_source."""
+        found: Set[str] = set()
+        with self._lock:
+            for start in range(0, len(chunk_ids), 500):
+                part = chunk_ids[start:start + 500]
+                query = f"SELECT DISTINCT chunk_id FROM chunks WHERE chunk_id IN ({','.join('?' * len(part))})"
+                params = list(part)
+                if exclude_source is not None:
+                    query += " AND source != ?"
+                    params.append(exclude_source)
+                found.update(row[0] for row in self._conn.execute(query, params))
+        return found
+
+    def record_document(
+        self,
+        source: str,
+        content_hash: str,
+        chunk_ids: List[str],
+        total_chars: int = 0,
+        size_bytes: int = 0,
+    ) -> None:
+        """Replaces the manifest of a document."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (chunk_id, source) VALUES (?, ?)",
+                    [(chunk_id, source) for chunk_id in chunk_ids],
+                )
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO documents ({', '.join(_DOCUMENT_COLUMNS)}) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (source, content_hash, len(chunk_ids), total_chars, size_bytes, time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def set_meta(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def stats(self) -> Dict[str, int]:
+        """Document and chunk totals without touching the vector store."""
+        with self._lock:
+            total_documents, total_chunks = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chunk_count), 0) FROM documents"
+            ).fetchone()
+        return {
+            "total_documents": total_documents,
+            "total_chunks": total_chunks,
+            "embedding_dimension": int(self.get_meta("embedding_dimension", "0")),
+        }
+
+    def list_documents(
+        self, limit: Optional[int] = None, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Returns documents ordered by source, starting after cursor.
+        The second value is the cursor of the next page, or None on the last page.
+        """
+        query = f"SELECT {', '.join(_DOCUMENT_COLUMNS)} FROM documents"
+        params: List[Any] = []
+        if cursor is not None:
+            query += " WHERE source > ?"
+            params.append(cursor)
+        query += " ORDER BY source"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit + 1)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1][0]
+        return [dict(zip(_DOCUMENT_COLUMNS, row)) for row in rows], next_cursor
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM documents LIMIT 1").fetchone() is None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM documents")
+            self._conn.execute("DELETE FROM meta")
+            self._conn.execute("COMMIT")
+
+    def backfill_from_collection(self) -> None:
+        """
+        Builds manifests for chunks indexed before the catalog existed, paging
+        through the collection metadata once. The content hash is left empty
+        so the next upload of each file re-indexes it with deterministic ids.
+
+        Chunks of uploads indexed under their temporary path are recorded
+        under the bare file name, which is what ingestion now uses as the
+        source, so that re-uploading the file replaces them by id.
+        """
+        collection = get_collection()
+        if collection.count() == 0:
+            return
+
+        logger.info("Rebuilding document catalog from the vector collection...")
+        sources: Dict[str, Dict[str, Any]] = {}
+        dimension = 0
+        offset = 0
+        while True:
+            page = collection.get(
+                include=["metadatas", "documents"], limit=BACKFILL_PAGE_SIZE, offset=offset
+            )
+            if not page["ids"]:
+                break
+            for chunk_id, metadata, text in zip(page["ids"], page["metadatas"], page["documents"]):
+                source = (metadata or {}).get("source", "")
+                legacy = _LEGACY_SOURCE.match(source)
+                if legacy:
+                    source = legacy.group(1)
+                entry = sources.setdefault(source, {"ids": [], "chars": 0})
+                entry["ids"].append(chunk_id)
+                entry["chars"] += len(text or "")
+            offset += len(page["ids"])
+
+        sample = collection.get(limit=1, include=["embeddings"])
+        if sample["embeddings"] is not None and len(sample["embeddings"]) > 0:
+            dimension = len(sample["embeddings"][0])
+
+        for source, entry in sources.items():
+            self.record_document(source, "", entry["ids"], total_chars=entry["chars"])
+        self.set_meta("embedding_dimension", dimension)
+        logger.info(f"Document catalog rebuilt: {len(sources)} documents, {offset} chunks")
+
+
+def get_catalog() -> DocumentCatalog:
+    """Returns the document catalog using lazy initialization."""
+    global _catalog
+
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                catalog = DocumentCatalog(str(CATALOG_PATH))
+                if catalog.is_empty():
+                    catalog.backfill_from_collection()
+                _catalog = catalog
+    return _catalog
@@ -0,0 +1,51 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class JobStore:
+    """
+    Last known state of each ingestion job in a SQLite file, so that every
+    API worker can answer status queries for jobs another worker runs.
+    """
+
+    def __init__(self, path: str, max_jobs: int = 1000):
+        self.max_jobs = max_jobs
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs(created_at)")
+        self._lock = threading.Lock()
+
+    def save(self, job_id: str, state: Dict[str, Any]) -> None:
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?)",
+                (job_id, json.dumps(state), state["created_at"], time.time()),
+            )
+            if not exists:
+                self._conn.execute(
+                    "DELETE FROM jobs WHERE id IN ("
+                    " SELECT id FROM jobs ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_jobs,),
+                )
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
@@ -0,0 +1,187 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Page size used when rebuilding the index from an existing collection
+BACKFILL_PAGE_SIZE = 1000
+
+# Words, optionally joined by dots as in LDS.Child.Characteristic
+_TERM_PATTERN = re.compile(r"\w+(?:\.\w+)*")
+
+# Global variable to store the index instance
+_lexical_index = None
+_lexical_index_lock = threading.Lock()
+
+
+def build_match_query(text: str) -> str:
+    """
+    Turns free text into an FTS5 query matching any of its terms.
+    Dotted identifiers are matched as phrases so their parts must appear together.
+    """
+    terms = []
+    for term in dict.fromkeys(_TERM_PATTERN.findall(text)):
+        parts = term.split(".")
+        terms.append('"' + " ".join(parts) + '"')
+    return " OR ".join(terms)
+
+
+class LexicalIndex:
+    """
+    BM25 index of the indexed chunks, kept next to the Chroma data.
+
+    Built on an SQLite FTS5 table, so it is persistent, updated in place as
+    chunks are written or deleted, and shared by every worker using the same
+    file. Each reading thread gets its own connection with the database
+    memory-mapped, so searches do not contend on a lock or copy pages
+    through the SQLite page cache.
+    """
+
+    def __init__(self, path: str, mmap_size: int = 0):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.mmap_size = mmap_size
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                rowid INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL UNIQUE,
+                source TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_source ON chunks(source);
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                text, content='chunks', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts(rowid, text) VALUES (new.rowid, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+            END;
+            """
+        )
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.conn = conn
+        return conn
+
+    def add(self, ids: List[str], documents: List[Document]) -> None:
+        """Indexes chunks, replacing any with the same id."""
+        rows = [
+            (
+                chunk_id,
+                str(doc.metadata.get("source", "")),
+                doc.page_content,
+                json.dumps(doc.metadata, ensure_ascii=False),
+            )
+            for chunk_id, doc in zip(ids, documents)
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for start in range(0, len(ids), 500):
+                    part = ids[start:start + 500]
+                    self._conn.execute(
+                        f"DELETE FROM chunks WHERE chunk_id IN ({','.join('?' * len(part))})", part
+                    )
+                self._conn.executemany(
+                    "INSERT INTO chunks (chunk_id, source, text, metadata) VALUES (?, ?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, ids: Optional[List[str]] = None, source: Optional[str] = None) -> None:
+        """Removes chunks by id and/or by source."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for start in range(0, len(ids or []), 500):
+                    part = ids[start:start + 500]
+                    self._conn.execute(
+                        f"DELETE FROM chunks WHERE chunk_id IN ({','.join('?' * len(part))})", part
+                    )
+                if source is not None:
+                    self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def search(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        """Returns up to k chunks matching the query with their BM25 score, best first."""
+        match = build_match_query(query)
+        if not match:
+            return []
+        rows = self._reader().execute(
+            "SELECT c.chunk_id, c.text, c.metadata, bm25(chunks_fts) AS score "
+            "FROM chunks_fts JOIN chunks c ON c.rowid = chunks_fts.rowid "
+            "WHERE chunks_fts MATCH ? ORDER BY score LIMIT ?",
+            (match, k),
+        ).fetchall()
+        # FTS5 reports BM25 as a negative number, lower is better
+        return [
+            (Document(page_content=text, metadata=json.loads(metadata), id=chunk_id), -score)
+            for chunk_id, text, metadata, score in rows
+        ]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("COMMIT")
+
+    def backfill_from_collection(self, collection: Any) -> None:
+        """Indexes chunks written to the collection before the lexical index existed."""
+        if collection.count() == 0:
+            return
+
+        logger.info("Building lexical index from the vector collection...")
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas", "documents"], limit=BACKFILL_PAGE_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            self.add(page["ids"], [
+                Document(page_content=text or "", metadata=metadata or {})
+                for text, metadata in zip(page["documents"], page["metadatas"])
+            ])
+            offset += len(page["ids"])
+        logger.info(f"Lexical index built: {offset} chunks")
+
+
+def get_lexical_index() -> LexicalIndex:
+    """Returns the lexical index using lazy initialization."""
+    global _lexical_index
+
+    if _lexical_index is None:
+        with _lexical_index_lock:
+            if _lexical_index is None:
+                _lexical_index = LexicalIndex(
+                    settings.LEXICAL_INDEX_PATH, mmap_size=settings.LEXICAL_INDEX_MMAP_BYTES
+                )
+    return _lexical_index
@@ -0,0 +1,453 @@
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Ids per UPDATE statement, under SQLite's limit on bound parameters
+ID_BATCH_SIZE = 500
+
+# Rows assigned to IVF lists per block, bounding the temporary score matrix
+ASSIGN_BLOCK_ROWS = 65536
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first."""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    top = np.argpartition(-scores, k)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class _IVFIndex:
+    """
+    Inverted-file partition of the first `rows` vectors: k-means centroids
+    and the rows of each list stored contiguously, so a search scores only
+    the rows of the nprobe lists closest to the query.
+    """
+
+    def __init__(self, vectors: np.ndarray, nlist: int, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.rows = len(vectors)
+        sample = np.asarray(vectors[np.sort(rng.choice(self.rows, min(self.rows, nlist * KMEANS_SAMPLE_PER_LIST), replace=False))])
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            # Empty lists keep their previous centroid
+            centroids = np.where(counts[:, None] > 0, _normalize(sums), centroids)
+        self.centroids = centroids.astype(np.float32)
+
+        assign = np.concatenate([
+            np.argmax(np.asarray(vectors[start:start + ASSIGN_BLOCK_ROWS]) @ self.centroids.T, axis=1)
+            for start in range(0, self.rows, ASSIGN_BLOCK_ROWS)
+        ])
+        self.order = np.argsort(assign, kind="stable")
+        self.bounds = np.searchsorted(assign[self.order], np.arange(nlist + 1))
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        probes = _top_k(self.centroids @ query, nprobe)
+        return np.concatenate([self.order[self.bounds[c]:self.bounds[c + 1]] for c in probes])
+
+
+class _Snapshot:
+    """Immutable view of the store used by searches: mapped vectors, live rows and the IVF partition."""
+
+    def __init__(self, vectors: Optional[np.ndarray], alive: np.ndarray, ivf: Optional[_IVFIndex]):
+        self.vectors = vectors
+        self.alive = alive
+        self.ivf = ivf
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process vector index: normalized float32 vectors in an append-only
+    file that searches memory-map, with chunk ids, text and metadata in
+    SQLite next to it.
+
+    Search is exact cosine similarity with one vectorized matrix product
+    over the mapped file. Above ivf_min_rows live chunks an IVF partition
+    is trained with k-means and only the nprobe closest lists are scored;
+    rows appended after training are always scanned, and the partition is
+    retrained once the file has doubled. Training runs in a background
+    thread and the partition is swapped in when ready; until then searches
+    use the previous partition, or scan every row.
+
+    An upsert appends a new row and marks the old one dead, so mapped rows
+    never change. Writers serialize on an SQLite write transaction, which
+    also works across processes. A write applies its own changes to the
+    cached live-row mask; readers notice other processes' writes through
+    PRAGMA data_version and then reload the mask and remap the file.
+
+    The object also implements the subset of the Chroma collection API
+    that the rest of the application uses (count, get, upsert, delete).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedding_function: Optional[Embeddings] = None,
+        name: str = "",
+        ivf_min_rows: int = 50000,
+        nprobe: int = 16,
+    ):
+        self.name = name or Path(path).name
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._embedding_function = embedding_function
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self._vectors_path = self.path / "vectors.f32"
+        self._conn = sqlite3.connect(str(self.path / "rows.sqlite3"), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                document TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                alive INTEGER NOT NULL DEFAULT 1
+            );
+            CREATE INDEX IF NOT EXISTS rows_live_id ON rows(id) WHERE alive = 1;
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        self._lock = threading.RLock()
+        self._snapshot: Optional[Tuple[int, _Snapshot]] = None
+        self._ivf: Optional[_IVFIndex] = None
+        self._training: Optional[threading.Thread] = None
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding_function
+
+    def _require_embeddings(self) -> Embeddings:
+        if self._embedding_function is None:
+            raise ValueError("This store has no embedding function; search and add by vector instead")
+        return self._embedding_function
+
+    # Storage
+
+    def _dimension(self) -> Optional[int]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'dimension'").fetchone()
+        return int(row[0]) if row else None
+
+    def _load_snapshot(self) -> _Snapshot:
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._snapshot is not None and self._snapshot[0] == version:
+                return self._snapshot[1]
+
+            dimension = self._dimension()
+            total = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+            live = np.fromiter((r[0] for r in self._conn.execute("SELECT row FROM rows WHERE alive = 1")), dtype=np.int64)
+            alive = np.zeros(total, dtype=bool)
+            alive[live] = True
+
+            snapshot = self._make_snapshot(self._map_vectors(total, dimension), alive, len(live))
+            self._snapshot = (version, snapshot)
+            return snapshot
+
+    def _map_vectors(self, total: int, dimension: Optional[int]) -> Optional[np.ndarray]:
+        if not total or not dimension:
+            return None
+        return np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(total, dimension))
+
+    def _make_snapshot(self, vectors: Optional[np.ndarray], alive: np.ndarray, live: int) -> _Snapshot:
+        """Builds a snapshot with the current IVF partition, starting a retrain if it is due. Call with the lock held."""
+        if vectors is None or live < self.ivf_min_rows:
+            self._ivf = None
+        elif (self._ivf is None or len(vectors) > 2 * self._ivf.rows) and self._training is None:
+            self._training = threading.Thread(target=self._train_ivf, args=(vectors,), name=f"ivf-{self.name}", daemon=True)
+            self._training.start()
+        return _Snapshot(vectors, alive, self._ivf)
+
+    def _train_ivf(self, vectors: np.ndarray) -> None:
+        nlist = max(1, int(np.sqrt(len(vectors))))
+        logger.info(f"Training IVF index of {self.name}: {len(vectors)} rows, {nlist} lists")
+        try:
+            ivf = _IVFIndex(vectors, nlist)
+        except Exception as e:
+            logger.error(f"Failed to train the IVF index of {self.name}: {e}")
+            ivf = None
+        with self._lock:
+            self._training = None
+            if ivf is None or self._snapshot is None:
+                return
+            # Rows never change once written, so the partition stays valid for the rows it covers
+            self._ivf = ivf
+            version, snapshot = self._snapshot
+            if snapshot.vectors is not None and len(snapshot.vectors) >= ivf.rows:
+                self._snapshot = (version, _Snapshot(snapshot.vectors, snapshot.alive, ivf))
+
+    def wait_for_index(self, timeout: Optional[float] = None) -> None:
+        """Blocks until a background training of the IVF partition, if any, has finished."""
+        training = self._training
+        if training is not None:
+            training.join(timeout)
+
+    def _apply_write(self, version: int, total: int, dimension: Optional[int], dead: List[int]) -> None:
+        """
+        Updates the cached snapshot with a write of this connection, which
+        appended rows up to total and marked the dead rows, instead of
+        reloading every live row. version is the data_version seen inside
+        the write transaction: if another process wrote since the snapshot
+        was taken, it is dropped and reloaded on the next search.
+        """
+        if self._snapshot is None or self._snapshot[0] != version:
+            self._snapshot = None
+            return
+        previous = self._snapshot[1]
+        alive = np.zeros(total, dtype=bool)
+        alive[:len(previous.alive)] = previous.alive
+        alive[len(previous.alive):] = True
+        alive[dead] = False
+        vectors = previous.vectors
+        if vectors is None or len(vectors) != total:
+            vectors = self._map_vectors(total, dimension)
+        self._snapshot = (version, self._make_snapshot(vectors, alive, int(np.count_nonzero(alive))))
+
+    def _kill(self, ids: Sequence[str]) -> List[int]:
+        """Marks the live rows of ids dead and returns their row numbers. Call inside a write transaction."""
+        dead: List[int] = []
+        for start in range(0, len(ids), ID_BATCH_SIZE):
+            part = list(ids[start:start + ID_BATCH_SIZE])
+            dead.extend(r[0] for r in self._conn.execute(
+                f"UPDATE rows SET alive = 0 WHERE alive = 1 AND id IN ({','.join('?' * len(part))}) RETURNING row", part,
+            ))
+        return dead
+
+    def _where_clause(self, where: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        if not where:
+            return "", []
+        clauses, params = [], []
+        for key, value in where.items():
+            clauses.append("json_extract(metadata, ?) = ?")
+            params.extend([f"$.{key}", value])
+        return " AND " + " AND ".join(clauses), params
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Optional[Sequence[str]] = None,
+        metadatas: Optional[Sequence[Optional[dict]]] = None,
+    ) -> None:
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        documents = documents or [""] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock, so row numbers and file offsets are ours until COMMIT
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                dimension = self._dimension()
+                if dimension is None:
+                    dimension = vectors.shape[1]
+                    self._conn.execute("INSERT INTO meta (key, value) VALUES ('dimension', ?)", (str(dimension),))
+                elif dimension != vectors.shape[1]:
+                    raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the index ({dimension})")
+
+                start = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+                # Bytes past the last committed row, left by a failed write, are overwritten
+                with os.fdopen(os.open(self._vectors_path, os.O_RDWR | os.O_CREAT, 0o644), "r+b") as f:
+                    f.seek(start * dimension * 4)
+                    f.write(vectors.tobytes())
+                    f.truncate()
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                dead = self._kill(ids)
+                self._conn.executemany(
+                    "INSERT INTO rows (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                    [
+                        (start + n, chunk_id, text or "", json.dumps(metadata or {}, ensure_ascii=False))
+                        for n, (chunk_id, text, metadata) in enumerate(zip(ids, documents, metadatas))
+                    ],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._apply_write(version, start + len(ids), dimension, dead)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[dict] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids and not where:
+            return None
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                dead = self._kill(ids) if ids else []
+                if where:
+                    clause, params = self._where_clause(where)
+                    dead.extend(r[0] for r in self._conn.execute(
+                        f"UPDATE rows SET alive = 0 WHERE alive = 1{clause} RETURNING row", params,
+                    ))
+                total = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._apply_write(version, total, self._dimension(), dead)
+        return True
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rows WHERE alive = 1").fetchone()[0]
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[dict] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Iterable[str] = ("metadatas", "documents"),
+    ) -> Dict[str, Any]:
+        """Same shape as a Chroma collection's get()."""
+        clause, params = self._where_clause(where)
+        if ids:
+            clause += f" AND id IN ({','.join('?' * len(ids))})"
+            params.extend(ids)
+        sql = f"SELECT row, id, document, metadata FROM rows WHERE alive = 1{clause} ORDER BY row"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([-1 if limit is None else limit, offset or 0])
+        with self._lock:
+            found = self._conn.execute(sql, params).fetchall()
+
+        include = set(include)
+        result: Dict[str, Any] = {
+            "ids": [r[1] for r in found],
+            "documents": [r[2] for r in found] if "documents" in include else None,
+            "metadatas": [json.loads(r[3]) for r in found] if "metadatas" in include else None,
+            "embeddings": None,
+        }
+        if "embeddings" in include:
+            snapshot = self._load_snapshot()
+            result["embeddings"] = [np.asarray(snapshot.vectors[r[0]]).tolist() for r in found] if found else []
+        return result
+
+    # Search
+
+    def _search(self, query: np.ndarray, k: int, filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        snapshot = self._load_snapshot()
+        if snapshot.vectors is None or k <= 0:
+            return []
+        query = _normalize(np.asarray(query, dtype=np.float32))
+
+        alive = snapshot.alive
+        if filter:
+            clause, params = self._where_clause(filter)
+            with self._lock:
+                rows = [r[0] for r in self._conn.execute(f"SELECT row FROM rows WHERE alive = 1{clause}", params)]
+            alive = np.zeros_like(alive)
+            alive[[r for r in rows if r < len(alive)]] = True
+
+        if snapshot.ivf is not None:
+            # Rows of the probed lists plus the ones appended since training, in file order
+            rows = np.union1d(snapshot.ivf.candidates(query, self.nprobe), np.arange(snapshot.ivf.rows, len(alive)))
+            rows = rows[alive[rows]]
+            scores = np.asarray(snapshot.vectors[rows]) @ query
+        else:
+            rows = np.flatnonzero(alive)
+            if len(rows) == len(alive):
+                scores = np.asarray(snapshot.vectors) @ query
+            else:
+                scores = np.asarray(snapshot.vectors[rows]) @ query
+        if not len(rows):
+            return []
+
+        best = _top_k(scores, k)
+        rows, scores = rows[best], scores[best]
+
+        placeholders = ",".join("?" * len(rows))
+        with self._lock:
+            found = {
+                r[0]: r for r in self._conn.execute(
+                    f"SELECT row, id, document, metadata FROM rows WHERE row IN ({placeholders})",
+                    [int(r) for r in rows],
+                )
+            }
+        return [
+            (
+                Document(page_content=found[row][2], metadata=json.loads(found[row][3]), id=found[row][1]),
+                float(1.0 - score),  # cosine distance, lower is closer as in Chroma
+            )
+            for row, score in zip(rows.tolist(), scores.tolist())
+            if row in found
+        ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self._search(np.asarray(embedding), k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self._search(np.asarray(self._require_embeddings().embed_query(query)), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda distance: 1.0 - distance
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        self.upsert(ids, self._require_embeddings().embed_documents(texts), texts, metadatas)
+        return ids
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        path: str,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+            self._snapshot = None
+            self._ivf = None
+
+    def destroy(self) -> None:
+        """Closes the store and removes its files."""
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
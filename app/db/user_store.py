@@ -0,0 +1,249 @@
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.schemas.user import UserInDB
+
+logger = logging.getLogger(__name__)
+
+_USER_COLUMNS = ("username", "email", "full_name", "hashed_password")
+
+# bcrypt hash of "testpassword", the demo account used by the Postman collection
+DEMO_USER = UserInDB(
+    username="testuser",
+    email="test@example.com",
+    full_name="Test User",
+    hashed_password="$2b$12$OAoEMQ9cm3Xc5yAFqvvenO/cBDYc92qFqGqDdeQySUkZLYep/6Amm",
+)
+
+# Global variable to store the user store instance
+_user_store = None
+_user_store_lock = threading.Lock()
+
+
+def _to_user(row) -> Optional[UserInDB]:
+    return UserInDB(**dict(zip(_USER_COLUMNS, row))) if row is not None else None
+
+
+class UserStoreBackend(ABC):
+    """
+    Durable storage of user accounts, shared by every worker.
+
+    Backends are synchronous, like the other SQLite stores of the app, and
+    the async auth path calls them through asyncio.to_thread. Most lookups
+    are answered by the UserStore cache without reaching the backend, and the
+    same backends serve the synchronous users CLI, so an async driver
+    (aiosqlite, psycopg's AsyncConnectionPool) would only move the same
+    blocking I/O to another thread or duplicate every backend.
+    """
+
+    @abstractmethod
+    def get(self, username: str) -> Optional[UserInDB]:
+        """Returns a user, or None if it does not exist."""
+
+    @abstractmethod
+    def upsert(self, user: UserInDB) -> None:
+        """Creates a user or replaces the one with the same username."""
+
+    @abstractmethod
+    def delete(self, username: str) -> bool:
+        """Deletes a user; returns whether it existed."""
+
+    @abstractmethod
+    def list_usernames(self) -> List[str]:
+        """Returns every username, sorted."""
+
+
+class SQLiteUserBackend(UserStoreBackend):
+    """
+    Users in a local SQLite file. Each thread gets its own connection, so
+    concurrent lookups from the API threads read in parallel under WAL
+    instead of queueing on one shared connection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connect().execute(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY,
+                email TEXT,
+                full_name TEXT,
+                hashed_password TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, username: str) -> Optional[UserInDB]:
+        row = self._connect().execute(
+            f"SELECT {', '.join(_USER_COLUMNS)} FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return _to_user(row)
+
+    def upsert(self, user: UserInDB) -> None:
+        self._connect().execute(
+            "INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?)",
+            (user.username, user.email, user.full_name, user.hashed_password, time.time()),
+        )
+
+    def delete(self, username: str) -> bool:
+        return self._connect().execute("DELETE FROM users WHERE username = ?", (username,)).rowcount > 0
+
+    def list_usernames(self) -> List[str]:
+        return [row[0] for row in self._connect().execute("SELECT username FROM users ORDER BY username")]
+
+
+class PostgresUserBackend(UserStoreBackend):
+    """
+    Users in PostgreSQL through a psycopg connection pool, for deployments
+    whose workers run on several hosts. Requires psycopg[pool].
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10):
+        try:
+            from psycopg_pool import ConnectionPool
+        except ImportError as e:
+            raise ValueError("USER_STORE_BACKEND=postgres requires the psycopg[pool] package") from e
+        self._pool = ConnectionPool(dsn, min_size=min_size, max_size=max_size, open=True)
+        with self._pool.connection() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS users (
+                    username TEXT PRIMARY KEY,
+                    email TEXT,
+                    full_name TEXT,
+                    hashed_password TEXT NOT NULL,
+                    updated_at DOUBLE PRECISION NOT NULL
+                )
+                """
+            )
+
+    def get(self, username: str) -> Optional[UserInDB]:
+        with self._pool.connection() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(_USER_COLUMNS)} FROM users WHERE username = %s", (username,)
+            ).fetchone()
+        return _to_user(row)
+
+    def upsert(self, user: UserInDB) -> None:
+        with self._pool.connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO users VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (username) DO UPDATE SET email = EXCLUDED.email, full_name = EXCLUDED.full_name,
+                    hashed_password = EXCLUDED.hashed_password, updated_at = EXCLUDED.updated_at
+                """,
+                (user.username, user.email, user.full_name, user.hashed_password, time.time()),
+            )
+
+    def delete(self, username: str) -> bool:
+        with self._pool.connection() as conn:
+            return conn.execute("DELETE FROM users WHERE username = %s", (username,)).rowcount > 0
+
+    def list_usernames(self) -> List[str]:
+        with self._pool.connection() as conn:
+            return [row[0] for row in conn.execute("SELECT username FROM users ORDER BY username")]
+
+    def close(self) -> None:
+        self._pool.close()
+
+
+class UserStore:
+    """
+    Read-through cache in front of a user backend.
+
+    Lookups, including those for unknown usernames, are kept for ttl_seconds
+    in a bounded LRU, so the auth path rarely reaches the database. Changes
+    made through this store are applied to the cache at once; changes made by
+    other workers show up once their entries expire.
+    """
+
+    def __init__(self, backend: UserStoreBackend, max_entries: int = 10000, ttl_seconds: float = 60):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._cache: "OrderedDict[str, Tuple[float, Optional[UserInDB]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, username: str, user: Optional[UserInDB]) -> None:
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._cache[username] = (time.monotonic() + self.ttl_seconds, user)
+            self._cache.move_to_end(username)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def get_user(self, username: str) -> Optional[UserInDB]:
+        with self._lock:
+            entry = self._cache.get(username)
+            if entry is not None and entry[0] > time.monotonic():
+                self._cache.move_to_end(username)
+                return entry[1]
+
+        user = self.backend.get(username)
+        self._remember(username, user)
+        return user
+
+    def save_user(self, user: UserInDB) -> None:
+        self.backend.upsert(user)
+        self._remember(user.username, user)
+
+    def delete_user(self, username: str) -> bool:
+        deleted = self.backend.delete(username)
+        with self._lock:
+            self._cache.pop(username, None)
+        return deleted
+
+    def list_usernames(self) -> List[str]:
+        return self.backend.list_usernames()
+
+
+def _create_backend() -> UserStoreBackend:
+    if settings.USER_STORE_BACKEND == "sqlite":
+        return SQLiteUserBackend(settings.USER_STORE_PATH)
+    elif settings.USER_STORE_BACKEND == "postgres":
+        if not settings.USER_STORE_DSN:
+            raise ValueError("USER_STORE_DSN is required when using the postgres user store")
+        return PostgresUserBackend(settings.USER_STORE_DSN, max_size=settings.USER_STORE_POOL_SIZE)
+    raise ValueError(f"Unsupported user store backend: {settings.USER_STORE_BACKEND}")
+
+
+def get_user_store() -> UserStore:
+    """
+    Returns the user store using lazy initialization.
+    With USER_STORE_SEED_DEMO_USER, an empty store gets the demo account.
+    """
+    global _user_store
+
+    if _user_store is None:
+        with _user_store_lock:
+            if _user_store is None:
+                store = UserStore(
+                    _create_backend(),
+                    max_entries=settings.USER_CACHE_SIZE,
+                    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+                )
+                if settings.USER_STORE_SEED_DEMO_USER and not store.list_usernames():
+                    store.save_user(DEMO_USER)
+                    logger.info(f"User store was empty; created the demo user {DEMO_USER.username}")
+                _user_store = store
+    return _user_store
@@ -1,40 +1,367 @@
-import chromadb
-from langchain_chroma import Chroma
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
 
 from app.core.config import settings
+from app.db.lexical_index import get_lexical_index
+from app.db.numpy_store import NumpyVectorStore
 from app.rag.embeddings_factory import get_embeddings
 
-# Global variable to store the vector store instance
-_vector_store = None
+logger = logging.getLogger(__name__)
+
+CHROMA_PERSIST_DIR = "./chroma_db"
+
+# Name of the collection used before any reset; resets create suffixed generations of it
+COLLECTION_NAME = "rag_collection"
+
+# Marker file holding the name of the collection that currently serves the corpus
+ACTIVE_COLLECTION_FILE = Path(CHROMA_PERSIST_DIR) / "active_collection"
+
+# Collections replaced by a reset and still to be dropped, with the time each one may go
+PENDING_DROPS_FILE = Path(CHROMA_PERSIST_DIR) / "pending_drops.json"
+
+# Marker file whose content changes every time the indexed corpus changes
+CORPUS_VERSION_FILE = Path(CHROMA_PERSIST_DIR) / "corpus_version"
+
+# Directory holding one sub-directory per collection of the numpy backend
+NUMPY_INDEX_DIR = Path(CHROMA_PERSIST_DIR) / "numpy"
+
+# Chunks deleted per call when a collection has to be emptied instead of dropped
+DELETE_BATCH_SIZE = 500
+
+# Global variables to store the backend and the active vector store, as (marker mtime, store)
+_backend = None
+_vector_store: Optional[Tuple[Optional[int], VectorStore]] = None
+_store_lock = threading.RLock()
+
+# Cached corpus version, keyed by the marker file's mtime
+_corpus_version: tuple[int, str] | None = None
+
+
+class VectorStoreBackend(ABC):
+    """
+    Opens and drops the named collections that hold the corpus.
+
+    A collection is exposed twice: as a LangChain VectorStore for retrieval,
+    and through collection() as an object with the Chroma collection API
+    subset used for writes and backfills (count, get, upsert, delete, name).
+    """
+
+    @abstractmethod
+    def open(self, name: str) -> VectorStore:
+        """Returns the vector store of a collection, creating it if needed."""
+
+    @abstractmethod
+    def collection(self, store: VectorStore) -> Any:
+        """Returns the collection API of an open store."""
+
+    @abstractmethod
+    def drop(self, name: str) -> None:
+        """Deletes a collection and its data."""
+
+
+class ChromaBackend(VectorStoreBackend):
+    """Chroma, either embedded in the process or reached through its HTTP server."""
+
+    def __init__(self, client_factory: Callable[[], Any]):
+        self._client_factory = client_factory
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._client_factory()
+        return self._client
+
+    def open(self, name: str) -> VectorStore:
+        from langchain_chroma import Chroma
+
+        return Chroma(
+            client=self.client,
+            collection_name=name,
+            embedding_function=get_embeddings(),
+        )
+
+    def collection(self, store: VectorStore) -> Any:
+        return store._collection
+
+    def drop(self, name: str) -> None:
+        self.client.delete_collection(name)
+
+
+class NumpyBackend(VectorStoreBackend):
+    """In-process memory-mapped index, one directory per collection."""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def open(self, name: str) -> NumpyVectorStore:
+        return NumpyVectorStore(
+            str(self.root / name),
+            get_embeddings(),
+            name=name,
+            ivf_min_rows=settings.NUMPY_INDEX_IVF_MIN_ROWS,
+            nprobe=settings.NUMPY_INDEX_NPROBE,
+        )
+
+    def collection(self, store: VectorStore) -> Any:
+        return store
+
+    def drop(self, name: str) -> None:
+        NumpyVectorStore(str(self.root / name), get_embeddings(), name=name).destroy()
+
+
+# chromadb is imported by the client factories, so the numpy backend never loads it
 
-def get_vector_store() -> Chroma:
-    """Returns the Chroma vector store instance using lazy initialization."""
+def _embedded_chroma_client():
+    import chromadb
+
+    # PersistentClient keeps the data in-process, avoiding HTTP timeouts
+    return chromadb.PersistentClient(
+        path=CHROMA_PERSIST_DIR,
+        settings=chromadb.Settings(
+            allow_reset=True,
+            anonymized_telemetry=False
+        )
+    )
+
+def _http_chroma_client():
+    import chromadb
+    from requests.adapters import HTTPAdapter
+
+    client = chromadb.HttpClient(
+        host=settings.CHROMA_HOST,
+        port=settings.CHROMA_PORT,
+        settings=chromadb.Settings(anonymized_telemetry=False),
+    )
+    # The client sends every request through one requests.Session; widening its pool
+    # lets concurrent workers reuse keep-alive connections instead of opening new ones
+    session = getattr(getattr(client, "_server", None), "_session", None)
+    if session is not None:
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.CHROMA_HTTP_POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+    else:
+        logger.warning("Could not configure the Chroma HTTP connection pool; using the client defaults")
+    return client
+
+def get_backend() -> VectorStoreBackend:
+    """Returns the vector store backend selected by VECTOR_STORE_BACKEND."""
+    global _backend
+
+    if _backend is None:
+        with _store_lock:
+            if _backend is None:
+                if settings.VECTOR_STORE_BACKEND == "chroma":
+                    _backend = ChromaBackend(_embedded_chroma_client)
+                elif settings.VECTOR_STORE_BACKEND == "chroma-http":
+                    _backend = ChromaBackend(_http_chroma_client)
+                elif settings.VECTOR_STORE_BACKEND == "numpy":
+                    _backend = NumpyBackend(NUMPY_INDEX_DIR)
+                else:
+                    raise ValueError(f"Unsupported vector store backend: {settings.VECTOR_STORE_BACKEND}")
+                logger.info(f"Vector store backend: {settings.VECTOR_STORE_BACKEND}")
+    return _backend
+
+def _active_collection_mtime() -> Optional[int]:
+    try:
+        return ACTIVE_COLLECTION_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _write_active_collection(name: str) -> int:
+    ACTIVE_COLLECTION_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = ACTIVE_COLLECTION_FILE.with_suffix(".tmp")
+    tmp_path.write_text(name)
+    os.replace(tmp_path, ACTIVE_COLLECTION_FILE)
+    return ACTIVE_COLLECTION_FILE.stat().st_mtime_ns
+
+def get_vector_store() -> VectorStore:
+    """
+    Returns the vector store of the active collection using lazy initialization.
+    The store is rebuilt when another worker switches the active collection.
+    """
     global _vector_store
-    
-    if _vector_store is None:
-        # Initialize ChromaDB client - using PersistentClient to avoid timeout issues
-        try:
-            # Use PersistentClient for local storage instead of HttpClient
-            client = chromadb.PersistentClient(
-                path="./chroma_db",
-                settings=chromadb.Settings(
-                    allow_reset=True,
-                    anonymized_telemetry=False
-                )
-            )
-            
-            # Initialize embeddings using the factory
-            embeddings = get_embeddings()
-            
-            # Initialize Chroma vector store
-            _vector_store = Chroma(
-                client=client,
-                collection_name="rag_collection",
-                embedding_function=embeddings,
-            )
-        except Exception as e:
-            print(f"Failed to connect to ChromaDB: {e}")
-            print(f"Trying to connect to {settings.CHROMA_HOST}:{settings.CHROMA_PORT}")
-            raise
-    
-    return _vector_store
+
+    mtime = _active_collection_mtime()
+    current = _vector_store
+    if current is not None and current[0] == mtime:
+        return current[1]
+
+    with _store_lock:
+        if _vector_store is None or _vector_store[0] != mtime:
+            name = ACTIVE_COLLECTION_FILE.read_text().strip() if mtime is not None else COLLECTION_NAME
+            try:
+                store = get_backend().open(name or COLLECTION_NAME)
+            except Exception as e:
+                logger.error(f"Failed to open the vector store: {e}")
+                raise
+            _vector_store = (mtime, store)
+        return _vector_store[1]
+
+def get_collection() -> Any:
+    """Returns the collection API (count, get, upsert, delete) of the active vector store."""
+    return get_backend().collection(get_vector_store())
+
+def reset_collection() -> int:
+    """
+    Empties the vector store and returns the number of chunks it held.
+
+    A new, empty collection is created and made active in a single swap, so
+    a query sees either the old corpus or the new one, never a partial
+    delete. The old collection is recorded in PENDING_DROPS_FILE and dropped
+    after a grace period that lets in-flight queries finish; drops that a
+    process exit interrupted are swept on startup and on the next reset.
+    """
+    global _vector_store
+
+    with _store_lock:
+        old_collection = get_collection()
+        removed = old_collection.count()
+        new_name = f"{COLLECTION_NAME}_{uuid.uuid4().hex[:12]}"
+        store = get_backend().open(new_name)
+        _vector_store = (_write_active_collection(new_name), store)
+        get_lexical_index().clear()
+
+        pending = _read_pending_drops()
+        pending[old_collection.name] = time.time() + settings.VECTOR_STORE_DROP_GRACE_SECONDS
+        _write_pending_drops(pending)
+
+    logger.info(f"Switched to empty collection {new_name}; dropping {old_collection.name} ({removed} chunks)")
+    sweep_dropped_collections()
+    timer = threading.Timer(settings.VECTOR_STORE_DROP_GRACE_SECONDS, sweep_dropped_collections)
+    timer.daemon = True
+    timer.start()
+    return removed
+
+def _read_pending_drops() -> Dict[str, float]:
+    try:
+        return json.loads(PENDING_DROPS_FILE.read_text())
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        logger.warning(f"Ignoring unreadable {PENDING_DROPS_FILE}: {e}")
+        return {}
+
+def _write_pending_drops(pending: Dict[str, float]) -> None:
+    PENDING_DROPS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = PENDING_DROPS_FILE.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(pending))
+    os.replace(tmp_path, PENDING_DROPS_FILE)
+
+def sweep_dropped_collections() -> None:
+    """Drops the collections replaced by a reset whose grace period is over."""
+    with _store_lock:
+        due = [name for name, drop_after in _read_pending_drops().items() if drop_after <= time.time()]
+        active = ACTIVE_COLLECTION_FILE.read_text().strip() if ACTIVE_COLLECTION_FILE.exists() else COLLECTION_NAME
+    if not due:
+        return
+
+    gone = [name for name in due if name == active or _drop_collection(name)]
+    with _store_lock:
+        pending = _read_pending_drops()
+        for name in gone:
+            pending.pop(name, None)
+        _write_pending_drops(pending)
+
+def _drop_collection(name: str) -> bool:
+    """Drops a collection, or empties it in bounded batches if it cannot be dropped. Returns whether it is gone."""
+    backend = get_backend()
+    try:
+        backend.drop(name)
+        logger.info(f"Dropped collection {name}")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not drop collection {name}, deleting its chunks in batches: {e}")
+
+    try:
+        collection = backend.collection(backend.open(name))
+        total = collection.count()
+        deleted = 0
+        while True:
+            ids = collection.get(limit=DELETE_BATCH_SIZE, include=[])["ids"]
+            if not ids:
+                break
+            collection.delete(ids=ids)
+            deleted += len(ids)
+            logger.info(f"Deleted {deleted}/{total} chunks from {name}")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to empty collection {name}: {e}")
+        return False
+
+def add_embedded_documents(
+    documents: List[Document],
+    embeddings: List[List[float]],
+    ids: Optional[List[str]] = None,
+) -> List[str]:
+    """
+    Writes chunks whose embeddings were already computed by the caller.
+    Existing ids are overwritten. Returns the ids that were written.
+    """
+    if not documents:
+        return []
+
+    ids = ids or [str(uuid.uuid4()) for _ in documents]
+    collection = get_collection()
+    collection.upsert(
+        ids=ids,
+        embeddings=embeddings,
+        documents=[doc.page_content for doc in documents],
+        metadatas=[doc.metadata for doc in documents],
+    )
+    get_lexical_index().add(ids, documents)
+    return ids
+
+def delete_documents(ids: Optional[List[str]] = None, where: Optional[dict] = None) -> None:
+    """Deletes chunks by id and/or metadata filter. The lexical index only supports filtering by source."""
+    if not ids and not where:
+        return
+    collection = get_collection()
+    if ids:
+        # Bounded batches keep each request under the backend's parameter limits
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            collection.delete(ids=ids[start:start + DELETE_BATCH_SIZE])
+    if where:
+        collection.delete(where=where)
+    get_lexical_index().delete(ids=ids, source=(where or {}).get("source"))
+
+def get_corpus_version() -> str:
+    """
+    Returns an opaque identifier of the current corpus contents.
+    It is shared by all workers through a marker file next to the Chroma data.
+    """
+    global _corpus_version
+
+    try:
+        mtime = CORPUS_VERSION_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return "0"
+
+    if _corpus_version is None or _corpus_version[0] != mtime:
+        _corpus_version = (mtime, CORPUS_VERSION_FILE.read_text().strip() or "0")
+    return _corpus_version[1]
+
+def bump_corpus_version() -> str:
+    """Marks the corpus as changed, invalidating everything derived from the previous version."""
+    global _corpus_version
+
+    version = uuid.uuid4().hex
+    CORPUS_VERSION_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = CORPUS_VERSION_FILE.with_suffix(".tmp")
+    tmp_path.write_text(version)
+    os.replace(tmp_path, CORPUS_VERSION_FILE)
+    _corpus_version = (CORPUS_VERSION_FILE.stat().st_mtime_ns, version)
+    return version
@@ -1,9 +1,24 @@
-from fastapi import FastAPI
+import time
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 
 from app.api.v1.api import api_router
 from app.core.config import settings
+from app.rag.concurrency import ProviderBusy
+from app.rag.ingestion import shutdown_job_manager
+from app.rag.warmup import get_warmup_state, start_warmup, stop_warmup
 from app.utils.logging import logger
+from app.utils.metrics import CONTENT_TYPE, Counter, Histogram, render_metrics
+from app.utils.timing import end_request_timings, format_server_timing, start_request_timings
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status code.", ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time until the response headers are sent, by route.", ["method", "route"]
+)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -20,12 +35,74 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+def _route_template(request: Request) -> str:
+    """
+    The matched path with its parameters put back as placeholders, so ids in
+    URLs don't create a metric series each. Unmatched paths share one label.
+    """
+    if request.scope.get("route") is None:
+        return "unmatched"
+    path = request.url.path
+    for name, value in request.path_params.items():
+        path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """
+    Reports the duration of each request stage (auth, embed, retrieve, rerank,
+    prompt, generate, postprocess) in a Server-Timing header, and counts the
+    request in the HTTP metrics. Streaming responses only include the stages
+    finished before the first byte.
+    """
+    token = start_request_timings()
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        timings = end_request_timings(token)
+    elapsed = time.perf_counter() - started
+    timings["total"] = elapsed * 1000
+    response.headers["Server-Timing"] = format_server_timing(timings)
+
+    route = _route_template(request)
+    HTTP_REQUESTS.inc(request.method, route, str(response.status_code))
+    HTTP_REQUEST_DURATION.observe(elapsed, request.method, route)
+    return response
+
+@app.exception_handler(ProviderBusy)
+async def provider_busy_handler(request: Request, exc: ProviderBusy):
+    """The LLM queues are full for this user: ask them to come back rather than queueing."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "LLM provider busy, try again later"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     logger.info("Starting up RAG App...")
+    start_warmup()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    stop_warmup()
+    shutdown_job_manager()
 
 @app.get("/", tags=["Root"])
 async def read_root():
     return {"message": f"Welcome to {settings.PROJECT_NAME}"}
 
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    """Readiness probe: 503 until the warm-up has finished."""
+    state = get_warmup_state()
+    return JSONResponse(state.to_dict(), status_code=200 if state.ready else 503)
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        """Prometheus scrape endpoint."""
+        return Response(render_metrics(), media_type=CONTENT_TYPE)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
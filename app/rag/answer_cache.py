@@ -0,0 +1,375 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Collection, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+from app.db.vector_store import get_corpus_version
+from app.rag.embeddings_factory import get_embeddings
+from app.utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+_answer_cache = None
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    scope: str  # kind + user level + corpus version; similarity is only searched within a scope
+    version: str
+    question: str
+    value: Any
+    embedding: Optional[List[float]]
+    expires_at: float
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalizes a question so trivially different spellings share a cache key.
+    Case is kept: EDSL identifiers are case-sensitive (IsNull is not isnull).
+    """
+    text = unicodedata.normalize("NFKC", question)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.strip("¿?¡!. ")
+
+
+class CacheBackend(ABC):
+    """Storage for answer cache entries with LRU and TTL eviction."""
+
+    # Whether calls do I/O and should be kept off the event loop
+    blocking = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CacheEntry]:
+        ...
+
+    @abstractmethod
+    def set(self, entry: CacheEntry) -> None:
+        ...
+
+    @abstractmethod
+    def candidates(self, scope: str) -> List[CacheEntry]:
+        """Returns the live entries of a scope that have an embedding."""
+
+    @abstractmethod
+    def purge_versions(self, keep_version: str) -> None:
+        """Drops every entry that belongs to another corpus version."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Process-local backend built on an OrderedDict used as an LRU."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[entry.key] = entry
+            self._entries.move_to_end(entry.key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def candidates(self, scope: str) -> List[CacheEntry]:
+        now = time.time()
+        with self._lock:
+            return [
+                entry for entry in self._entries.values()
+                if entry.scope == scope and entry.embedding is not None and entry.expires_at >= now
+            ]
+
+    def purge_versions(self, keep_version: str) -> None:
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e.version != keep_version]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """On-disk backend, shared by every worker that points at the same file."""
+
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                version TEXT NOT NULL,
+                question TEXT NOT NULL,
+                value TEXT NOT NULL,
+                embedding BLOB,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_scope ON answers(scope)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_last_access ON answers(last_access)")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _to_entry(row) -> CacheEntry:
+        key, scope, version, question, value, embedding, expires_at = row
+        return CacheEntry(
+            key=key,
+            scope=scope,
+            version=version,
+            question=question,
+            value=json.loads(value),
+            embedding=np.frombuffer(embedding, dtype=np.float32).tolist() if embedding else None,
+            expires_at=expires_at,
+        )
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, scope, version, question, value, embedding, expires_at "
+                "FROM answers WHERE key = ? AND expires_at >= ?",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE answers SET last_access = ? WHERE key = ?", (now, key))
+        return self._to_entry(row)
+
+    def set(self, entry: CacheEntry) -> None:
+        embedding = (
+            np.asarray(entry.embedding, dtype=np.float32).tobytes()
+            if entry.embedding is not None else None
+        )
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.key, entry.scope, entry.version, entry.question,
+                    json.dumps(entry.value, ensure_ascii=False), embedding,
+                    entry.expires_at, time.time(),
+                ),
+            )
+            self._conn.execute("DELETE FROM answers WHERE expires_at < ?", (time.time(),))
+            self._conn.execute(
+                "DELETE FROM answers WHERE key IN ("
+                " SELECT key FROM answers ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def candidates(self, scope: str) -> List[CacheEntry]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, scope, version, question, value, embedding, expires_at "
+                "FROM answers WHERE scope = ? AND embedding IS NOT NULL AND expires_at >= ?",
+                (scope, time.time()),
+            ).fetchall()
+        return [self._to_entry(row) for row in rows]
+
+    def purge_versions(self, keep_version: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE version != ?", (keep_version,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+
+
+class AnswerCache:
+    """
+    Two-tier cache of final answers.
+
+    The exact tier matches on the normalized question, user level and corpus
+    version. On a miss, the semantic tier embeds the question and returns the
+    closest cached answer in the same scope if its cosine similarity reaches
+    the configured threshold. Entries of older corpus versions are purged as
+    soon as a change of version is observed.
+
+    The semantic tier only serves the kinds in semantic_kinds: a DELIA
+    question carries an EDSL script, and two scripts that differ in one
+    identifier or literal embed almost identically but need their own review.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        embeddings: Optional[Embeddings] = None,
+        similarity_threshold: float = 0.97,
+        ttl_seconds: int = 3600,
+        version_provider: Callable[[], str] = get_corpus_version,
+        semantic_kinds: Collection[str] = ("general",),
+    ):
+        self.backend = backend
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.semantic_kinds = frozenset(semantic_kinds)
+        self.ttl_seconds = ttl_seconds
+        self.version_provider = version_provider
+        self._seen_version: Optional[str] = None
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+
+    async def _call(self, func, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.embeddings is not None and 0 < self.similarity_threshold <= 1
+
+    def uses_semantic(self, kind: str) -> bool:
+        """Whether answers of this kind are looked up and stored by embedding."""
+        return self.semantic_enabled and kind in self.semantic_kinds
+
+    async def _scope(self, kind: str, user_level: str) -> tuple[str, str]:
+        version = self.version_provider()
+        if version != self._seen_version:
+            await self._call(self.backend.purge_versions, version)
+            self._seen_version = version
+        return f"{kind}\x1f{user_level}\x1f{version}", version
+
+    @staticmethod
+    def _key(scope: str, normalized: str) -> str:
+        return hashlib.sha256(f"{scope}\x1f{normalized}".encode("utf-8")).hexdigest()
+
+    async def get(self, kind: str, question: str, user_level: str = "") -> Optional[Any]:
+        """Returns the cached answer for the question, or None."""
+        normalized = normalize_question(question)
+        scope, _ = await self._scope(kind, user_level)
+
+        entry = await self._call(self.backend.get, self._key(scope, normalized))
+        if entry is not None:
+            self.hits["exact"] += 1
+            return entry.value
+
+        if self.uses_semantic(kind):
+            try:
+                match = await self._closest(scope, normalized)
+            except Exception as e:
+                logger.warning(f"Semantic answer cache lookup failed: {e}")
+                match = None
+            if match is not None:
+                self.hits["semantic"] += 1
+                return match.value
+
+        self.misses += 1
+        return None
+
+    async def _closest(self, scope: str, normalized: str) -> Optional[CacheEntry]:
+        candidates = await self._call(self.backend.candidates, scope)
+        if not candidates:
+            return None
+
+        query = np.asarray(await self.embeddings.aembed_query(normalized), dtype=np.float32)
+        matrix = np.asarray([c.embedding for c in candidates], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        scores = matrix @ query / np.where(norms == 0, 1.0, norms)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+
+        logger.debug(f"Semantic cache hit ({scores[best]:.3f}): {candidates[best].question!r}")
+        return candidates[best]
+
+    async def set(self, kind: str, question: str, value: Any, user_level: str = "") -> None:
+        """Stores an answer for the question."""
+        normalized = normalize_question(question)
+        scope, version = await self._scope(kind, user_level)
+
+        embedding = None
+        if self.uses_semantic(kind):
+            try:
+                embedding = await self.embeddings.aembed_query(normalized)
+            except Exception as e:
+                logger.warning(f"Could not embed question for the answer cache: {e}")
+
+        await self._call(self.backend.set, CacheEntry(
+            key=self._key(scope, normalized),
+            scope=scope,
+            version=version,
+            question=normalized,
+            value=value,
+            embedding=embedding,
+            expires_at=time.time() + self.ttl_seconds,
+        ))
+
+    def stats(self) -> Dict[str, int]:
+        return {"exact_hits": self.hits["exact"], "semantic_hits": self.hits["semantic"], "misses": self.misses}
+
+
+def _lookup_counts() -> Dict[tuple, float]:
+    if _answer_cache is None:
+        return {}
+    return {
+        ("exact_hit",): _answer_cache.hits["exact"],
+        ("semantic_hit",): _answer_cache.hits["semantic"],
+        ("miss",): _answer_cache.misses,
+    }
+
+
+Counter("answer_cache_lookups_total", "Answer cache lookups by result.", ["result"], callback=_lookup_counts)
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Returns the configured answer cache, or None when caching is disabled."""
+    global _answer_cache
+
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+
+    if _answer_cache is None:
+        if settings.ANSWER_CACHE_BACKEND == "sqlite":
+            backend = SQLiteCacheBackend(settings.ANSWER_CACHE_PATH, settings.ANSWER_CACHE_MAX_ENTRIES)
+        elif settings.ANSWER_CACHE_BACKEND == "memory":
+            backend = InMemoryCacheBackend(settings.ANSWER_CACHE_MAX_ENTRIES)
+        else:
+            raise ValueError(f"Unsupported answer cache backend: {settings.ANSWER_CACHE_BACKEND}")
+
+        embeddings = None
+        if settings.ANSWER_CACHE_SIMILARITY_THRESHOLD > 0:
+            embeddings = get_embeddings()
+
+        _answer_cache = AnswerCache(
+            backend,
+            embeddings=embeddings,
+            similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+        )
+    return _answer_cache
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from langchain_core.runnables import RunnableLambda
+
+from app.core.config import settings
+from app.rag.answer_cache import get_answer_cache, normalize_question
+from app.rag.chain import query_delia
+from app.rag.concurrency import ProviderBusy
+from app.rag.embeddings_factory import get_embeddings
+from app.utils.metrics import Counter
+from app.utils.timing import end_request_timings, stage, start_request_timings
+
+logger = logging.getLogger(__name__)
+
+# Times a question turned away with ProviderBusy is retried, after the delay the provider asks for
+BUSY_RETRIES = 3
+
+BATCH_ITEMS = Counter("batch_items_total", "Questions answered through the batch API, by outcome.", ["outcome"])
+
+
+@dataclass
+class BatchItem:
+    question: str
+    user_level: str = "intermediate"
+    id: Optional[str] = None
+
+
+async def prefetch_embeddings(items: List[BatchItem]) -> None:
+    """
+    Embeds every question, as the retriever searches it, in a single call,
+    along with the normalized questions the semantic answer cache looks up
+    and stores when it serves DELIA answers. The vectors land in the
+    embedding cache, shared by the retriever and the answer cache, where
+    both find them.
+    """
+    texts = [item.question for item in items]
+    cache = get_answer_cache()
+    if cache is not None and cache.uses_semantic("delia"):
+        texts += [normalize_question(item.question) for item in items]
+    texts = list(dict.fromkeys(texts))
+    try:
+        with stage("embed"):
+            await get_embeddings().aembed_documents(texts)
+    except Exception as e:
+        # Each question still embeds its own text on the way
+        logger.warning(f"Could not embed the batch questions together: {e}")
+
+
+async def abatch_delia(items: List[BatchItem], max_concurrency: int) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Answers a list of DELIA questions with at most max_concurrency in flight,
+    yielding one result per question in completion order. All the questions
+    are queued under the same user, so max_concurrency is capped at
+    LLM_MAX_WAITING_PER_USER; a question turned away with ProviderBusy anyway
+    is retried up to BUSY_RETRIES times after the delay it was given.
+
+    Each result carries the index and id of its question, the fields of
+    DeliaResponse (with "error" set when the question failed) and the
+    duration of each stage in milliseconds. Questions that have not started
+    when the consumer stops are skipped.
+    """
+    stopped = False
+
+    async def answer(entry: Tuple[int, BatchItem]) -> Dict[str, Any]:
+        index, item = entry
+        result: Dict[str, Any] = {"index": index, "id": item.id, "question": item.question}
+        if stopped:
+            return result
+
+        token = start_request_timings()
+        started = time.perf_counter()
+        try:
+            for attempt in range(BUSY_RETRIES + 1):
+                try:
+                    result.update(await query_delia(item.question, item.user_level))
+                    break
+                except ProviderBusy as e:
+                    if attempt == BUSY_RETRIES:
+                        result.update({"error": str(e), "user_level": item.user_level})
+                        break
+                    with stage("busy_wait"):
+                        await asyncio.sleep(e.retry_after)
+        finally:
+            timings = end_request_timings(token)
+        timings["total"] = (time.perf_counter() - started) * 1000
+        result["timings_ms"] = {name: round(ms, 2) for name, ms in timings.items()}
+        return result
+
+    if settings.LLM_MAX_WAITING_PER_USER > 0:
+        max_concurrency = min(max_concurrency, settings.LLM_MAX_WAITING_PER_USER)
+
+    await prefetch_embeddings(items)
+    runnable = RunnableLambda(answer)
+    try:
+        async for index, result in runnable.abatch_as_completed(
+            list(enumerate(items)), config={"max_concurrency": max(1, max_concurrency)}, return_exceptions=True,
+        ):
+            if isinstance(result, Exception):
+                item = items[index]
+                result = {
+                    "index": index, "id": item.id, "question": item.question,
+                    "user_level": item.user_level, "error": str(result),
+                }
+            BATCH_ITEMS.inc("error" if result.get("error") else "ok")
+            yield result
+    finally:
+        stopped = True
@@ -1,47 +1,115 @@
 from operator import itemgetter
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, AsyncIterator
 
+from langchain_core.messages import SystemMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 
-from app.db.vector_store import get_vector_store
-from app.rag.llm_factory import llm
+from app.core.config import settings
+from app.db.lexical_index import get_lexical_index
+from app.db.vector_store import get_collection, get_vector_store
+from app.rag.answer_cache import get_answer_cache
+from app.rag.coalescing import (
+    coalescing_key, delia_flights, delia_stream_flights, general_flights, general_stream_flights,
+)
+from app.rag.concurrency import ProviderBusy
+from app.rag.context import ContextPacker
+from app.rag.llm_factory import get_llm_router
+from app.rag.rerank import get_reranker
+from app.rag.retrieval import HybridRetriever
+from app.utils.timing import stage
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Global variables for lazy initialization
-_vectorstore = None
-_retriever = None
+_retriever = None  # (vector store, retriever) pair, replaced as a whole
 _general_rag_chain = None
 _delia_chain = None
+_context_packer = None
 
 # Configuration for DELIA agent
 DELIA_CONFIG = {
-    "max_context_length": 4000,
+    "max_context_length": 4000,  # token budget of the {context} block
     "temperature": 0.1,  # Low temperature for consistent EDSL responses
     "max_tokens": 2000,
     "retrieval_k": 5,  # Number of documents to retrieve
 }
 
 def get_retriever():
-    """Get retriever with lazy initialization."""
-    global _vectorstore, _retriever
-    
-    if _retriever is None:
+    """
+    Get retriever with lazy initialization.
+    A new retriever is built whenever the active vector store changes, e.g. after a reset.
+    With RETRIEVAL_MODE "hybrid", vector search is fused with the BM25 lexical index.
+    When a reranker is configured, it returns RERANK_CANDIDATES chunks for the reranker to narrow down.
+    """
+    global _retriever
+
+    vectorstore = get_vector_store()
+    current = _retriever
+    if current is None or current[0] is not vectorstore:
+        k = settings.RERANK_CANDIDATES if get_reranker() is not None else DELIA_CONFIG["retrieval_k"]
         try:
-            _vectorstore = get_vector_store()
-            _retriever = _vectorstore.as_retriever(
-                search_kwargs={"k": DELIA_CONFIG["retrieval_k"]}
-            )
+            if settings.RETRIEVAL_MODE == "hybrid":
+                lexical_index = get_lexical_index()
+                if lexical_index.count() == 0:
+                    lexical_index.backfill_from_collection(get_collection())
+                retriever = HybridRetriever(
+                    vectorstore=vectorstore,
+                    lexical_index=lexical_index,
+                    k=k,
+                    fetch_k=max(k, settings.RETRIEVAL_FETCH_K),
+                )
+            elif settings.RETRIEVAL_MODE == "vector":
+                retriever = vectorstore.as_retriever(
+                    search_kwargs={"k": k}
+                )
+            else:
+                raise ValueError(f"Unsupported retrieval mode: {settings.RETRIEVAL_MODE}")
+            _retriever = current = (vectorstore, retriever)
             logger.info("Retriever initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize retriever: {e}")
             raise
-    
-    return _retriever
+
+    return current[1]
+
+def get_context_packer() -> ContextPacker:
+    """Get the packer that fits retrieved chunks into DELIA_CONFIG["max_context_length"] tokens."""
+    global _context_packer
+
+    if _context_packer is None:
+        _context_packer = ContextPacker(DELIA_CONFIG["max_context_length"])
+    return _context_packer
+
+def _retrieve(question: str) -> str:
+    with stage("retrieve"):
+        documents = get_retriever().invoke(question)
+        reranker = get_reranker()
+        if reranker is not None:
+            with stage("rerank"):
+                documents = reranker.rerank(question, documents, DELIA_CONFIG["retrieval_k"])
+    with stage("prompt"):
+        return get_context_packer().pack(documents)
+
+async def _aretrieve(question: str) -> str:
+    with stage("retrieve"):
+        documents = await get_retriever().ainvoke(question)
+        reranker = get_reranker()
+        if reranker is not None:
+            # Scoring is CPU-bound; keep it off the event loop
+            with stage("rerank"):
+                documents = await asyncio.to_thread(reranker.rerank, question, documents, DELIA_CONFIG["retrieval_k"])
+    # Packing a handful of chunks takes about a millisecond, cheap enough for the event loop
+    with stage("prompt"):
+        return get_context_packer().pack(documents)
+
+# Resolves the retriever on every call so chains follow vector store swaps without being rebuilt;
+# yields the packed context text rather than the raw Document list
+retrieve_context = RunnableLambda(_retrieve, afunc=_aretrieve)
 
 def validate_edsl_syntax(code: str) -> Dict[str, Any]:
     """
@@ -78,13 +146,91 @@ def validate_edsl_syntax(code: str) -> Dict[str, Any]:
 def format_edsl_response(response: str) -> str:
     """
     Format the response to ensure proper EDSL code blocks and structure.
+    Goes through EdslStreamFormatter so a complete answer and a streamed one
+    come out identical.
     """
-    # Ensure EDSL code blocks are properly formatted
-    if "```edsl" not in response and "```" in response:
-        # Replace generic code blocks with EDSL-specific ones
-        response = response.replace("```", "```edsl")
-    
-    return response
+    formatter = EdslStreamFormatter()
+    text, _ = formatter.feed(response)
+    tail, _ = formatter.flush()
+    return text + tail
+
+class EdslStreamFormatter:
+    """
+    Incremental counterpart of format_edsl_response for streamed output.
+
+    Text is processed line by line: untagged code fences are rewritten to
+    ```edsl as they arrive, and each code block is validated with
+    validate_edsl_syntax as soon as its closing fence is seen. Only a line that
+    might still turn into a fence is held back; everything else is passed
+    through immediately.
+    """
+
+    def __init__(self):
+        self._line = ""
+        self._emitted = 0  # characters of the current line already sent
+        self._in_block = False
+        self._block_is_edsl = False
+        self._block_lines: List[str] = []
+        self.code_blocks: List[str] = []
+        self.validation_results: List[Dict[str, Any]] = []
+
+    def feed(self, text: str) -> tuple[str, List[Dict[str, Any]]]:
+        """
+        Consumes a chunk of model output.
+        Returns the formatted text ready to send and the code blocks closed by this chunk.
+        """
+        output = []
+        closed = []
+        while text:
+            newline = text.find("\n")
+            if newline == -1:
+                self._line += text
+                if self._emitted or (self._line.strip() and not self._line.lstrip().startswith("`")):
+                    # Not a fence: the line can be streamed as it comes
+                    output.append(self._line[self._emitted:])
+                    self._emitted = len(self._line)
+                break
+            piece, text = text[:newline + 1], text[newline + 1:]
+            self._line += piece
+            output.append(self._finish_line(closed))
+        return "".join(output), closed
+
+    def flush(self) -> tuple[str, List[Dict[str, Any]]]:
+        """Processes a trailing line without newline once the stream has ended."""
+        closed = []
+        output = self._finish_line(closed) if self._line else ""
+        return output, closed
+
+    def _finish_line(self, closed: List[Dict[str, Any]]) -> str:
+        line, emitted = self._line, self._emitted
+        self._line, self._emitted = "", 0
+        stripped = line.strip()
+
+        if stripped.startswith("```"):
+            if not self._in_block:
+                tag = stripped[3:].strip()
+                self._in_block = True
+                self._block_is_edsl = tag in ("", "edsl")
+                self._block_lines = []
+                if not tag:
+                    line = line.replace("```", "```edsl", 1)
+            else:
+                self._in_block = False
+                if self._block_is_edsl:
+                    code = "\n".join(self._block_lines)
+                    validation = validate_edsl_syntax(code)
+                    self.code_blocks.append(code)
+                    self.validation_results.append(validation)
+                    closed.append({
+                        "index": len(self.code_blocks) - 1,
+                        "code": code,
+                        "validation": validation,
+                    })
+        elif self._in_block:
+            self._block_lines.append(line.rstrip("\n"))
+
+        # Only the part of the line that was not sent yet
+        return line[emitted:]
 
 # General RAG template (original functionality)
 general_template = """
@@ -96,8 +242,10 @@ Question: {question}
 Answer in the original language of the question.
 """
 
-# DELIA-specific template
-delia_template = """
+# DELIA-specific templates: the static instructions go in a system message that is
+# identical on every request, so providers can cache its prefill; only the context
+# and question message changes
+delia_system_template = """
 # DELIA - Asistente Experto en EDSL PowerCurve™
 
 ## 🔹 Situación
@@ -158,7 +306,9 @@ Aplica estos conocimientos en tus respuestas:
 - Viñetas con sugerencias de parametrización o buenas prácticas
 - Referencias al documento guía si corresponde
 - Opción de solicitar confirmación antes de aplicar cambios mayores
+"""
 
+delia_template = """
 ## 🔹 Contexto Disponible
 {context}
 
@@ -170,7 +320,10 @@ Responde en el idioma original de la pregunta, aplicando todas las instrucciones
 
 # Create prompts
 general_prompt = ChatPromptTemplate.from_template(general_template)
-delia_prompt = ChatPromptTemplate.from_template(delia_template)
+delia_prompt = ChatPromptTemplate.from_messages([
+    SystemMessage(content=delia_system_template.strip()),
+    ("human", delia_template),
+])
 
 def get_general_rag_chain():
     """Get general RAG chain with lazy initialization."""
@@ -178,11 +331,10 @@ def get_general_rag_chain():
     
     if _general_rag_chain is None:
         try:
-            retriever = get_retriever()
             _general_rag_chain = (
-                {"context": retriever, "question": RunnablePassthrough()}
+                {"context": retrieve_context, "question": RunnablePassthrough()}
                 | general_prompt
-                | llm
+                | get_llm_router()
                 | StrOutputParser()
             )
             logger.info("General RAG chain initialized successfully")
@@ -193,16 +345,22 @@ def get_general_rag_chain():
     return _general_rag_chain
 
 def get_delia_chain():
-    """Get DELIA-specific chain with lazy initialization."""
+    """
+    Get DELIA-specific chain with lazy initialization.
+    It takes {"question", "user_level"}: the bare question is retrieved on,
+    and the user level is only added to the question shown in the prompt.
+    """
     global _delia_chain
     
     if _delia_chain is None:
         try:
-            retriever = get_retriever()
             _delia_chain = (
-                {"context": retriever, "question": RunnablePassthrough()}
+                {
+                    "context": itemgetter("question") | retrieve_context,
+                    "question": RunnableLambda(lambda x: delia_input(x["question"], x["user_level"])),
+                }
                 | delia_prompt
-                | llm
+                | get_llm_router()
                 | StrOutputParser()
             )
             logger.info("DELIA chain initialized successfully")
@@ -212,9 +370,39 @@ def get_delia_chain():
     
     return _delia_chain
 
-def query_delia(question: str, user_level: str = "intermediate") -> Dict[str, Any]:
+def delia_input(question: str, user_level: str) -> str:
+    """The question as the DELIA prompt shows it; retrieval searches the bare question."""
+    return f"[User Level: {user_level}] {question}"
+
+async def query_general(question: str) -> str:
+    """
+    Answer a general question through the RAG chain without blocking the event loop.
+    Answers are served from the answer cache when possible, and identical
+    questions asked while one is being answered share its answer.
+    """
+    if not settings.COALESCE_REQUESTS:
+        return await _query_general(question)
+    return await general_flights.do(coalescing_key("general", question), lambda: _query_general(question))
+
+async def _query_general(question: str) -> str:
+    cache = get_answer_cache()
+    if cache is not None:
+        cached = await cache.get("general", question)
+        if cached is not None:
+            return cached["answer"]
+
+    chain = get_general_rag_chain()
+    answer = await chain.ainvoke(question)
+
+    if cache is not None:
+        await cache.set("general", question, {"answer": answer})
+    return answer
+
+async def query_delia(question: str, user_level: str = "intermediate") -> Dict[str, Any]:
     """
     Enhanced query function for DELIA with additional context and validation.
+    Identical questions at the same user level asked while one is being
+    answered share its answer.
     
     Args:
         question: User's question about EDSL
@@ -223,35 +411,50 @@ def query_delia(question: str, user_level: str = "intermediate") -> Dict[str, An
     Returns:
         Dictionary containing response, validation results, and metadata
     """
+    if not settings.COALESCE_REQUESTS:
+        return await _query_delia(question, user_level)
+    return await delia_flights.do(
+        coalescing_key("delia", question, user_level), lambda: _query_delia(question, user_level)
+    )
+
+async def _query_delia(question: str, user_level: str) -> Dict[str, Any]:
     try:
+        # Serve repeated questions from the answer cache
+        cache = get_answer_cache()
+        if cache is not None:
+            cached = await cache.get("delia", question, user_level)
+            if cached is not None:
+                return cached
+
         # Get the DELIA chain
         chain = get_delia_chain()
         
-        # Add user level context to the question
-        enhanced_question = f"[User Level: {user_level}] {question}"
-        
-        # Get response
-        response = chain.invoke(enhanced_question)
-        
-        # Format response
-        formatted_response = format_edsl_response(response)
-        
-        # Extract EDSL code from response for validation
-        import re
-        edsl_code_blocks = re.findall(r'```edsl\n(.*?)\n```', formatted_response, re.DOTALL)
+        # Get response; the LLM router waits for a free provider slot without holding a thread
+        response = await chain.ainvoke({"question": question, "user_level": user_level})
         
-        validation_results = []
-        for code_block in edsl_code_blocks:
-            validation_results.append(validate_edsl_syntax(code_block))
-        
-        return {
+        with stage("postprocess"):
+            # Format the response and validate its EDSL blocks the same way the stream does,
+            # since both variants share the answer cache
+            formatter = EdslStreamFormatter()
+            text, _ = formatter.feed(response)
+            tail, _ = formatter.flush()
+            formatted_response = text + tail
+
+        result = {
             "response": formatted_response,
-            "validation_results": validation_results,
+            "validation_results": formatter.validation_results,
             "user_level": user_level,
-            "has_edsl_code": len(edsl_code_blocks) > 0,
-            "edsl_code_blocks_count": len(edsl_code_blocks)
+            "has_edsl_code": len(formatter.code_blocks) > 0,
+            "edsl_code_blocks_count": len(formatter.code_blocks)
         }
-        
+
+        if cache is not None:
+            await cache.set("delia", question, result, user_level)
+        return result
+
+    except ProviderBusy:
+        # Surfaced as 429 rather than as an apology in a 200 response
+        raise
     except Exception as e:
         logger.error(f"Error in DELIA query: {e}")
         return {
@@ -263,6 +466,108 @@ def query_delia(question: str, user_level: str = "intermediate") -> Dict[str, An
             "edsl_code_blocks_count": 0
         }
 
+def astream_general(question: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams the general RAG answer as events: one "token" event per chunk and a final "done".
+    A stream already in flight for the same question is joined from its first event.
+    """
+    if not settings.COALESCE_REQUESTS:
+        return _astream_general(question)
+    return general_stream_flights.stream(coalescing_key("general", question), lambda: _astream_general(question))
+
+async def _astream_general(question: str) -> AsyncIterator[Dict[str, Any]]:
+    try:
+        cache = get_answer_cache()
+        cached = await cache.get("general", question) if cache is not None else None
+        if cached is not None:
+            yield {"event": "token", "data": cached["answer"]}
+            yield {"event": "done", "data": {"cached": True}}
+            return
+
+        chain = get_general_rag_chain()
+        parts = []
+        async for chunk in chain.astream(question):
+            if chunk:
+                parts.append(chunk)
+                yield {"event": "token", "data": chunk}
+
+        if cache is not None:
+            await cache.set("general", question, {"answer": "".join(parts)})
+        yield {"event": "done", "data": {"cached": False}}
+    except ProviderBusy:
+        # Raised before the first event, so the endpoint can still answer 429
+        raise
+    except Exception as e:
+        logger.error(f"Error in general RAG stream: {e}")
+        yield {"event": "error", "data": {"error": str(e)}}
+
+def _formatter_events(text: str, closed: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Turns the output of EdslStreamFormatter into stream events."""
+    events = [{"event": "token", "data": text}] if text else []
+    events.extend({"event": "code_block", "data": block} for block in closed)
+    return events
+
+def astream_delia(question: str, user_level: str = "intermediate") -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of query_delia.
+
+    Yields "token" events as the model generates, a "code_block" event with its
+    validation each time an EDSL block closes, and trailing "validation" and
+    "done" events carrying the same metadata as DeliaResponse. A stream already
+    in flight for the same question and user level is joined from its first event.
+    """
+    if not settings.COALESCE_REQUESTS:
+        return _astream_delia(question, user_level)
+    return delia_stream_flights.stream(
+        coalescing_key("delia", question, user_level), lambda: _astream_delia(question, user_level)
+    )
+
+async def _astream_delia(question: str, user_level: str) -> AsyncIterator[Dict[str, Any]]:
+    formatter = EdslStreamFormatter()
+    parts = []
+    try:
+        cache = get_answer_cache()
+        cached = await cache.get("delia", question, user_level) if cache is not None else None
+
+        if cached is not None:
+            # Replay the cached answer through the formatter to rebuild the block events
+            for event in _formatter_events(*formatter.feed(cached["response"])):
+                yield event
+        else:
+            chain = get_delia_chain()
+            async for chunk in chain.astream({"question": question, "user_level": user_level}):
+                text, closed = formatter.feed(chunk)
+                parts.append(text)
+                for event in _formatter_events(text, closed):
+                    yield event
+
+        text, closed = formatter.flush()
+        parts.append(text)
+        for event in _formatter_events(text, closed):
+            yield event
+
+        summary = {
+            "user_level": user_level,
+            "has_edsl_code": len(formatter.code_blocks) > 0,
+            "edsl_code_blocks_count": len(formatter.code_blocks),
+        }
+        if cached is None and cache is not None:
+            await cache.set("delia", question, {
+                "response": "".join(parts),
+                "validation_results": formatter.validation_results,
+                **summary,
+            }, user_level)
+
+        yield {"event": "validation", "data": formatter.validation_results}
+        yield {"event": "done", "data": {**summary, "cached": cached is not None}}
+
+    except ProviderBusy:
+        # Raised before the first event, so the endpoint can still answer 429
+        raise
+    except Exception as e:
+        logger.error(f"Error in DELIA stream: {e}")
+        yield {"event": "error", "data": {"error": str(e)}}
+
 # For backward compatibility - this now returns the GENERAL RAG chain
 def get_rag_chain():
     """Get general RAG chain (backward compatibility)."""
@@ -1,6 +1,8 @@
-from typing import List
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.docstore.document import Document
+import hashlib
+from collections import Counter
+from typing import List, Optional
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 
 def chunk_documents(documents: List[Document]) -> List[Document]:
@@ -11,3 +13,33 @@ def chunk_documents(documents: List[Document]) -> List[Document]:
         length_function=len,
     )
     return text_splitter.split_documents(documents)
+
+
+def chunk_ids(chunks: List[Document], file_hash: str, seen: Optional[Counter] = None) -> List[str]:
+    """
+    Returns a deterministic id for every chunk, derived from the content hash
+    of its file and the contents of the chunk, so the same file uploaded
+    under another name yields the same ids and is not indexed twice.
+
+    Identical text within the same file is told apart by its occurrence
+    number, so re-chunking an unchanged document always yields the same ids.
+    When a document is chunked in parts, passing the same seen counter for
+    every part keeps occurrence numbers consistent across them.
+    """
+    if seen is None:
+        seen = Counter()
+    ids = []
+    for chunk in chunks:
+        content_hash = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
+        occurrence = seen[content_hash]
+        seen[content_hash] += 1
+        ids.append(hashlib.sha256(f"{file_hash}\x1f{content_hash}\x1f{occurrence}".encode("utf-8")).hexdigest())
+    return ids
+
+
+def assign_chunk_ids(chunks: List[Document], file_hash: str, seen: Optional[Counter] = None) -> List[str]:
+    """Sets the id of every chunk as computed by chunk_ids."""
+    ids = chunk_ids(chunks, file_hash, seen)
+    for chunk, chunk_id in zip(chunks, ids):
+        chunk.id = chunk_id
+    return ids
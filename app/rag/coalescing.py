@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from app.db.vector_store import get_corpus_version
+from app.rag.answer_cache import normalize_question
+from app.rag.concurrency import ProviderBusy
+from app.utils.metrics import Counter, Gauge
+from app.utils.timing import stage
+
+T = TypeVar("T")
+
+COALESCED_REQUESTS = Counter(
+    "coalesced_requests_total", "Requests that joined an identical request already in flight.", ["kind"]
+)
+
+
+def coalescing_key(kind: str, question: str, user_level: str = "") -> str:
+    """Identifies requests that must get the same answer: same question, user level and corpus version."""
+    text = f"{kind}\x1f{user_level}\x1f{get_corpus_version()}\x1f{normalize_question(question)}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Shares one execution among concurrent calls with the same key.
+
+    The first call starts the work in its own task and every call that
+    arrives while it runs awaits that same task. The task is shielded, so a
+    caller that goes away does not cancel the answer the others are waiting
+    for; the answer is still computed (and cached) if all of them leave.
+
+    ProviderBusy is about the user who started the work, whose share of the
+    provider queue was full, so callers that joined it try again, the first
+    of them leading the new attempt under its own user.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        while True:
+            task = self._calls.get(key)
+            if task is None:
+                task = self._calls[key] = asyncio.ensure_future(func())
+                task.add_done_callback(lambda done: self._forget(key, done))
+                return await asyncio.shield(task)
+
+            COALESCED_REQUESTS.inc(self.kind)
+            try:
+                with stage("coalesced"):
+                    return await asyncio.shield(task)
+            except ProviderBusy:
+                # _forget ran first, so the next round starts a new attempt or joins one
+                continue
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieved here so an error nobody awaited is not logged as unhandled
+            task.exception()
+
+
+class _Broadcast:
+    """
+    Events of one stream, kept so that late subscribers replay them before
+    following live. Subscribers are counted from the moment they subscribe,
+    before they start iterating, and the source is cancelled once the last
+    one leaves before it has finished.
+    """
+
+    def __init__(self, source: AsyncIterator[Any]):
+        self.events: List[Any] = []
+        self.done = False
+        self.closed = False  # abandoned by every subscriber; cannot be joined
+        self.subscribers = 0
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[Any]) -> None:
+        try:
+            async for event in source:
+                self.events.append(event)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def subscribe(self) -> AsyncIterator[Any]:
+        self.subscribers += 1
+        return self._follow()
+
+    async def _follow(self) -> AsyncIterator[Any]:
+        try:
+            index = 0
+            while True:
+                while index < len(self.events):
+                    yield self.events[index]
+                    index += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if not self.subscribers and not self.done:
+                self.closed = True
+                self.task.cancel()
+
+
+class StreamFlight:
+    """
+    Shares one stream among concurrent calls with the same key.
+
+    The first call starts consuming the source in its own task; every
+    subscriber, including the first, receives all of its events from the
+    start, at its own pace. The source runs at the speed of the producer and
+    is cancelled, giving its provider slot back, when every subscriber has
+    disconnected; a later identical call starts a new one.
+
+    As with SingleFlight, a subscriber that joined a stream whose source
+    raised ProviderBusy before its first event tries again under its own user.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._streams: Dict[str, _Broadcast] = {}
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def stream(self, key: str, source: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        # Joined right away, so the subscriber counts before it starts iterating
+        return self._follow(key, source, *self._join(key, source))
+
+    def _join(self, key: str, source: Callable[[], AsyncIterator[Any]]) -> Tuple[AsyncIterator[Any], bool]:
+        """Subscribes to the stream in flight for the key, or starts one; tells whether it was started."""
+        broadcast = self._streams.get(key)
+        if broadcast is None or broadcast.closed or broadcast.error is not None:
+            broadcast = self._streams[key] = _Broadcast(source())
+            broadcast.task.add_done_callback(lambda _: self._forget(key, broadcast))
+            return broadcast.subscribe(), True
+        COALESCED_REQUESTS.inc(self.kind)
+        return broadcast.subscribe(), False
+
+    async def _follow(
+        self, key: str, source: Callable[[], AsyncIterator[Any]], events: AsyncIterator[Any], started: bool
+    ) -> AsyncIterator[Any]:
+        emitted = False
+        try:
+            while True:
+                try:
+                    async for event in events:
+                        emitted = True
+                        yield event
+                    return
+                except ProviderBusy:
+                    if started or emitted:
+                        raise
+                await events.aclose()
+                events, started = self._join(key, source)
+        finally:
+            await events.aclose()
+
+    def _forget(self, key: str, broadcast: _Broadcast) -> None:
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+
+
+general_flights = SingleFlight("general")
+delia_flights = SingleFlight("delia")
+general_stream_flights = StreamFlight("general_stream")
+delia_stream_flights = StreamFlight("delia_stream")
+
+Gauge(
+    "coalescing_in_flight", "Distinct requests in flight that identical requests can join.", ["kind"],
+    callback=lambda: {
+        (flights.kind,): len(flights)
+        for flights in (general_flights, delia_flights, general_stream_flights, delia_stream_flights)
+    },
+)
@@ -0,0 +1,273 @@
+import asyncio
+import heapq
+import itertools
+import threading
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.utils.metrics import Counter, Gauge
+
+# User on whose behalf the current request calls the LLM, set once the request is admitted
+current_tenant: ContextVar[str] = ContextVar("current_tenant", default="anonymous")
+
+LLM_ADMISSION_REJECTIONS = Counter(
+    "llm_admission_rejections_total", "LLM calls turned away because the provider queue was full.",
+    ["provider", "reason"],
+)
+
+
+class ProviderBusy(Exception):
+    """Raised instead of queueing an LLM call when the provider queue, or the user's share of it, is full."""
+
+    def __init__(self, provider: str, reason: str, retry_after: float):
+        super().__init__(f"LLM provider {provider} is busy ({reason}), retry after {retry_after:g}s")
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def get_user_weight(tenant: str) -> float:
+    """Returns a user's share of the provider slots relative to others (1 by default)."""
+    return max(settings.LLM_USER_WEIGHTS.get(tenant, 1.0), 1e-3)
+
+
+class _ThreadWaiter:
+    """Stands in for the future of an asyncio waiter when a slot is awaited from a plain thread."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def done(self) -> bool:
+        return self._event.is_set()
+
+    def set_result(self, _) -> None:
+        self._event.set()
+
+    def wait(self) -> None:
+        self._event.wait()
+
+
+class ProviderSemaphore:
+    """
+    Bounds the in-flight calls to a provider and hands free slots to waiting
+    users in weighted fair order (start-time fair queueing): a user with many
+    queued calls waits behind the first call of everyone else instead of in
+    front of them, and a user of weight 2 gets twice the slots of one of
+    weight 1 while both are waiting.
+
+    A user with max_waiting_per_user calls already queued, or a provider with
+    max_waiting, has further calls rejected with ProviderBusy instead of
+    queued. Holders and waiters are counted so queue depths can be reported.
+
+    Use it with async with from the event loop, or with with from threads
+    running synchronous calls; both draw from the same slots and queue. The
+    slots and queue belong to one process: with several API workers, each
+    one allows limit calls in flight and its own queue.
+    """
+
+    def __init__(self, provider: str, limit: int, max_waiting: int = 0, max_waiting_per_user: int = 0):
+        self.provider = provider
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.max_waiting_per_user = max_waiting_per_user
+        self.in_flight = 0
+        self.waiting = 0
+        self.waiting_by_tenant: Dict[str, int] = {}
+        # Heap of [start tag, sequence, future]; entries of cancelled waiters are skipped
+        self._queue: List[list] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._finish_tags: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def rejection(self, tenant: str) -> Optional[str]:
+        """Why a call of this user would be turned away right now, or None if it would be queued or served."""
+        if self.in_flight < self.limit and not self.waiting:
+            return None
+        if self.max_waiting_per_user and self.waiting_by_tenant.get(tenant, 0) >= self.max_waiting_per_user:
+            return "user_queue_full"
+        if self.max_waiting and self.waiting >= self.max_waiting:
+            return "queue_full"
+        return None
+
+    def _start_tag(self, tenant: str) -> float:
+        start = max(self._virtual_time, self._finish_tags.get(tenant, 0.0))
+        self._finish_tags[tenant] = start + 1.0 / get_user_weight(tenant)
+        if len(self._finish_tags) > 10000:
+            # Users whose last call started in the past have no credit left to remember
+            self._finish_tags = {t: f for t, f in self._finish_tags.items() if f > self._virtual_time}
+        return start
+
+    def _enqueue(self, tenant: str, waiter: Any) -> bool:
+        """Takes a free slot, or queues waiter for one and returns False. Call with the lock held."""
+        if self.in_flight < self.limit and not self.waiting:
+            self._start_tag(tenant)
+            self.in_flight += 1
+            return True
+
+        reason = self.rejection(tenant)
+        if reason is not None:
+            LLM_ADMISSION_REJECTIONS.inc(self.provider, reason)
+            raise ProviderBusy(self.provider, reason, settings.LLM_BUSY_RETRY_AFTER_SECONDS)
+
+        heapq.heappush(self._queue, [self._start_tag(tenant), next(self._sequence), waiter])
+        self.waiting += 1
+        self.waiting_by_tenant[tenant] = self.waiting_by_tenant.get(tenant, 0) + 1
+        self._dispatch()
+        return False
+
+    def _dequeue(self, tenant: str) -> None:
+        with self._lock:
+            self.waiting -= 1
+            self.waiting_by_tenant[tenant] -= 1
+            if not self.waiting_by_tenant[tenant]:
+                del self.waiting_by_tenant[tenant]
+
+    async def acquire(self, tenant: Optional[str] = None) -> bool:
+        tenant = tenant or current_tenant.get()
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            if self._enqueue(tenant, future):
+                return True
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Cancelled right after being handed a slot: pass it on
+                self.release()
+            raise
+        finally:
+            self._dequeue(tenant)
+        return True
+
+    def acquire_sync(self, tenant: Optional[str] = None) -> bool:
+        """Blocks the calling thread, which must not run the event loop, until a slot is free."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("acquire_sync would block the event loop; use acquire")
+        tenant = tenant or current_tenant.get()
+        waiter = _ThreadWaiter()
+        with self._lock:
+            if self._enqueue(tenant, waiter):
+                return True
+        try:
+            waiter.wait()
+        finally:
+            self._dequeue(tenant)
+        return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hands free slots to the waiters with the lowest start tags. Call with the lock held."""
+        while self._queue and self.in_flight < self.limit:
+            start, _, waiter = heapq.heappop(self._queue)
+            if waiter.done():
+                continue
+            self._virtual_time = start
+            self.in_flight += 1
+            self._wake(waiter)
+
+    def _wake(self, waiter: Any) -> None:
+        if isinstance(waiter, _ThreadWaiter):
+            waiter.set_result(None)
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is waiter.get_loop():
+            waiter.set_result(None)
+        else:
+            # Released from another thread: resolve the future on its own loop
+            waiter.get_loop().call_soon_threadsafe(self._resolve, waiter)
+
+    def _resolve(self, future: asyncio.Future) -> None:
+        if future.done():
+            # Cancelled while the slot was on its way
+            self.release()
+        else:
+            future.set_result(None)
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
+    def __enter__(self) -> None:
+        self.acquire_sync()
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+# One semaphore per LLM provider, created lazily on first use
+_provider_semaphores: Dict[str, ProviderSemaphore] = {}
+
+Gauge(
+    "llm_provider_in_flight", "LLM calls holding a provider slot.", ["provider"],
+    callback=lambda: {(name,): s.in_flight for name, s in list(_provider_semaphores.items())},
+)
+Gauge(
+    "llm_provider_waiting", "LLM calls queued for a provider slot.", ["provider"],
+    callback=lambda: {(name,): s.waiting for name, s in list(_provider_semaphores.items())},
+)
+Gauge(
+    "llm_provider_waiting_users", "Users with LLM calls queued for a provider slot.", ["provider"],
+    callback=lambda: {(name,): len(s.waiting_by_tenant) for name, s in list(_provider_semaphores.items())},
+)
+
+
+def get_provider_limit(provider: str) -> int:
+    """Returns the configured number of concurrent LLM calls for a provider."""
+    provider = provider.lower()
+    return settings.LLM_CONCURRENCY_LIMITS.get(provider, settings.LLM_DEFAULT_CONCURRENCY)
+
+
+def get_provider_semaphore(provider: str) -> ProviderSemaphore:
+    """Returns the semaphore that bounds in-flight requests for a provider."""
+    provider = provider.lower()
+    semaphore = _provider_semaphores.get(provider)
+    if semaphore is None:
+        semaphore = ProviderSemaphore(
+            provider,
+            get_provider_limit(provider),
+            max_waiting=settings.LLM_MAX_WAITING,
+            max_waiting_per_user=settings.LLM_MAX_WAITING_PER_USER,
+        )
+        _provider_semaphores[provider] = semaphore
+    return semaphore
+
+
+def check_admission(tenant: str, providers: Iterable[str]) -> None:
+    """
+    Raises ProviderBusy when none of the providers would queue another call
+    of this user, so the request can be turned away before any work is done.
+    """
+    providers = list(providers)
+    reasons = [get_provider_semaphore(provider).rejection(tenant) for provider in providers]
+    if reasons and all(reasons):
+        for provider, reason in zip(providers, reasons):
+            LLM_ADMISSION_REJECTIONS.inc(provider, reason)
+        raise ProviderBusy(", ".join(providers), reasons[0], settings.LLM_BUSY_RETRY_AFTER_SECONDS)
+
+
+@asynccontextmanager
+async def provider_slot(provider: str | None = None) -> AsyncIterator[None]:
+    """
+    Waits for a free slot on the given provider (defaults to the configured one).
+    Callers waiting here hold no thread, so a single worker can keep hundreds of
+    requests in flight while only the configured number reach the provider.
+    """
+    semaphore = get_provider_semaphore(provider or settings.LLM_PROVIDER)
+    async with semaphore:
+        yield
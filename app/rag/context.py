@@ -0,0 +1,169 @@
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Set
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.utils.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+# Chunks whose word shingles overlap at least this much with an already packed passage are dropped
+NEAR_DUPLICATE_THRESHOLD = 0.8
+SHINGLE_SIZE = 5
+# Shortest shared prefix/suffix taken as the splitter's overlap between two consecutive chunks
+MIN_MERGE_OVERLAP = 20
+# Below this many remaining tokens a chunk that does not fit is skipped rather than truncated
+MIN_TRUNCATED_TOKENS = 64
+
+CONTEXT_TOKENS = Histogram(
+    "rag_context_tokens", "Tokens of retrieved context packed into each prompt.",
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+
+_token_counter = None
+
+
+def get_token_counter() -> Callable[[str], int]:
+    """Counts tokens with tiktoken, or estimates four characters per token if the encoding cannot be loaded."""
+    global _token_counter
+
+    if _token_counter is None:
+        try:
+            import tiktoken
+            encoding = tiktoken.get_encoding(settings.CONTEXT_TOKEN_ENCODING)
+            _token_counter = lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception as e:
+            logger.warning(f"tiktoken encoding unavailable, estimating tokens from length: {e}")
+            _token_counter = lambda text: max(1, len(text) // 4)
+    return _token_counter
+
+
+def _shingles(text: str) -> Set[tuple]:
+    words = _WORD_PATTERN.findall(text.casefold())
+    if len(words) <= SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _overlap(head: str, tail: str) -> int:
+    """Length of the longest suffix of head that is also a prefix of tail, 0 if shorter than MIN_MERGE_OVERLAP."""
+    probe = tail[:MIN_MERGE_OVERLAP]
+    if len(probe) < MIN_MERGE_OVERLAP:
+        return 0
+    start = head.find(probe)
+    while start != -1:
+        if tail.startswith(head[start:]):
+            return len(head) - start
+        start = head.find(probe, start + 1)
+    return 0
+
+
+def _header(number: int, source: str, page: Optional[int]) -> str:
+    header = f"[{number}] {os.path.basename(source) or 'documento'}"
+    if page is not None:
+        header += f" (p. {page})"
+    return header
+
+
+@dataclass
+class _Passage:
+    source: str
+    page: Optional[int]
+    text: str
+    shingles: Set[tuple]
+
+
+class ContextPacker:
+    """
+    Turns ranked chunks into the {context} text of a prompt within a token budget.
+
+    Chunks are taken in retrieval order, so the best ranked content is packed
+    first. Near-duplicates of text already packed are dropped, and a chunk
+    that overlaps a packed chunk of the same source, as consecutive splitter
+    chunks do, is merged into it so only its new text is paid for. The first
+    chunk that no longer fits is truncated to the remaining budget and
+    packing stops.
+    """
+
+    def __init__(self, max_tokens: int, count_tokens: Optional[Callable[[str], int]] = None):
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens or get_token_counter()
+
+    def pack(self, documents: List[Document]) -> str:
+        passages: List[_Passage] = []
+        used = 0
+        for doc in documents:
+            text = doc.page_content.strip()
+            if not text:
+                continue
+            shingles = _shingles(text)
+            if self._is_duplicate(shingles, passages):
+                continue
+
+            source = str(doc.metadata.get("source", ""))
+            page = doc.metadata.get("page")
+            passage, added, append = self._merge(source, text, passages)
+            # A new passage also pays for its header and the blank line separating it
+            overhead = 0 if passage is not None else self.count_tokens(_header(len(passages) + 1, source, page)) + 2
+            cost = overhead + (self.count_tokens(added) if added else 0)
+
+            if used + cost > self.max_tokens:
+                remaining = self.max_tokens - used - overhead
+                if passage is None and remaining >= MIN_TRUNCATED_TOKENS:
+                    passages.append(_Passage(source, page, self._truncate(text, remaining), shingles))
+                    used += overhead + remaining  # upper bound for the truncated chunk
+                break
+
+            used += cost
+            if passage is None:
+                passages.append(_Passage(source, page, text, shingles))
+            else:
+                passage.text = passage.text + added if append else added + passage.text
+                passage.shingles |= shingles
+
+        CONTEXT_TOKENS.observe(used)
+        return self._format(passages)
+
+    def _is_duplicate(self, shingles: Set[tuple], passages: List[_Passage]) -> bool:
+        if not shingles:
+            return False
+        for passage in passages:
+            if len(shingles & passage.shingles) / len(shingles) >= NEAR_DUPLICATE_THRESHOLD:
+                return True
+        return False
+
+    def _merge(self, source: str, text: str, passages: List[_Passage]):
+        """
+        Finds a packed passage of the same source that text continues or precedes.
+        Returns the passage, the part of text it lacks and whether that part goes after it.
+        """
+        for passage in passages:
+            if passage.source != source:
+                continue
+            overlap = _overlap(passage.text, text)
+            if overlap:
+                return passage, text[overlap:], True
+            overlap = _overlap(text, passage.text)
+            if overlap:
+                return passage, text[:len(text) - overlap], False
+        return None, text, True
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        # Proportional first cut, then shrink until the count fits
+        cut = len(text) * max_tokens // max(self.count_tokens(text), 1)
+        while cut > 0 and self.count_tokens(text[:cut]) > max_tokens:
+            cut = cut * 9 // 10
+        return text[:cut].rstrip() + " …"
+
+    @staticmethod
+    def _format(passages: List[_Passage]) -> str:
+        return "\n\n".join(
+            f"{_header(i, passage.source, passage.page)}\n{passage.text}"
+            for i, passage in enumerate(passages, start=1)
+        )
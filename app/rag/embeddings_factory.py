@@ -1,31 +1,272 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain_ollama import OllamaEmbeddings
-from langchain.embeddings.base import Embeddings
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
 
 from app.core.config import settings
+from app.utils.metrics import Counter, Gauge
+from app.utils.timing import stage
 
+logger = logging.getLogger(__name__)
 
-def get_embeddings() -> Embeddings:
+# Global variable to store the embeddings instance
+_embeddings = None
+
+
+class _QueryBatcher:
     """
-    Factory function to get the appropriate embeddings based on configuration.
+    Merges concurrent embed_query calls into a single embed_documents call.
+
+    The first caller of a batch becomes its leader: it waits for the batch
+    window, takes every text submitted meanwhile and embeds them together.
+    The other callers just wait for their result.
     """
+
+    def __init__(self, embed_many: Callable[[List[str]], List[List[float]]], window_ms: float, max_batch_size: int):
+        self.embed_many = embed_many
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, Future]] = []
+        self._collecting = False
+
+    def submit(self, text: str) -> List[float]:
+        future: Future = Future()
+        with self._lock:
+            self._pending.append((text, future))
+            is_leader = not self._collecting
+            self._collecting = True
+
+        if is_leader:
+            time.sleep(self.window)
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._collecting = False
+            for start in range(0, len(batch), self.max_batch_size):
+                self._run(batch[start:start + self.max_batch_size])
+
+        return future.result()
+
+    def _run(self, batch: List[Tuple[str, Future]]) -> None:
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = dict(zip(texts, self.embed_many(texts)))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for text, future in batch:
+            future.set_result(vectors[text])
+
+
+class _SQLiteEmbeddingStore:
+    """Persistent key/vector store so cached embeddings survive restarts."""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._lock = threading.Lock()
+
+    def mget(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update((key, np.frombuffer(vector, dtype=np.float32).tolist()) for key, vector in rows)
+        return found
+
+    def mset(self, items: Dict[str, List[float]]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()],
+            )
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with a bounded in-memory LRU, an optional persistent
+    store and micro-batching of concurrent query embeddings.
+
+    Cache keys combine the provider, the model and a hash of the text, so
+    switching models never returns stale vectors.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        namespace: str,
+        max_entries: int = 10000,
+        store_path: str = "",
+        batch_window_ms: float = 5,
+        max_batch_size: int = 64,
+    ):
+        self.underlying = underlying
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._store = _SQLiteEmbeddingStore(store_path) if store_path else None
+        self._batcher = (
+            _QueryBatcher(self._embed_missing, batch_window_ms, max_batch_size)
+            if batch_window_ms > 0 else None
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        return f"{self.namespace}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    found[key] = vector
+
+        missing = [key for key in keys if key not in found]
+        if missing and self._store is not None:
+            stored = self._store.mget(missing)
+            self._remember(stored)
+            found.update(stored)
+        return found
+
+    def _remember(self, items: Dict[str, List[float]]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            for key, vector in items.items():
+                self._lru[key] = vector
+                self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def _embed_missing(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.underlying.embed_documents(texts)
+        items = {self._key(text): vector for text, vector in zip(texts, vectors)}
+        self._remember(items)
+        if self._store is not None:
+            self._store.mset(items)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(keys)
+
+        missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in found))
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            for text, vector in zip(missing, self._embed_missing(missing)):
+                found[self._key(text)] = vector
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        with stage("embed"):
+            key = self._key(text)
+            vector = self._lookup([key]).get(key)
+            if vector is not None:
+                with self._lock:
+                    self.hits += 1
+                return vector
+
+            with self._lock:
+                self.misses += 1
+            if self._batcher is not None:
+                return self._batcher.submit(text)
+            return self._embed_missing([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # Goes through the same batcher as the synchronous calls made by the retriever threads
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed_query, text)
+
+
+def _create_embeddings() -> Tuple[Embeddings, str]:
+    """Builds the provider embeddings and returns them with their cache namespace."""
+    # Provider SDKs are imported here so a deployment only loads the one it uses
     if settings.LLM_PROVIDER == "openai":
+        from langchain_openai import OpenAIEmbeddings
+
         if not settings.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY is required when using OpenAI provider")
-        return OpenAIEmbeddings(api_key=settings.OPENAI_API_KEY)
-    
+        embeddings = OpenAIEmbeddings(api_key=settings.OPENAI_API_KEY)
+        return embeddings, f"openai:{embeddings.model}"
+
     elif settings.LLM_PROVIDER == "ollama":
+        from langchain_ollama import OllamaEmbeddings
+
         # Use Ollama embeddings - defaults to nomic-embed-text model
         return OllamaEmbeddings(
             base_url=settings.OLLAMA_API_BASE_URL,
             model="nomic-embed-text"  # A good embedding model for Ollama
-        )
-    
+        ), "ollama:nomic-embed-text"
+
+    elif settings.LLM_PROVIDER == "stub":
+        from app.rag.stubs import StubEmbeddings
+
+        return StubEmbeddings(
+            dimension=settings.STUB_EMBEDDING_DIMENSION,
+            latency_ms=settings.STUB_EMBEDDING_LATENCY_MS,
+        ), f"stub:{settings.STUB_EMBEDDING_DIMENSION}"
+
     else:
         # Default fallback to a simple embedding model for other providers
         # For now, use Ollama as it doesn't require API keys
-        print(f"Warning: {settings.LLM_PROVIDER} embeddings not specifically configured. Using Ollama embeddings as fallback.")
+        from langchain_ollama import OllamaEmbeddings
+
+        logger.warning(f"{settings.LLM_PROVIDER} embeddings not specifically configured. Using Ollama embeddings as fallback.")
         return OllamaEmbeddings(
             base_url=settings.OLLAMA_API_BASE_URL,
             model="nomic-embed-text"
+        ), "ollama:nomic-embed-text"
+
+
+Counter(
+    "embedding_cache_lookups_total", "Embedding cache lookups by result.", ["result"],
+    callback=lambda: {} if _embeddings is None else {("hit",): _embeddings.hits, ("miss",): _embeddings.misses},
+)
+Gauge(
+    "embedding_batch_pending", "Query embeddings waiting for the current micro-batch.",
+    callback=lambda: {} if _embeddings is None or _embeddings._batcher is None else {(): len(_embeddings._batcher._pending)},
+)
+
+
+def get_embeddings() -> Embeddings:
+    """
+    Factory function to get the appropriate embeddings based on configuration.
+    The provider embeddings are wrapped in a CachedEmbeddings instance shared by the process.
+    """
+    global _embeddings
+
+    if _embeddings is None:
+        embeddings, namespace = _create_embeddings()
+        _embeddings = CachedEmbeddings(
+            embeddings,
+            namespace=namespace,
+            max_entries=settings.EMBEDDING_CACHE_SIZE,
+            store_path=settings.EMBEDDING_CACHE_PATH,
+            batch_window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+            max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE,
         )
+    return _embeddings
@@ -0,0 +1,236 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.db.job_store import JobStore
+from app.db.vector_store import bump_corpus_version
+from app.rag.pipeline import IngestionPipeline
+from app.utils.metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+# Number of finished jobs kept around for status queries
+MAX_TRACKED_JOBS = 1000
+
+_job_manager = None
+
+
+class JobQueueFullError(Exception):
+    """Raised when too many ingestion jobs are already waiting."""
+
+
+@dataclass
+class IngestionJob:
+    """Status and progress of the ingestion of one or more documents."""
+    filename: str  # file name, or a description of the batch for bulk uploads
+    file_paths: List[str]
+    files: List[Tuple[str, str]] = field(default_factory=list, repr=False)
+    temp_dir: Optional[str] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"  # queued, running, completed, failed
+    files_total: int = 0
+    files_parsed: int = 0
+    files_unchanged: int = 0
+    failed_files: Dict[str, str] = field(default_factory=dict)
+    pages_parsed: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_written: int = 0
+    chunks_unchanged: int = 0
+    chunks_deleted: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        del data["file_paths"], data["files"], data["temp_dir"]
+        return data
+
+
+class IngestionJobManager:
+    """
+    Runs document ingestion in the background.
+
+    Jobs are executed by a bounded thread pool, each one through an
+    IngestionPipeline. The CPU-bound parsing step, split into page ranges for
+    PDFs, is sent to a process pool shared by all jobs so it never competes
+    with the API workers for the GIL.
+    Progress is recorded on the job as each batch completes.
+
+    With a job store, the state of each job is also written there when it
+    changes status and every sync_interval seconds while it runs, so status
+    queries answered by another API worker see it too.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int,
+        parse_workers: int,
+        max_pending: int,
+        embed_batch_size: int,
+        embed_workers: int,
+        pages_per_task: int = 16,
+        job_store: Optional[JobStore] = None,
+        sync_interval: float = 1.0,
+    ):
+        self.max_pending = max_pending
+        self.parse_workers = parse_workers
+        self.embed_batch_size = embed_batch_size
+        self.embed_workers = embed_workers
+        self.pages_per_task = pages_per_task
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="ingest")
+        # spawn avoids forking a process that already runs server threads
+        self._parse_pool = ProcessPoolExecutor(
+            max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._store = job_store
+        self._stop = threading.Event()
+        if job_store is not None:
+            threading.Thread(target=self._sync, args=(sync_interval,), daemon=True, name="ingest-sync").start()
+
+    def _save(self, job: IngestionJob) -> None:
+        if self._store is None:
+            return
+        try:
+            self._store.save(job.id, job.to_dict())
+        except Exception as e:
+            logger.warning(f"Could not save the state of ingestion job {job.id}: {e}")
+
+    def _sync(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            for job in [job for job in list(self._jobs.values()) if job.status == "running"]:
+                self._save(job)
+
+    def submit(
+        self,
+        files: List[Tuple[str, str]],
+        name: Optional[str] = None,
+        temp_dir: Optional[str] = None,
+    ) -> IngestionJob:
+        """
+        Queues (path, display name) pairs for ingestion as a single job.
+        The job takes ownership of the files, and of temp_dir if given, and deletes them when done.
+        """
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job.status in ("queued", "running"))
+            if pending >= self.max_pending:
+                raise JobQueueFullError(f"{pending} ingestion jobs are already pending")
+
+            job = IngestionJob(
+                filename=name or files[0][1],
+                file_paths=[path for path, _ in files],
+                files=list(files),
+                files_total=len(files),
+                temp_dir=temp_dir,
+            )
+            self._jobs[job.id] = job
+            while len(self._jobs) > MAX_TRACKED_JOBS:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.status in ("queued", "running"):
+                    break
+                del self._jobs[oldest_id]
+
+        self._save(job)
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        """Returns a job of this process, or the last state saved by any process."""
+        job = self._jobs.get(job_id)
+        if job is not None or self._store is None:
+            return job
+        state = self._store.load(job_id)
+        return IngestionJob(file_paths=[], **state) if state is not None else None
+
+    def _run(self, job: IngestionJob) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        self._save(job)
+        try:
+            pipeline = IngestionPipeline(
+                self._parse_pool,
+                parse_concurrency=self.parse_workers,
+                embed_batch_size=self.embed_batch_size,
+                embed_workers=self.embed_workers,
+                pages_per_task=self.pages_per_task,
+            )
+            pipeline.run(job.files, job)
+            if job.chunks_written or job.chunks_deleted:
+                # Invalidate answers computed against the previous corpus
+                bump_corpus_version()
+
+            if job.files_parsed == 0 and job.files_unchanged == 0:
+                raise ValueError("Could not load any document.")
+            job.status = "completed"
+            logger.info(f"Ingested '{job.filename}': {job.files_parsed} files, {job.chunks_written} chunks")
+
+        except Exception as e:
+            logger.error(f"Error processing {job.filename}: {e}")
+            job.status = "failed"
+            job.error = str(e)
+
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+            for path in job.file_paths:
+                try:
+                    if os.path.isfile(path):
+                        os.remove(path)
+                except Exception as cleanup_error:
+                    logger.warning(f"Could not clean up temporary file {path}: {cleanup_error}")
+            if job.temp_dir:
+                shutil.rmtree(job.temp_dir, ignore_errors=True)
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._parse_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _jobs_by_status() -> Dict[tuple, float]:
+    if _job_manager is None:
+        return {}
+    counts = {("queued",): 0, ("running",): 0}
+    for job in list(_job_manager._jobs.values()):
+        if job.status in ("queued", "running"):
+            counts[(job.status,)] += 1
+    return counts
+
+
+Gauge("ingest_jobs", "Ingestion jobs waiting or running.", ["status"], callback=_jobs_by_status)
+
+
+def get_job_manager() -> IngestionJobManager:
+    """Returns the ingestion job manager using lazy initialization."""
+    global _job_manager
+
+    if _job_manager is None:
+        _job_manager = IngestionJobManager(
+            max_jobs=settings.INGEST_MAX_CONCURRENT_JOBS,
+            parse_workers=settings.INGEST_PARSE_WORKERS,
+            max_pending=settings.INGEST_MAX_PENDING_JOBS,
+            embed_batch_size=settings.INGEST_EMBED_BATCH_SIZE,
+            embed_workers=settings.INGEST_EMBED_WORKERS,
+            pages_per_task=settings.INGEST_PDF_PAGES_PER_TASK,
+            job_store=JobStore(settings.INGEST_JOB_STORE_PATH, MAX_TRACKED_JOBS),
+        )
+    return _job_manager
+
+
+def shutdown_job_manager() -> None:
+    """Stops the ingestion pools if they were started."""
+    if _job_manager is not None:
+        _job_manager.shutdown()
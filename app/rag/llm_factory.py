@@ -1,35 +1,138 @@
-from langchain_anthropic import ChatAnthropic
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
-from langchain_ollama import OllamaLLM
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from langchain_core.messages import SystemMessage
+from langchain_core.prompt_values import ChatPromptValue, PromptValue
 from app.core.config import settings
+from app.rag.router import LLMRouter
+from app.utils.metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+# Router over the configured providers, built on first use
+_llm_router: Optional[LLMRouter] = None
+
+# Each builder imports its provider SDK itself, so a deployment only loads the SDKs it uses
+
+def _openai():
+    from langchain_openai import ChatOpenAI
+
+    if not settings.OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY is not set")
+    return ChatOpenAI(api_key=settings.OPENAI_API_KEY)
+
+def _anthropic():
+    from langchain_anthropic import ChatAnthropic
+
+    if not settings.ANTHROPIC_API_KEY:
+        raise ValueError("ANTHROPIC_API_KEY is not set")
+    return ChatAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+
+def _gemini():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    if not settings.GEMINI_API_KEY:
+        raise ValueError("GEMINI_API_KEY is not set")
+    return ChatGoogleGenerativeAI(google_api_key=settings.GEMINI_API_KEY, model="gemini-pro")
+
+def _ollama():
+    from langchain_ollama import OllamaLLM
+
+    # Keeping the model loaded lets Ollama reuse the KV cache of the shared prompt prefix
+    return OllamaLLM(
+        base_url=settings.OLLAMA_API_BASE_URL,
+        model=settings.OLLAMA_MODEL,
+        keep_alive=settings.OLLAMA_KEEP_ALIVE if settings.PROMPT_CACHE_ENABLED else None,
+    )
+
+def _stub():
+    from app.rag.stubs import StubLLM
+
+    # Local stand-in for load tests, see benchmarks/load_benchmark.py
+    return StubLLM(first_token_ms=settings.STUB_LLM_FIRST_TOKEN_MS, token_ms=settings.STUB_LLM_TOKEN_MS)
+
+LLM_PROVIDERS: Dict[str, Callable[[], Any]] = {
+    "openai": _openai,
+    "anthropic": _anthropic,
+    "gemini": _gemini,
+    "ollama": _ollama,
+    "stub": _stub,
+}
+
+def get_llm(provider: str | None = None):
+    """Factory function to get the LLM based on the provider (defaults to LLM_PROVIDER)."""
+    provider = (provider or settings.LLM_PROVIDER).lower()
+    builder = LLM_PROVIDERS.get(provider)
+    if builder is None:
+        raise ValueError(f"Unsupported LLM provider: {provider}")
+    return builder()
+
+def prepare_input(provider: str, input: Any) -> Any:
+    """
+    Marks the static system message of a prompt for the provider's prompt cache.
+
+    Anthropic only caches up to an explicit cache_control breakpoint, which the
+    other providers would reject, so it is added per call once the router has
+    chosen Anthropic. OpenAI and Gemini cache repeated prefixes on their own and
+    Ollama reuses the KV cache of a loaded model, so for them it is enough that
+    the system message comes first and never changes.
 
-def get_llm():
-    """Factory function to get the LLM based on the provider."""
-    provider = settings.LLM_PROVIDER.lower()
+    Anthropic ignores breakpoints on prefixes shorter than its minimum (1024
+    tokens, 2048 on Haiku). The DELIA instructions are about 3.4k characters,
+    close to or below that, so the breakpoint only takes effect once they
+    grow; prompt_cache_benchmark reports their size and the cache hits.
+    """
+    if not settings.PROMPT_CACHE_ENABLED or provider != "anthropic" or not isinstance(input, PromptValue):
+        return input
+    messages = input.to_messages()
+    for i, message in enumerate(messages):
+        if isinstance(message, SystemMessage) and isinstance(message.content, str):
+            messages[i] = SystemMessage(content=[
+                {"type": "text", "text": message.content, "cache_control": {"type": "ephemeral"}},
+            ])
+            break
+    return ChatPromptValue(messages=messages)
 
-    if provider == "openai":
-        if not settings.OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY is not set")
-        return ChatOpenAI(api_key=settings.OPENAI_API_KEY)
+def build_llm_router() -> LLMRouter:
+    """
+    Builds a router over LLM_PROVIDER and LLM_FALLBACK_PROVIDERS.
+    A fallback that cannot be configured, e.g. for a missing API key, is skipped.
+    """
+    providers = {settings.LLM_PROVIDER.lower(): get_llm()}
+    for provider in settings.LLM_FALLBACK_PROVIDERS:
+        provider = provider.lower()
+        if provider in providers:
+            continue
+        try:
+            providers[provider] = get_llm(provider)
+        except ValueError as e:
+            logger.warning(f"Skipping fallback LLM provider {provider}: {e}")
 
-    elif provider == "anthropic":
-        if not settings.ANTHROPIC_API_KEY:
-            raise ValueError("ANTHROPIC_API_KEY is not set")
-        return ChatAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+    return LLMRouter(
+        providers,
+        hedge_after=settings.LLM_HEDGE_AFTER_SECONDS or None,
+        window=settings.LLM_ROUTER_WINDOW,
+        max_error_rate=settings.LLM_ROUTER_MAX_ERROR_RATE,
+        cooldown=settings.LLM_ROUTER_COOLDOWN_SECONDS,
+        prepare_input=prepare_input,
+    )
 
-    elif provider == "gemini":
-        if not settings.GEMINI_API_KEY:
-            raise ValueError("GEMINI_API_KEY is not set")
-        return ChatGoogleGenerativeAI(google_api_key=settings.GEMINI_API_KEY, model="gemini-pro")
+def get_llm_router() -> LLMRouter:
+    """Returns the process-wide LLM router using lazy initialization."""
+    global _llm_router
 
-    elif provider == "ollama":
-        return OllamaLLM(
-            base_url=settings.OLLAMA_API_BASE_URL,
-            model=settings.OLLAMA_MODEL,
-        )
+    if _llm_router is None:
+        _llm_router = build_llm_router()
+    return _llm_router
 
-    else:
-        raise ValueError(f"Unsupported LLM provider: {settings.LLM_PROVIDER}")
+def _router_stats() -> Dict[str, Dict[str, Any]]:
+    return {} if _llm_router is None else _llm_router.stats()
 
-llm = get_llm()
+Gauge(
+    "llm_provider_healthy", "Whether the router currently sends calls to a provider.", ["provider"],
+    callback=lambda: {(name,): float(s["healthy"]) for name, s in _router_stats().items()},
+)
+Gauge(
+    "llm_provider_error_rate", "Error rate of a provider over the router window.", ["provider"],
+    callback=lambda: {(name,): s["error_rate"] for name, s in _router_stats().items()},
+)
@@ -1,24 +1,134 @@
-from typing import List
-from langchain_community.document_loaders import (
-    UnstructuredPDFLoader,
-    TextLoader,
-    JSONLoader,
-    UnstructuredExcelLoader,
-)
-from langchain.schema import Document
+import importlib
+from concurrent.futures import Executor, Future
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+from langchain_core.documents import Document
 
+# Loader class of each extension, as (module, class name) imported on first use:
+# the loaders and the parsing libraries behind them are only loaded for the formats ingested
 DOCUMENT_LOADERS = {
-    ".pdf": UnstructuredPDFLoader,
-    ".txt": TextLoader,
-    ".json": JSONLoader,
-    ".xlsx": UnstructuredExcelLoader,
+    ".pdf": ("langchain_community.document_loaders", "UnstructuredPDFLoader"),
+    ".txt": ("langchain_community.document_loaders", "TextLoader"),
+    ".json": ("langchain_community.document_loaders", "JSONLoader"),
+    ".xlsx": ("langchain_community.document_loaders", "UnstructuredExcelLoader"),
 }
 
-def load_document(file_path: str) -> List[Document]:
-    """Loads a document from a file path and returns a list of Documents."""
-    extension = f".{file_path.split('.')[-1]}"
+# PDFs are read page by page with pdfminer instead of their whole-file loader. Pages
+# without a text layer are skipped; a PDF with no text at all (a scan) falls back to
+# its whole-file loader, which runs OCR, in a single task
+PAGED_EXTENSIONS = {".pdf"}
+
+# Pages parsed by each task when a PDF is split across workers
+PDF_PAGES_PER_TASK = 16
+
+# A unit of parsing work: a picklable function and its arguments, returning Documents
+ParseTask = Tuple[Callable[..., List[Document]], tuple]
+
+
+def _extension(file_path: str) -> str:
+    extension = Path(file_path).suffix
     if extension not in DOCUMENT_LOADERS:
         raise ValueError(f"Unsupported file extension: {extension}")
+    return extension
+
+
+def get_loader_class(extension: str) -> Any:
+    """Imports and returns the loader class registered for an extension."""
+    module, name = DOCUMENT_LOADERS[extension]
+    return getattr(importlib.import_module(module), name)
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """Counts the pages of a PDF without parsing their contents."""
+    from pdfminer.pdfpage import PDFPage
+
+    with open(file_path, "rb") as f:
+        return sum(1 for _ in PDFPage.get_pages(f))
+
+
+def load_pdf_pages(file_path: str, start: int, stop: int) -> List[Document]:
+    """Extracts the text of pages [start, stop) of a PDF, one Document per page."""
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LTTextContainer
+
+    documents = []
+    for page_number, page in zip(range(start, stop), extract_pages(file_path, page_numbers=range(start, stop))):
+        text = "".join(element.get_text() for element in page if isinstance(element, LTTextContainer))
+        if text.strip():
+            documents.append(Document(
+                page_content=text,
+                metadata={"source": file_path, "page": page_number + 1},
+            ))
+    return documents
+
 
-    loader = DOCUMENT_LOADERS[extension](file_path)
+def load_whole_document(file_path: str) -> List[Document]:
+    """Loads a document in one go with the loader registered for its extension."""
+    loader = get_loader_class(_extension(file_path))(file_path)
     return loader.load()
+
+
+def document_tasks(file_path: str, pages_per_task: int = PDF_PAGES_PER_TASK) -> Iterator[ParseTask]:
+    """
+    Splits the parsing of a document into independent tasks, in document order.
+    PDFs yield one task per range of pages; other formats a single task.
+    """
+    if _extension(file_path) in PAGED_EXTENSIONS:
+        page_count = count_pdf_pages(file_path)
+        for start in range(0, page_count, pages_per_task):
+            yield load_pdf_pages, (file_path, start, min(start + pages_per_task, page_count))
+    else:
+        yield load_whole_document, (file_path,)
+
+
+def fallback_task(file_path: str) -> Optional[ParseTask]:
+    """Returns the task that loads a paged document in one go when its pages yielded no text."""
+    if _extension(file_path) in PAGED_EXTENSIONS:
+        return load_whole_document, (file_path,)
+    return None
+
+
+def iter_document(
+    file_path: str,
+    executor: Optional[Executor] = None,
+    max_in_flight: int = 2,
+    pages_per_task: int = PDF_PAGES_PER_TASK,
+) -> Iterator[List[Document]]:
+    """
+    Loads a document incrementally, yielding lists of Documents in document order.
+
+    With an executor, up to max_in_flight page ranges are parsed in parallel;
+    at most that many ranges are held in memory at once, whatever the size of
+    the file.
+    """
+    found_text = False
+    for docs in _iter_tasks(document_tasks(file_path, pages_per_task), executor, max_in_flight):
+        found_text = found_text or bool(docs)
+        yield docs
+    if not found_text and (fallback := fallback_task(file_path)) is not None:
+        func, args = fallback
+        yield func(*args)
+
+
+def _iter_tasks(tasks: Iterator[ParseTask], executor: Optional[Executor], max_in_flight: int) -> Iterator[List[Document]]:
+    if executor is None:
+        for func, args in tasks:
+            yield func(*args)
+        return
+
+    in_flight: List[Future] = []
+    try:
+        for func, args in tasks:
+            in_flight.append(executor.submit(func, *args))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.pop(0).result()
+        while in_flight:
+            yield in_flight.pop(0).result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+def load_document(file_path: str) -> List[Document]:
+    """Loads a document from a file path and returns a list of Documents."""
+    return [doc for part in iter_document(file_path) for doc in part]
@@ -0,0 +1,443 @@
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import Executor, Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.db.catalog import get_catalog
+from app.db.vector_store import add_embedded_documents, delete_documents, get_collection
+from app.rag.chunking import assign_chunk_ids, chunk_documents, chunk_ids
+from app.rag.embeddings_factory import get_embeddings
+from app.rag.loader import DOCUMENT_LOADERS, PDF_PAGES_PER_TASK, document_tasks, fallback_task
+from app.utils import metrics
+from app.utils.timing import STAGE_DURATION, stage
+
+logger = logging.getLogger(__name__)
+
+# End-of-stream marker passed between stages
+_DONE = object()
+
+# Markers sent after the last part of a file, in place of its Documents
+_END_OF_FILE = object()
+_FILE_FAILED = object()
+
+# How often blocked stages check whether the pipeline was aborted
+_POLL_SECONDS = 0.1
+
+INGEST_CHUNKS = metrics.Counter("ingest_chunks_total", "Chunks handled by ingestion, by outcome.", ["outcome"])
+
+
+def is_supported(filename: str) -> bool:
+    """Whether a file can be ingested, judging by its extension."""
+    return Path(filename).suffix in DOCUMENT_LOADERS
+
+
+def file_sha256(path: str) -> str:
+    """Hashes a file without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1024 * 1024):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def expand_archive(archive_path: str, dest_dir: str) -> List[Tuple[str, str]]:
+    """
+    Extracts the supported documents of a zip archive into dest_dir.
+    Returns (path, display name) pairs; member paths are flattened so an
+    archive can never write outside dest_dir.
+    """
+    files = []
+    Path(dest_dir).mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(archive_path) as archive:
+        for index, member in enumerate(archive.infolist()):
+            name = os.path.basename(member.filename)
+            if member.is_dir() or not name or not is_supported(name):
+                continue
+            target = Path(dest_dir) / f"{index}_{name}"
+            with archive.open(member) as src, target.open("wb") as dst:
+                while block := src.read(1024 * 1024):
+                    dst.write(block)
+            files.append((str(target), name))
+    return files
+
+
+class IngestionPipeline:
+    """
+    Ingests many files with overlapping stages.
+
+    parse (process pool) -> chunk -> embed (N threads) -> write
+
+    Stages are connected by bounded queues, so parsing the next file runs
+    while the previous one is being embedded and written, and a slow stage
+    applies back-pressure instead of letting work pile up in memory. Total
+    time approaches that of the slowest stage rather than the sum of all.
+
+    Documents are parsed in parts: PDFs are split into page ranges parsed in
+    parallel, and each part is chunked and embedded as soon as it is ready.
+    Only a bounded number of parts is held at any time, so memory does not
+    grow with the size of a file. A PDF whose pages yield no text (a scan) is
+    loaded again in one task by its whole-file loader, which runs OCR.
+
+    Ingestion is incremental: files whose content hash matches the catalog
+    are skipped without parsing. Chunk ids derive from the content hash of
+    the file, so a copy of an indexed file under another name writes nothing,
+    and an edited file gets new ids for all of its chunks; those whose text
+    was already indexed reuse their stored vector instead of being embedded
+    again. Chunks that disappeared from a file are deleted and its manifest
+    replaced once all of its new chunks are stored.
+
+    A file that fails to parse is recorded on the job and skipped, and any of
+    its chunks already written are removed; a failure while embedding or
+    writing aborts the whole run. An instance runs one set of files at a time.
+    """
+
+    def __init__(
+        self,
+        parse_executor: Executor,
+        parse_concurrency: int = 2,
+        embed_batch_size: int = 64,
+        embed_workers: int = 2,
+        queue_size: int = 4,
+        pages_per_task: int = PDF_PAGES_PER_TASK,
+    ):
+        self.parse_executor = parse_executor
+        self.parse_concurrency = max(1, parse_concurrency)
+        self.pages_per_task = max(1, pages_per_task)
+        self.embed_batch_size = embed_batch_size
+        self.embed_workers = max(1, embed_workers)
+        self.queue_size = queue_size
+
+    def run(self, files: List[Tuple[str, str]], job: Any) -> None:
+        """
+        Runs the pipeline over (path, display name) pairs, recording progress on job.
+        The job must provide the counters of app.rag.ingestion.IngestionJob.
+        """
+        parsed: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        batches: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        embedded: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        self._abort = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._progress_lock = threading.Lock()
+        # Manifests of files being chunked or waiting for their new chunks to be written, by source
+        self._pending_manifests: Dict[str, Dict[str, Any]] = {}
+        # Previous id of new chunks whose text an earlier version of their file already indexed
+        self._previous_ids: Dict[str, str] = {}
+        self._catalog = get_catalog()
+
+        threads = [
+            threading.Thread(target=self._guard, args=(self._parse_stage, files, parsed, job), name="ingest-parse"),
+            threading.Thread(target=self._guard, args=(self._chunk_stage, parsed, batches, job), name="ingest-chunk"),
+        ]
+        threads += [
+            threading.Thread(target=self._guard, args=(self._embed_stage, batches, embedded, job), name=f"ingest-embed-{i}")
+            for i in range(self.embed_workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        self._guard(self._write_stage, embedded, job)
+        for thread in threads:
+            thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+    def _guard(self, run_stage: Callable, *args) -> None:
+        try:
+            run_stage(*args)
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            self._abort.set()
+
+    def _put(self, q: queue.Queue, item: Any) -> bool:
+        """Blocking put that gives up when the pipeline is aborted."""
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue) -> Any:
+        """Blocking get that returns _DONE when the pipeline is aborted."""
+        while not self._abort.is_set():
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _parse_tasks(
+        self, files: List[Tuple[str, str]], job: Any
+    ) -> Iterator[Tuple[str, Dict[str, Any], Callable, tuple, bool]]:
+        """Yields (name, file info, function, args, is last part) for the parse tasks of every changed file."""
+        seen = set()
+        for path, name in files:
+            if name in seen:
+                # Documents are identified by name; a second copy would race on the same manifest
+                job.failed_files[name] = "Duplicate file name in the same upload"
+                continue
+            seen.add(name)
+            content_hash = file_sha256(path)
+            indexed = self._catalog.get_document(name)
+            if indexed is not None and indexed["content_hash"] == content_hash:
+                job.files_unchanged += 1
+                continue
+            file_info = {"content_hash": content_hash, "size_bytes": os.path.getsize(path)}
+            try:
+                tasks = list(document_tasks(path, self.pages_per_task))
+            except Exception as e:
+                logger.error(f"Error parsing file {name}: {e}")
+                job.failed_files[name] = str(e)
+                continue
+            if not tasks:
+                job.failed_files[name] = "Could not load document."
+                continue
+            for index, (func, args) in enumerate(tasks):
+                yield name, file_info, func, args, index == len(tasks) - 1
+
+    def _submit_parse(self, func: Callable, args: tuple) -> Future:
+        future = self.parse_executor.submit(func, *args)
+        # Measured from submission, so it includes any wait for a free parse process
+        future.add_done_callback(
+            lambda _, submitted=time.perf_counter(): STAGE_DURATION.observe(time.perf_counter() - submitted, "ingest_parse")
+        )
+        return future
+
+    def _parse_stage(self, files: List[Tuple[str, str]], out: queue.Queue, job: Any) -> None:
+        in_flight: List[Tuple[str, Dict[str, Any], Future, bool, str]] = []
+        tasks = self._parse_tasks(files, job)
+        pages: Counter = Counter()
+        failed = set()
+        fallen_back = set()
+        try:
+            while not self._abort.is_set():
+                while len(in_flight) < self.parse_concurrency and (task := next(tasks, None)) is not None:
+                    name, file_info, func, args, last = task
+                    in_flight.append((name, file_info, self._submit_parse(func, args), last, args[0]))
+
+                if not in_flight:
+                    break
+
+                # Hand over parts in submission order to keep the output deterministic
+                name, file_info, future, last, path = in_flight.pop(0)
+                if name in failed:
+                    continue
+                try:
+                    docs = future.result()
+                except Exception as e:
+                    logger.error(f"Error parsing file {name}: {e}")
+                    job.failed_files[name] = str(e)
+                    failed.add(name)
+                    if not self._put(out, (name, file_info, _FILE_FAILED)):
+                        return
+                    continue
+
+                if docs:
+                    pages[name] += len(docs)
+                    job.pages_parsed += len(docs)
+                    if not self._put(out, (name, file_info, docs)):
+                        return
+                if last and not pages[name] and name not in fallen_back and (fallback := fallback_task(path)):
+                    # No page had a text layer: load the whole file, which OCRs scans
+                    fallen_back.add(name)
+                    func, args = fallback
+                    in_flight.insert(0, (name, file_info, self._submit_parse(func, args), True, path))
+                    continue
+                if last:
+                    if pages[name]:
+                        job.files_parsed += 1
+                        marker = _END_OF_FILE
+                    else:
+                        job.failed_files[name] = "Could not load document."
+                        marker = _FILE_FAILED
+                    if not self._put(out, (name, file_info, marker)):
+                        return
+        finally:
+            for _, _, future, _, _ in in_flight:
+                future.cancel()
+            self._put(out, _DONE)
+
+    def _chunk_stage(self, inp: queue.Queue, out: queue.Queue, job: Any) -> None:
+        try:
+            batch = []
+            while (item := self._get(inp)) is not _DONE:
+                name, file_info, docs = item
+                if docs is _END_OF_FILE or docs is _FILE_FAILED:
+                    self._close_manifest(name, job, failed=docs is _FILE_FAILED)
+                    continue
+
+                manifest = self._pending_manifests.get(name) or self._open_manifest(name, file_info)
+                for doc in docs:
+                    doc.metadata["source"] = name
+                with stage("ingest_chunk"):
+                    chunks = chunk_documents(docs)
+                    previous_ids = chunk_ids(chunks, manifest["previous_hash"], manifest["previous_occurrences"])
+                    assign_chunk_ids(chunks, manifest["content_hash"], manifest["occurrences"])
+                job.chunks_total += len(chunks)
+
+                new_chunks = [chunk for chunk in chunks if chunk.id not in manifest["indexed"]]
+                if new_chunks:
+                    # Already indexed for an identical file under another name
+                    shared = self._catalog.indexed_chunk_ids([chunk.id for chunk in new_chunks])
+                    new_chunks = [chunk for chunk in new_chunks if chunk.id not in shared]
+                    with self._progress_lock:
+                        # Unchanged text in an edited file keeps the vector stored under its previous id
+                        self._previous_ids.update(
+                            (chunk.id, previous_id)
+                            for chunk, previous_id in zip(chunks, previous_ids)
+                            if previous_id in manifest["indexed"] and previous_id != chunk.id
+                        )
+                job.chunks_unchanged += len(chunks) - len(new_chunks)
+                INGEST_CHUNKS.inc("unchanged", amount=len(chunks) - len(new_chunks))
+                with self._progress_lock:
+                    manifest["ids"].extend(chunk.id for chunk in chunks)
+                    manifest["new_ids"].extend(chunk.id for chunk in new_chunks)
+                    manifest["total_chars"] += sum(len(chunk.page_content) for chunk in chunks)
+                    manifest["remaining"] += len(new_chunks)
+
+                for chunk in new_chunks:
+                    batch.append(chunk)
+                    if len(batch) >= self.embed_batch_size:
+                        if not self._put(out, batch):
+                            return
+                        batch = []
+            if batch:
+                self._put(out, batch)
+        finally:
+            for _ in range(self.embed_workers):
+                self._put(out, _DONE)
+
+    def _embed_stage(self, inp: queue.Queue, out: queue.Queue, job: Any) -> None:
+        # Straight to the provider: chunk vectors are written once, and going through the
+        # query cache would evict the hot query vectors and persist every chunk
+        embeddings = get_embeddings().underlying
+        try:
+            while (batch := self._get(inp)) is not _DONE:
+                vectors = self._stored_vectors(batch)
+                missing = [i for i, vector in enumerate(vectors) if vector is None]
+                if missing:
+                    with stage("ingest_embed"):
+                        embedded = embeddings.embed_documents([batch[i].page_content for i in missing])
+                    for i, vector in zip(missing, embedded):
+                        vectors[i] = vector
+                INGEST_CHUNKS.inc("reused", amount=len(batch) - len(missing))
+                INGEST_CHUNKS.inc("embedded", amount=len(missing))
+                with self._progress_lock:
+                    job.chunks_embedded += len(batch)
+                if not self._put(out, (batch, vectors)):
+                    return
+        finally:
+            self._put(out, _DONE)
+
+    def _stored_vectors(self, batch: List[Any]) -> List[Optional[List[float]]]:
+        """Returns the vector already stored for each chunk under its previous id, or None."""
+        with self._progress_lock:
+            previous = {chunk.id: self._previous_ids.pop(chunk.id) for chunk in batch if chunk.id in self._previous_ids}
+        if not previous:
+            return [None] * len(batch)
+        found = get_collection().get(ids=list(previous.values()), include=["embeddings"])
+        stored = {chunk_id: [float(x) for x in vector] for chunk_id, vector in zip(found["ids"], found["embeddings"])}
+        return [stored.get(previous.get(chunk.id)) for chunk in batch]
+
+    def _write_stage(self, inp: queue.Queue, job: Any) -> None:
+        finished_embedders = 0
+        dimension_recorded = False
+        while finished_embedders < self.embed_workers:
+            item = self._get(inp)
+            if item is _DONE:
+                if self._abort.is_set():
+                    return
+                finished_embedders += 1
+                continue
+            batch, vectors = item
+            with stage("ingest_write"):
+                add_embedded_documents(batch, vectors, ids=[chunk.id for chunk in batch])
+            INGEST_CHUNKS.inc("written", amount=len(batch))
+            if not dimension_recorded:
+                self._catalog.set_meta("embedding_dimension", len(vectors[0]))
+                dimension_recorded = True
+            job.chunks_written += len(batch)
+            for chunk in batch:
+                self._chunk_written(chunk.metadata["source"], job)
+
+    def _open_manifest(self, source: str, file_info: Dict[str, Any]) -> Dict[str, Any]:
+        document = self._catalog.get_document(source)
+        if document is None:
+            # No manifest: drop chunks indexed before ids were deterministic
+            delete_documents(where={"source": source})
+            indexed_ids = set()
+        else:
+            indexed_ids = self._catalog.get_chunk_ids(source)
+
+        manifest = {
+            **file_info,
+            "indexed": indexed_ids,
+            "previous_hash": document["content_hash"] if document else "",
+            "previous_occurrences": Counter(),
+            "ids": [],
+            "new_ids": [],
+            "occurrences": Counter(),
+            "total_chars": 0,
+            "remaining": 0,
+            "closed": False,
+            "failed": False,
+        }
+        with self._progress_lock:
+            self._pending_manifests[source] = manifest
+        return manifest
+
+    def _close_manifest(self, source: str, job: Any, failed: bool = False) -> None:
+        """Marks that every part of a file has been chunked."""
+        with self._progress_lock:
+            manifest = self._pending_manifests.get(source)
+            if manifest is None:
+                return
+            manifest["closed"] = True
+            manifest["failed"] = failed
+            done = manifest["remaining"] == 0
+        if done:
+            self._commit_manifest(source, job)
+
+    def _chunk_written(self, source: str, job: Any) -> None:
+        with self._progress_lock:
+            manifest = self._pending_manifests[source]
+            manifest["remaining"] -= 1
+            done = manifest["closed"] and manifest["remaining"] == 0
+        if done:
+            self._commit_manifest(source, job)
+
+    def _commit_manifest(self, source: str, job: Any) -> None:
+        """
+        Deletes the chunks that disappeared from a file and records its new manifest.
+        For a file that failed midway, deletes the new chunks written so far instead.
+        """
+        with self._progress_lock:
+            manifest = self._pending_manifests.pop(source)
+        if manifest["failed"]:
+            new_ids = manifest["new_ids"]
+            delete_documents(ids=sorted(set(new_ids) - self._catalog.indexed_chunk_ids(new_ids)))
+            return
+
+        removed = manifest["indexed"] - set(manifest["ids"])
+        # Chunks an identical file under another name still lists stay in the index
+        kept = self._catalog.indexed_chunk_ids(sorted(removed), exclude_source=source)
+        removed = sorted(removed - kept)
+        delete_documents(ids=removed)
+        job.chunks_deleted += len(removed)
+        self._catalog.record_document(
+            source,
+            manifest["content_hash"],
+            manifest["ids"],
+            total_chars=manifest["total_chars"],
+            size_bytes=manifest["size_bytes"],
+        )
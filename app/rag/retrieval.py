@@ -0,0 +1,62 @@
+import asyncio
+from typing import Dict, List, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from app.db.lexical_index import LexicalIndex
+
+# Constant of reciprocal-rank fusion; dampens the weight of the very first ranks
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, rrf_k: int = RRF_K) -> List[Document]:
+    """
+    Merges ranked lists of chunks into one, scoring each chunk by the sum of
+    1 / (rrf_k + rank) over the lists it appears in. Chunks are identified by
+    source and text, not id: some vector stores return documents without ids,
+    and the same chunk found by two searches must merge into one entry.
+    """
+    scores: Dict[Tuple[str, str], float] = {}
+    documents: Dict[Tuple[str, str], Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = (str(doc.metadata.get("source", "")), doc.page_content)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Combines dense retrieval from the vector store with BM25 retrieval from
+    the lexical index through reciprocal-rank fusion.
+
+    Dense search finds paraphrases; the lexical side catches exact EDSL
+    keywords and identifiers such as EVALUATE WHEN or LDS.Child.Characteristic
+    that embeddings tend to blur. Both searches run concurrently.
+    """
+
+    vectorstore: VectorStore
+    lexical_index: LexicalIndex
+    k: int = 5
+    fetch_k: int = 20
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        dense = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        lexical = [doc for doc, _ in self.lexical_index.search(query, self.fetch_k)]
+        return reciprocal_rank_fusion([dense, lexical], self.k)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        dense, lexical = await asyncio.gather(
+            self.vectorstore.asimilarity_search(query, k=self.fetch_k),
+            asyncio.to_thread(self.lexical_index.search, query, self.fetch_k),
+        )
+        return reciprocal_rank_fusion([dense, [doc for doc, _ in lexical]], self.k)
@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from app.rag.concurrency import ProviderBusy, ProviderSemaphore, get_provider_semaphore
+from app.utils.metrics import Counter, Histogram
+from app.utils.stats import percentile
+from app.utils.timing import stage
+
+logger = logging.getLogger(__name__)
+
+LLM_CALLS = Counter("llm_calls_total", "LLM calls by provider and outcome.", ["provider", "outcome"])
+LLM_CALL_DURATION = Histogram("llm_call_duration_seconds", "Duration of successful LLM calls.", ["provider"])
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the providers, by direction.", ["provider", "direction"])
+
+
+def _count_tokens(name: str, output: Any) -> None:
+    """Adds the token usage a chat model attaches to its message (or last stream chunk)."""
+    usage = getattr(output, "usage_metadata", None)
+    if usage:
+        LLM_TOKENS.inc(name, "input", amount=usage.get("input_tokens", 0))
+        LLM_TOKENS.inc(name, "output", amount=usage.get("output_tokens", 0))
+
+
+class ProviderStats:
+    """Rolling latency and error rate of one provider over its last calls."""
+
+    def __init__(self, window: int):
+        self.latencies: deque = deque(maxlen=window)  # seconds, successful calls only
+        self.outcomes: deque = deque(maxlen=window)  # True for success
+        self.down_until = 0.0
+
+    def record(self, latency: Optional[float], ok: bool) -> None:
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def percentile(self, pct: float) -> Optional[float]:
+        return percentile(self.latencies, pct)
+
+
+class LLMRouter(Runnable[Any, Any]):
+    """
+    Sends each LLM call to the fastest healthy provider among several.
+
+    Providers are ranked by their rolling p50 latency; one that has not been
+    measured yet ranks first so it gets sampled. A provider whose error rate
+    over the window reaches max_error_rate is left out for cooldown seconds,
+    then tried again. A failed call falls over to the next provider, and a
+    stream does so as long as nothing has been emitted yet.
+
+    With hedge_after set, an async call that has not answered (or, for a
+    stream, produced its first chunk) within that many seconds is also sent
+    to the next provider; the first answer wins and the other is cancelled.
+
+    Async calls hold the chosen provider's concurrency slot. Any Runnable
+    can be a provider, so local stubs stand in for real ones in tests and
+    benchmarks.
+    """
+
+    def __init__(
+        self,
+        providers: Dict[str, Runnable],
+        hedge_after: Optional[float] = None,
+        window: int = 100,
+        max_error_rate: float = 0.5,
+        min_samples: int = 5,
+        cooldown: float = 30.0,
+        prepare_input: Optional[Callable[[str, Any], Any]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.providers = dict(providers)
+        self.hedge_after = hedge_after
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.prepare_input = prepare_input
+        self.clock = clock
+        self._stats = {name: ProviderStats(window) for name in self.providers}
+        self._lock = threading.Lock()
+
+    # Selection and bookkeeping
+
+    def ranked(self) -> List[str]:
+        """Providers in the order they will be tried: healthy first, then by p50 latency, then as configured."""
+        now = self.clock()
+        order = {name: i for i, name in enumerate(self.providers)}
+        with self._lock:
+            def key(name: str):
+                stats = self._stats[name]
+                p50 = stats.percentile(50)
+                return (stats.down_until > now, p50 if p50 is not None else 0.0, order[name])
+            return sorted(self.providers, key=key)
+
+    def _record(self, name: str, started: float, ok: bool) -> None:
+        now = self.clock()
+        LLM_CALLS.inc(name, "success" if ok else "error")
+        if ok:
+            LLM_CALL_DURATION.observe(now - started, name)
+        with self._lock:
+            stats = self._stats[name]
+            stats.record(now - started, ok)
+            if not ok and len(stats.outcomes) >= self.min_samples and stats.error_rate >= self.max_error_rate:
+                stats.down_until = now + self.cooldown
+                logger.warning(f"LLM provider {name} marked unhealthy for {self.cooldown}s (error rate {stats.error_rate:.0%})")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Rolling metrics per provider."""
+        now = self.clock()
+        to_ms = lambda seconds: None if seconds is None else round(seconds * 1000, 1)
+        with self._lock:
+            return {
+                name: {
+                    "p50_ms": to_ms(s.percentile(50)),
+                    "p95_ms": to_ms(s.percentile(95)),
+                    "error_rate": round(s.error_rate, 3),
+                    "calls": len(s.outcomes),
+                    "healthy": s.down_until <= now,
+                }
+                for name, s in self._stats.items()
+            }
+
+    def _input_for(self, name: str, input: Any) -> Any:
+        return self.prepare_input(name, input) if self.prepare_input is not None else input
+
+    # Runnable interface
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        with stage("generate"):
+            return self._invoke(input, config, **kwargs)
+
+    def _invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        error = None
+        for name in self.ranked():
+            started = None  # set once a slot is held, so a failed acquire records no latency
+            try:
+                with get_provider_semaphore(name):
+                    started = self.clock()
+                    result = self.providers[name].invoke(self._input_for(name, input), config, **kwargs)
+            except ProviderBusy as e:
+                logger.warning(f"LLM provider {name} busy, trying the next one: {e}")
+                error = e
+                continue
+            except Exception as e:
+                if started is not None:
+                    self._record(name, started, False)
+                logger.warning(f"LLM provider {name} failed, trying the next one: {e}")
+                error = e
+                continue
+            self._record(name, started, True)
+            _count_tokens(name, result)
+            return result
+        raise error
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        error = None
+        for name in self.ranked():
+            emitted = False
+            started = None
+            try:
+                with get_provider_semaphore(name):
+                    started = self.clock()
+                    for chunk in self.providers[name].stream(self._input_for(name, input), config, **kwargs):
+                        emitted = True
+                        _count_tokens(name, chunk)
+                        yield chunk
+            except ProviderBusy as e:
+                logger.warning(f"LLM provider {name} busy, trying the next one: {e}")
+                error = e
+                continue
+            except Exception as e:
+                if started is not None:
+                    self._record(name, started, False)
+                if emitted:
+                    raise
+                logger.warning(f"LLM provider {name} failed, trying the next one: {e}")
+                error = e
+                continue
+            self._record(name, started, True)
+            return
+        raise error
+
+    async def _ainvoke_one(self, name: str, input: Any, config: Optional[RunnableConfig], **kwargs: Any) -> Any:
+        async with get_provider_semaphore(name):
+            started = self.clock()
+            try:
+                result = await self.providers[name].ainvoke(self._input_for(name, input), config, **kwargs)
+            except Exception:
+                self._record(name, started, False)
+                raise
+            self._record(name, started, True)
+            _count_tokens(name, result)
+            return result
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        with stage("generate"):
+            return await self._ainvoke(input, config, **kwargs)
+
+    async def _ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        candidates = deque(self.ranked())
+        running: Dict[asyncio.Task, str] = {}
+        error = None
+
+        def launch() -> None:
+            name = candidates.popleft()
+            running[asyncio.ensure_future(self._ainvoke_one(name, input, config, **kwargs))] = name
+
+        launch()
+        try:
+            while running:
+                hedge = self.hedge_after if candidates and len(running) == 1 else None
+                done, _ = await asyncio.wait(running, timeout=hedge, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"LLM provider {next(iter(running.values()))} slower than {hedge}s, hedging")
+                    launch()
+                    continue
+                for task in done:
+                    name = running.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                    logger.warning(f"LLM provider {name} failed: {error}")
+                if not running and candidates:
+                    launch()
+            raise error
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        candidates = deque(self.ranked())
+        # Each attempt is an open stream waiting on its first chunk
+        attempts: Dict[asyncio.Task, tuple] = {}
+        error = None
+
+        async def open_stream(name: str):
+            await semaphore_of[name].acquire()
+            try:
+                started = self.clock()
+                stream = self.providers[name].astream(self._input_for(name, input), config, **kwargs).__aiter__()
+                first = await stream.__anext__()
+            except BaseException:
+                semaphore_of[name].release()
+                raise
+            return stream, first, started
+
+        semaphore_of: Dict[str, ProviderSemaphore] = {}
+
+        def launch() -> None:
+            name = candidates.popleft()
+            semaphore_of[name] = get_provider_semaphore(name)
+            attempts[asyncio.ensure_future(open_stream(name))] = (name, self.clock())
+
+        winner = None
+        launch()
+        try:
+            while attempts and winner is None:
+                hedge = self.hedge_after if candidates and len(attempts) == 1 else None
+                done, _ = await asyncio.wait(attempts, timeout=hedge, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"LLM provider {next(iter(attempts.values()))[0]} gave no token after {hedge}s, hedging")
+                    launch()
+                    continue
+                for task in done:
+                    name, launched = attempts.pop(task)
+                    exception = task.exception()
+                    if exception is None:
+                        if winner is None:
+                            winner = (name, *task.result())
+                        else:
+                            # Lost a tie; close it and give its slot back
+                            await task.result()[0].aclose()
+                            semaphore_of[name].release()
+                    elif isinstance(exception, StopAsyncIteration):
+                        # An empty answer is still an answer
+                        self._record(name, launched, True)
+                        if winner is None:
+                            return
+                    else:
+                        if not isinstance(exception, ProviderBusy):
+                            self._record(name, launched, False)
+                        error = exception
+                        logger.warning(f"LLM provider {name} failed: {exception}")
+                if winner is None and not attempts and candidates:
+                    launch()
+        finally:
+            for task in attempts:
+                task.cancel()
+            for task in attempts:
+                name = attempts[task][0]
+                try:
+                    stream, _, _ = await task
+                except BaseException:
+                    continue
+                await stream.aclose()
+                semaphore_of[name].release()
+
+        if winner is None:
+            raise error
+
+        name, stream, first, started = winner
+        try:
+            _count_tokens(name, first)
+            yield first
+            async for chunk in stream:
+                _count_tokens(name, chunk)
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            raise
+        except Exception:
+            self._record(name, started, False)
+            raise
+        else:
+            self._record(name, started, True)
+        finally:
+            await stream.aclose()
+            semaphore_of[name].release()
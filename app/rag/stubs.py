@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+STUB_ANSWER = (
+    "Respuesta simulada para pruebas de carga.\n\n"
+    "```\n"
+    "IF IsNull(LDS.Child.Characteristic) THEN\n"
+    "    Result = 0;\n"
+    "ELSE\n"
+    "    Result = LDS.Child.Characteristic * 2;\n"
+    "```\n\n"
+    "- Comprueba los valores nulos con IsNull antes de operar.\n"
+)
+
+
+class StubLLM(LLM):
+    """
+    Local LLM for load tests: answers with a fixed EDSL response after a
+    fixed time to first token, then streams it word by word.
+    """
+
+    first_token_ms: float = 200
+    token_ms: float = 5
+    answer: str = STUB_ANSWER
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _tokens(self) -> List[str]:
+        return re.findall(r"\S+\s*|\s+", self.answer)
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        time.sleep((self.first_token_ms + self.token_ms * len(self._tokens())) / 1000)
+        return self.answer
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        await asyncio.sleep((self.first_token_ms + self.token_ms * len(self._tokens())) / 1000)
+        return self.answer
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        time.sleep(self.first_token_ms / 1000)
+        for token in self._tokens():
+            yield GenerationChunk(text=token)
+            time.sleep(self.token_ms / 1000)
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        await asyncio.sleep(self.first_token_ms / 1000)
+        for token in self._tokens():
+            yield GenerationChunk(text=token)
+            await asyncio.sleep(self.token_ms / 1000)
+
+
+class StubEmbeddings(Embeddings):
+    """
+    Local embeddings for load tests: hashed bag of words, so texts sharing
+    words are close and retrieval still returns relevant chunks.
+    """
+
+    def __init__(self, dimension: int = 384, latency_ms: float = 5):
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in _WORD_PATTERN.findall(text.casefold()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            vector[int.from_bytes(digest, "little") % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # One call costs the same latency however many texts it carries, like a batched API request
+        time.sleep(self.latency_ms / 1000)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
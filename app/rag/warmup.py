@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.db.user_store import get_user_store
+from app.db.vector_store import get_collection, get_vector_store, sweep_dropped_collections
+from app.rag.answer_cache import get_answer_cache
+from app.rag.chain import _retrieve, delia_prompt, general_prompt, get_delia_chain, get_general_rag_chain
+from app.rag.embeddings_factory import get_embeddings
+from app.rag.llm_factory import get_llm_router, prepare_input
+
+logger = logging.getLogger(__name__)
+
+WARMUP_QUESTION = "¿Cómo se comprueba si un valor es nulo en EDSL?"
+
+
+class WarmupState:
+    """Progress of the warm-up, as reported by /ready."""
+
+    def __init__(self):
+        self.status = "pending"  # pending, warming_up, ready, failed
+        self.attempts = 0
+        self.steps: Dict[str, float] = {}  # milliseconds per finished step
+        self.errors: Dict[str, str] = {}
+        self.warnings: Dict[str, str] = {}  # failures that do not keep the app from being ready
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status, "attempts": self.attempts, "steps_ms": self.steps,
+            "errors": self.errors, "warnings": self.warnings,
+        }
+
+
+_state = WarmupState()
+_task: Optional[asyncio.Task] = None
+
+# Providers already sent the warm-up prompt, which retries do not pay for again
+_warmed_providers: Set[str] = set()
+
+
+def get_warmup_state() -> WarmupState:
+    return _state
+
+
+def _open_vector_store() -> None:
+    get_vector_store()
+    get_collection().count()
+    sweep_dropped_collections()
+
+
+def _embed() -> None:
+    # Straight to the provider: a hit in a persistent embedding cache would not load the model
+    get_embeddings().underlying.embed_query(WARMUP_QUESTION)
+
+
+def _compile_prompts() -> None:
+    general_prompt.invoke({"context": "", "question": WARMUP_QUESTION})
+    delia_prompt.invoke({"context": "", "question": WARMUP_QUESTION})
+    get_general_rag_chain()
+    get_delia_chain()
+
+
+async def _generate() -> None:
+    """
+    Sends a short DELIA prompt to every routed provider. It loads local models
+    and primes provider-side caching of the static system prompt; generation
+    stops at the first line.
+
+    Only the primary provider has to answer: a failing fallback is reported
+    as a warning, since the router routes around it. Each provider is sent
+    the prompt once per process, so retries of the warm-up only call the
+    primary again, and only if it failed.
+    """
+    prompt = delia_prompt.invoke({"context": "", "question": WARMUP_QUESTION})
+    pending = {name: provider for name, provider in get_llm_router().providers.items() if name not in _warmed_providers}
+    results = await asyncio.gather(
+        *(provider.ainvoke(prepare_input(name, prompt), stop=["\n"]) for name, provider in pending.items()),
+        return_exceptions=True,
+    )
+    primary = settings.LLM_PROVIDER.lower()
+    error = None
+    for name, result in zip(pending, results):
+        if isinstance(result, Exception) and name == primary:
+            error = result
+            continue
+        _warmed_providers.add(name)
+        if isinstance(result, Exception):
+            logger.warning(f"Warm-up of fallback LLM provider {name} failed: {result!r}")
+            _state.warnings[f"generation:{name}"] = repr(result)
+    if error is not None:
+        raise error
+
+
+def _steps() -> List[Tuple[str, Callable]]:
+    steps = [
+        ("user_store", get_user_store),
+        ("vector_store", _open_vector_store),
+        ("embeddings", _embed),
+        # Builds the retriever, lexical index, reranker and token counter on the way
+        ("retrieval", lambda: _retrieve(WARMUP_QUESTION)),
+        ("prompts", _compile_prompts),
+        ("answer_cache", get_answer_cache),
+    ]
+    if settings.WARMUP_GENERATION:
+        steps.append(("generation", _generate))
+    return steps
+
+
+async def warm_up() -> None:
+    """
+    Builds the singletons the first request would otherwise pay for and loads
+    the models. Failed steps are reported on the state and the whole warm-up
+    is retried after WARMUP_RETRY_SECONDS; steps that already succeeded are
+    cheap the second time since their singletons are cached.
+    """
+    while True:
+        _state.status = "warming_up"
+        _state.attempts += 1
+        _state.steps, _state.errors = {}, {}
+        started = time.perf_counter()
+
+        for name, func in _steps():
+            step_started = time.perf_counter()
+            try:
+                call = func() if asyncio.iscoroutinefunction(func) else asyncio.to_thread(func)
+                await asyncio.wait_for(call, timeout=settings.WARMUP_STEP_TIMEOUT_SECONDS)
+            except Exception as e:
+                logger.error(f"Warm-up step {name} failed: {e!r}")
+                _state.errors[name] = repr(e)
+                continue
+            _state.steps[name] = round((time.perf_counter() - step_started) * 1000, 1)
+
+        if not _state.errors:
+            _state.status = "ready"
+            logger.info(f"Warm-up finished in {time.perf_counter() - started:.1f}s: {_state.steps}")
+            return
+        _state.status = "failed"
+        await asyncio.sleep(settings.WARMUP_RETRY_SECONDS)
+
+
+def start_warmup() -> None:
+    """Starts the warm-up in the background, or marks the app ready at once when it is disabled."""
+    global _task
+
+    if not settings.WARMUP_ENABLED:
+        _state.status = "ready"
+        return
+    _task = asyncio.get_running_loop().create_task(warm_up())
+
+
+def stop_warmup() -> None:
+    if _task is not None:
+        _task.cancel()
@@ -19,3 +19,12 @@ class DeliaResponse(BaseModel):
     has_edsl_code: bool
     edsl_code_blocks_count: int
     error: Optional[str] = None
+
+class DeliaBatchItem(BaseModel):
+    question: str
+    user_level: str = "intermediate"
+    id: Optional[str] = None  # echoed back so results can be matched in completion order
+
+class DeliaBatchRequest(BaseModel):
+    items: List[DeliaBatchItem]
+    max_concurrency: Optional[int] = None  # capped at BATCH_MAX_CONCURRENCY and LLM_MAX_WAITING_PER_USER
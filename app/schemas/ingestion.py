@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import Dict, Optional
+
+class IngestionJobAccepted(BaseModel):
+    job_id: str
+    status: str
+    message: str
+
+class IngestionJobStatus(BaseModel):
+    id: str
+    filename: str
+    status: str  # queued, running, completed, failed
+    files_total: int
+    files_parsed: int
+    files_unchanged: int
+    failed_files: Dict[str, str]
+    pages_parsed: int
+    chunks_total: int
+    chunks_embedded: int
+    chunks_written: int
+    chunks_unchanged: int
+    chunks_deleted: int
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
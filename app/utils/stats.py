@@ -0,0 +1,9 @@
+from typing import Iterable, Optional
+
+
+def percentile(samples: Iterable[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (0-100) of samples, or None when there are none."""
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
@@ -0,0 +1,59 @@
+import json
+from typing import Any, AsyncIterator, Dict, TypeVar
+
+T = TypeVar("T")
+
+# Wire formats supported by the streaming endpoints
+STREAM_MEDIA_TYPES = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def encode_sse(event: str, data: Any) -> str:
+    """Encodes an event as a Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def encode_ndjson(event: str, data: Any) -> str:
+    """Encodes an event as a single newline-delimited JSON line."""
+    return json.dumps({"event": event, "data": data}, ensure_ascii=False) + "\n"
+
+
+async def encode_events(events: AsyncIterator[Dict[str, Any]], stream_format: str) -> AsyncIterator[str]:
+    """Serializes an async iterator of {"event", "data"} dicts in the requested wire format."""
+    encode = encode_ndjson if stream_format == "ndjson" else encode_sse
+    async for item in events:
+        yield encode(item["event"], item["data"])
+
+
+async def encode_jsonl(items: AsyncIterator[Any]) -> AsyncIterator[str]:
+    """Serializes an async iterator of JSON-compatible values, one per line."""
+    async for item in items:
+        yield json.dumps(item, ensure_ascii=False) + "\n"
+
+
+async def start_stream(items: AsyncIterator[T]) -> AsyncIterator[T]:
+    """
+    Waits for the first item of a stream before the response is opened, so an
+    error raised before it (e.g. ProviderBusy) still gets its own status code.
+    """
+    try:
+        first = await items.__anext__()
+    except StopAsyncIteration:
+        return _empty()
+
+    async def resume() -> AsyncIterator[T]:
+        try:
+            yield first
+            async for item in items:
+                yield item
+        finally:
+            await items.aclose()
+
+    return resume()
+
+
+async def _empty() -> AsyncIterator[Any]:
+    return
+    yield
@@ -0,0 +1,70 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Dict, Iterator, Optional
+
+from app.utils.metrics import Histogram
+
+# Stage durations of the current request in milliseconds. The dict is shared by
+# reference with the tasks and executor threads the request spawns, since they
+# copy the context rather than the value.
+_stage_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+_timings_lock = threading.Lock()
+
+STAGE_DURATION = Histogram(
+    "rag_stage_duration_seconds",
+    "Duration of each stage of the chat and ingestion paths.",
+    ["stage"],
+)
+
+
+def start_request_timings() -> Token:
+    """Starts collecting stage timings for the current request; returns the token to reset the context."""
+    return _stage_timings.set({})
+
+
+def end_request_timings(token: Token) -> Dict[str, float]:
+    """Stops collecting and returns the durations recorded since start_request_timings."""
+    timings = _stage_timings.get() or {}
+    _stage_timings.reset(token)
+    return timings
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Times a block as one stage: the duration goes to the stage histogram and,
+    inside a request, to its Server-Timing header, where durations of repeated
+    stages add up.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_DURATION.observe(elapsed, name)
+        timings = _stage_timings.get()
+        if timings is not None:
+            with _timings_lock:
+                timings[name] = timings.get(name, 0.0) + elapsed * 1000
+
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    """Formats stage durations as a Server-Timing header value."""
+    return ", ".join(f"{name};dur={duration:.2f}" for name, duration in timings.items())
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """Parses a Server-Timing header value into stage durations in milliseconds."""
+    timings = {}
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if name and key == "dur":
+                try:
+                    timings[name] = float(value)
+                except ValueError:
+                    pass
+    return timings
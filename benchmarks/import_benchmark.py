@@ -0,0 +1,118 @@
+"""
+Import-time budget of an API worker.
+
+Usage:
+    python -m benchmarks.import_benchmark [--module app.main] [--runs 5]
+        [--max-seconds 3] [--max-rss-mb 150] [--top 15] [--json]
+
+Imports the module in fresh interpreters, as each uvicorn worker does, and
+reports the median import time, the peak RSS and the modules with the
+highest self import time (from python -X importtime).
+
+Provider SDKs, the Chroma client and the document loaders must only be
+imported when first used. The command exits with status 1 when one of
+them is loaded at import time or when the time or memory budget is
+exceeded. tests/test_import_time.py checks the time budget and the lazy
+imports as part of the test suite.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Tuple
+
+# Packages that must stay out of the import of app.main
+LAZY_MODULES = [
+    "chromadb",
+    "langchain_chroma",
+    "langchain_openai",
+    "langchain_anthropic",
+    "langchain_google_genai",
+    "langchain_ollama",
+    "langchain_community",
+    "unstructured",
+    "pdfminer",
+    "sentence_transformers",
+]
+
+CHILD = """
+import importlib, json, resource, sys, time
+started = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - started
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+print(json.dumps({"seconds": seconds, "rss_mb": rss_mb, "modules": sorted(sys.modules)}))
+"""
+
+
+def measure(module: str) -> Dict[str, Any]:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, module], capture_output=True, text=True, check=True, env=os.environ.copy()
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int) -> List[Tuple[str, float]]:
+    """Modules with the highest self import time, in milliseconds."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True
+    ).stderr
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        timings.append((name.strip(), int(self_us) / 1000))
+    return sorted(timings, key=lambda item: item[1], reverse=True)[:top]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure the import time and memory of an API worker.")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=3.0, help="Budget for the median import time")
+    parser.add_argument("--max-rss-mb", type=float, default=150.0, help="Budget for the peak RSS after import")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    seconds = statistics.median(run["seconds"] for run in runs)
+    rss_mb = statistics.median(run["rss_mb"] for run in runs)
+    loaded = set(runs[0]["modules"])
+    eager = [name for name in LAZY_MODULES if name in loaded]
+    slowest = slowest_imports(args.module, args.top)
+
+    failures = []
+    if seconds > args.max_seconds:
+        failures.append(f"import took {seconds:.2f}s, budget {args.max_seconds}s")
+    if rss_mb > args.max_rss_mb:
+        failures.append(f"RSS after import is {rss_mb:.0f} MB, budget {args.max_rss_mb} MB")
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+
+    if args.json:
+        print(json.dumps({
+            "module": args.module,
+            "seconds": round(seconds, 3),
+            "rss_mb": round(rss_mb, 1),
+            "modules_loaded": len(loaded),
+            "eager_lazy_modules": eager,
+            "slowest_imports_ms": dict(slowest),
+            "failures": failures,
+        }, indent=2))
+    else:
+        print(f"{args.module}: {seconds:.2f}s median over {args.runs} runs, {rss_mb:.0f} MB RSS, {len(loaded)} modules")
+        print(f"{'module':<60}{'self ms':>10}")
+        for name, ms in slowest:
+            print(f"{name:<60}{ms:>10.1f}")
+        for failure in failures:
+            print(f"OVER BUDGET {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
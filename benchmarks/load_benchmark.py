@@ -0,0 +1,242 @@
+"""
+Load benchmark for /chat and /chat/delia with per-stage latencies.
+
+Usage:
+    python -m benchmarks.load_benchmark [--base-url http://localhost:8000] [--concurrency 1 8 32]
+        [--requests 200] [--corpus questions.jsonl] [--output results.json]
+        [--baseline previous.json --max-regression 0.1]
+
+Replays a query corpus against a running server at each concurrency level
+and reports requests per second and client latency p50/p95/p99 for each
+endpoint. It also reports the same percentiles for every server stage
+(auth, embed, retrieve, rerank, prompt, generate, postprocess, coalesced, total), read from
+the Server-Timing header of each response.
+
+The corpus defaults to the chat and DELIA requests of the Postman
+collection. A JSONL corpus has one object per line:
+{"endpoint": "chat" | "delia", "question": "...", "user_level": "basic"}.
+Requests answered by the answer cache, or that joined an identical
+request already in flight, report no generate stage and are counted as
+cache hits; to measure the whole pipeline on every request, start the
+server with ANSWER_CACHE_ENABLED=false COALESCE_REQUESTS=false. Requests turned away
+with 429 by admission control are counted apart from errors; all requests
+come from one user, so raise RATE_LIMIT_BURST and LLM_MAX_WAITING_PER_USER
+or set RATE_LIMIT_ENABLED=false to measure throughput.
+
+To measure the application without an LLM or embedding service, start the
+server with the stub provider:
+    LLM_PROVIDER=stub STUB_LLM_FIRST_TOKEN_MS=200 uvicorn app.main:app
+
+Results are written as JSON with --output. With --baseline, p95 values
+are compared against an earlier run, and the command exits with status 1
+when one regressed by more than --max-regression.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from app.utils.stats import percentile
+from app.utils.timing import parse_server_timing
+
+POSTMAN_COLLECTION = Path(__file__).resolve().parent.parent / "postman" / "RAG_App_collection.json"
+
+ENDPOINTS = {"chat": "/api/v1/chat/", "delia": "/api/v1/chat/delia"}
+
+STAGES = ["auth", "embed", "retrieve", "rerank", "prompt", "generate", "postprocess", "coalesced", "total"]
+
+
+def load_postman_corpus(path: Path) -> List[Dict[str, Any]]:
+    """Extracts the chat and DELIA request bodies of a Postman collection."""
+    corpus = []
+
+    def walk(items: List[Dict[str, Any]]) -> None:
+        for item in items:
+            if "item" in item:
+                walk(item["item"])
+                continue
+            request = item.get("request", {})
+            url = request.get("url")
+            url = url if isinstance(url, str) else (url or {}).get("raw", "")
+            raw = (request.get("body") or {}).get("raw")
+            if not raw:
+                continue
+            endpoint = "delia" if url.rstrip("/").endswith("/chat/delia") else "chat" if url.rstrip("/").endswith("/chat") else None
+            if endpoint:
+                corpus.append({"endpoint": endpoint, **json.loads(raw)})
+
+    walk(json.loads(path.read_text(encoding="utf-8"))["item"])
+    return corpus
+
+
+def load_jsonl_corpus(path: Path) -> List[Dict[str, Any]]:
+    corpus = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            entry = json.loads(line)
+            if entry.get("question"):
+                corpus.append({"endpoint": entry.get("endpoint", "chat"), **entry})
+    return corpus
+
+
+def percentiles(samples: List[float]) -> Optional[Dict[str, float]]:
+    if not samples:
+        return None
+    return {f"p{pct}": round(percentile(samples, pct), 2) for pct in (50, 95, 99)}
+
+
+def login(base_url: str, username: str, password: str) -> tuple[str, float]:
+    started = time.perf_counter()
+    response = requests.post(
+        f"{base_url}/api/v1/auth/token",
+        data={"username": username, "password": password},
+        timeout=30,
+    )
+    response.raise_for_status()
+    return response.json()["access_token"], (time.perf_counter() - started) * 1000
+
+
+def run_level(base_url: str, token: str, corpus: List[Dict[str, Any]], concurrency: int,
+              requests_count: int, timeout: float) -> List[Dict[str, Any]]:
+    local = threading.local()
+    samples: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    lock = threading.Lock()
+
+    def one(n: int) -> None:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+            session.headers["Authorization"] = f"Bearer {token}"
+        entry = corpus[n % len(corpus)]
+        body = {key: value for key, value in entry.items() if key in ("question", "user_level")}
+
+        started = time.perf_counter()
+        try:
+            response = session.post(base_url + ENDPOINTS[entry["endpoint"]], json=body, timeout=timeout)
+            ok = response.status_code == 200 and not response.json().get("error")
+            limited = response.status_code == 429
+            stages = parse_server_timing(response.headers.get("Server-Timing", ""))
+        except (requests.RequestException, ValueError):
+            ok, limited, stages = False, False, {}
+        sample = {
+            "latency_ms": (time.perf_counter() - started) * 1000, "ok": ok, "limited": limited, "stages": stages,
+        }
+        with lock:
+            samples[entry["endpoint"]].append(sample)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests_count)))
+    elapsed = time.perf_counter() - started
+
+    results = []
+    for endpoint, endpoint_samples in sorted(samples.items()):
+        succeeded = [s for s in endpoint_samples if s["ok"]]
+        results.append({
+            "endpoint": endpoint,
+            "concurrency": concurrency,
+            "requests": len(endpoint_samples),
+            "errors": sum(1 for s in endpoint_samples if not s["ok"] and not s["limited"]),
+            "rate_limited": sum(1 for s in endpoint_samples if s["limited"]),
+            "cache_hits": sum(1 for s in succeeded if "generate" not in s["stages"]),
+            "rps": round(len(succeeded) / elapsed, 2),
+            "latency_ms": percentiles([s["latency_ms"] for s in succeeded]),
+            "stages_ms": {
+                name: percentiles([s["stages"][name] for s in succeeded if name in s["stages"]])
+                for name in STAGES
+            },
+        })
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], max_regression: float) -> List[str]:
+    """Lists the p95 latencies that grew by more than max_regression over the baseline."""
+    previous = {(r["endpoint"], r["concurrency"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["endpoint"], result["concurrency"]))
+        if before is None:
+            continue
+        pairs = [("latency", result["latency_ms"], before["latency_ms"])]
+        pairs += [(name, result["stages_ms"].get(name), before["stages_ms"].get(name)) for name in STAGES]
+        for name, now, then in pairs:
+            if now and then and then["p95"] > 0 and now["p95"] > then["p95"] * (1 + max_regression):
+                regressions.append(
+                    f"{result['endpoint']} x{result['concurrency']} {name} p95: {then['p95']} -> {now['p95']} ms"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test the chat endpoints.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--username", default="testuser")
+    parser.add_argument("--password", default="testpassword")
+    parser.add_argument("--corpus", type=Path, help="JSONL query corpus (defaults to the Postman collection)")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Results of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.1, help="Allowed p95 growth over the baseline")
+    args = parser.parse_args()
+
+    corpus = load_jsonl_corpus(args.corpus) if args.corpus else load_postman_corpus(POSTMAN_COLLECTION)
+    corpus = [entry for entry in corpus if entry["endpoint"] in args.endpoints]
+    if not corpus:
+        print("The corpus has no questions for the selected endpoints", file=sys.stderr)
+        return 2
+
+    base_url = args.base_url.rstrip("/")
+    token, login_ms = login(base_url, args.username, args.password)
+
+    results = []
+    for concurrency in args.concurrency:
+        results.extend(run_level(base_url, token, corpus, concurrency, args.requests, args.timeout))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "base_url": base_url,
+            "corpus_size": len(corpus),
+            "requests_per_level": args.requests,
+            "login_ms": round(login_ms, 2),
+        },
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    print(f"{'endpoint':<8}{'conc':>5}{'reqs':>6}{'errs':>6}{'429':>6}{'cached':>7}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        latency = r["latency_ms"] or {"p50": "-", "p95": "-", "p99": "-"}
+        print(
+            f"{r['endpoint']:<8}{r['concurrency']:>5}{r['requests']:>6}{r['errors']:>6}{r.get('rate_limited', 0):>6}{r['cache_hits']:>7}{r['rps']:>8}"
+            f"{latency['p50']:>10}{latency['p95']:>10}{latency['p99']:>10}"
+        )
+        for name in STAGES:
+            stage = r["stages_ms"][name]
+            if stage:
+                print(f"{'':<8}{name:>38}{stage['p50']:>10}{stage['p95']:>10}{stage['p99']:>10}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+        regressions = compare(results, baseline, args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,119 @@
+"""
+Time to first token with and without the provider's prompt cache.
+
+Usage:
+    python -m benchmarks.prompt_cache_benchmark [--requests 10] [--json]
+
+Sends the DELIA prompt to the configured LLM_PROVIDER with a fixed context
+and a different question each time, and measures how long the first
+streamed token takes. The "cold" run puts a random marker at the start of
+the system prompt so no request shares a prefix with an earlier one; the
+"cached" run sends the system message exactly as the DELIA chain does.
+Chat models that report it also give the prompt tokens read from the cache.
+
+It first prints the estimated size of the static system prompt: Anthropic
+does not cache prefixes under 1024 tokens (2048 on Haiku), in which case
+both runs should come out the same.
+
+This calls the real provider and is billed like any other request.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+from typing import Any, Dict, List
+
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.rag.chain import delia_system_template, delia_template
+from app.rag.context import get_token_counter
+from app.rag.llm_factory import get_llm_router
+from app.utils.stats import percentile
+
+CONTEXT = (
+    "[1] EDSL_User_Guide.pdf (p. 42)\n"
+    "EVALUATE WHEN evalúa una lista de condiciones en orden y ejecuta la primera rama verdadera. "
+    "Use IsNull(LDS.Child.Characteristic) antes de operar con valores que pueden estar vacíos."
+)
+# Shortest prefix Anthropic caches on Sonnet and Opus models; Haiku needs 2048
+ANTHROPIC_MIN_CACHE_TOKENS = 1024
+
+QUESTIONS = [
+    "¿Cómo compruebo si LDS.Child.Characteristic es nulo?",
+    "Escribe un EVALUATE WHEN con tres ramas para el segmento de riesgo.",
+    "¿Qué precedencia tienen And y Or en EDSL?",
+    "¿Cómo añado un elemento a un array dinámico?",
+    "Corrige: IF Score > 600 THEN Decision = 'Accept'",
+]
+
+
+def build_prompt(cold: bool) -> ChatPromptTemplate:
+    system = delia_system_template.strip()
+    if cold:
+        system = f"[{uuid.uuid4()}]\n{system}"
+    return ChatPromptTemplate.from_messages([SystemMessage(content=system), ("human", delia_template)])
+
+
+async def first_token(cold: bool, question: str) -> Dict[str, Any]:
+    messages = build_prompt(cold).invoke({"context": CONTEXT, "question": question})
+    started = time.perf_counter()
+    ttft = None
+    usage = None
+    async for chunk in get_llm_router().astream(messages):
+        text = chunk if isinstance(chunk, str) else chunk.content
+        if ttft is None and text:
+            ttft = (time.perf_counter() - started) * 1000
+        usage = getattr(chunk, "usage_metadata", None) or usage
+    details = (usage or {}).get("input_token_details") or {}
+    return {"ttft_ms": ttft, "cache_read_tokens": details.get("cache_read")}
+
+
+async def run(cold: bool, requests: int) -> Dict[str, Any]:
+    samples = []
+    # Warm-up request that writes the cache, not counted
+    if not cold:
+        await first_token(cold, QUESTIONS[-1])
+    for i in range(requests):
+        samples.append(await first_token(cold, QUESTIONS[i % len(QUESTIONS)]))
+    ttfts = [s["ttft_ms"] for s in samples if s["ttft_ms"] is not None]
+    cache_reads = [s["cache_read_tokens"] for s in samples if s["cache_read_tokens"] is not None]
+    return {
+        "mode": "cold" if cold else "cached",
+        "requests": requests,
+        "p50_ms": round(statistics.median(ttfts), 1) if ttfts else None,
+        "p95_ms": round(percentile(ttfts, 95), 1) if ttfts else None,
+        "cache_read_tokens": round(statistics.mean(cache_reads)) if cache_reads else None,
+    }
+
+
+async def amain(args) -> List[Dict[str, Any]]:
+    return [await run(True, args.requests), await run(False, args.requests)]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark time to first token with prompt caching.")
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    system_tokens = get_token_counter()(delia_system_template.strip())
+    print(f"Static system prompt: {len(delia_system_template.strip())} chars, ~{system_tokens} tokens "
+          f"(Anthropic caches prefixes of {ANTHROPIC_MIN_CACHE_TOKENS}+ tokens)", file=sys.stderr)
+    results = asyncio.run(amain(args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"{'mode':<8}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'cache read':>12}")
+    for r in results:
+        print(f"{r['mode']:<8}{r['requests']:>10}{r['p50_ms']!s:>10}{r['p95_ms']!s:>10}{r['cache_read_tokens']!s:>12}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,194 @@
+"""
+Reranking cost vs. prompt size.
+
+Usage:
+    python -m benchmarks.rerank_benchmark [--candidates 10 20 50] [--top-n 5] [--cross-encoder]
+                                          [--dataset labelled.jsonl] [--json]
+
+Each trial takes a labelled question and builds a candidate list as a weak
+first-stage retriever would return it: the relevant chunk at a random rank
+among hard distractors, which share the question's EDSL keywords and
+identifiers but answer something else, padded with generic chunks from the
+same domain. For each candidate count it reports the reranker latency, how
+often the relevant chunk survives into the top N, and the prompt tokens
+saved by sending the top N instead of every candidate.
+
+The built-in questions are a small hand-labelled sample; --dataset takes a
+JSONL file with one {"question", "relevant", "distractors": [...]} object
+per line, e.g. labelled from the real corpus, whose chunks are used instead.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Any, Dict, List
+
+from langchain_core.documents import Document
+
+from app.rag.context import get_token_counter
+from app.rag.rerank import CrossEncoderReranker, LexicalOverlapReranker, Reranker
+from app.utils.stats import percentile
+
+SAMPLES: List[Dict[str, Any]] = [
+    {
+        "question": "¿Cómo uso EVALUATE WHEN con IsNull sobre LDS.Child.Characteristic?",
+        "relevant": (
+            "Para comprobar valores ausentes use EVALUATE WHEN IsNull(LDS.Child.Characteristic) THEN ... "
+            "IsNull devuelve verdadero cuando la característica del hijo no tiene valor, y la rama "
+            "WHEN se evalúa por cada hijo de LDS.Child."
+        ),
+        "distractors": [
+            "EVALUATE WHEN admite varias ramas; la primera condición verdadera determina el resultado "
+            "y OTHERWISE cubre el resto de los casos de la estrategia.",
+            "LDS.Child.Characteristic se declara en el diccionario de datos con su tipo y su longitud; "
+            "los cambios de tipo exigen recompilar la estrategia.",
+            "IsNull y IsMissing no son equivalentes: IsMissing comprueba si el atributo existe en el "
+            "registro de entrada, IsNull si su valor está vacío.",
+            "Las características de LDS.Child se agregan con Sum, Max o Count antes de usarlas en una "
+            "regla del registro padre.",
+            "Use EVALUATE WHEN dentro de un segmento para asignar la puntuación parcial de cada "
+            "característica del cliente.",
+        ],
+    },
+    {
+        "question": "¿Qué devuelve Count sobre LDS.Child cuando no hay hijos?",
+        "relevant": (
+            "Count(LDS.Child) devuelve 0 cuando el registro no tiene hijos; a diferencia de Sum y Max, "
+            "nunca devuelve un valor nulo, por lo que no hace falta protegerlo con IsNull."
+        ),
+        "distractors": [
+            "Sum(LDS.Child.Amount) devuelve nulo cuando ningún hijo tiene importe; combínelo con "
+            "IsNull para usar un valor por defecto.",
+            "LDS.Child es una colección repetida; el número máximo de hijos se configura en el "
+            "diccionario de datos.",
+            "Max y Min sobre LDS.Child ignoran los hijos cuyo valor está vacío.",
+            "Count de caracteres de una cadena se obtiene con Length, no con Count.",
+            "Los hijos de LDS.Child se recorren en el orden en que llegan en el registro de entrada.",
+        ],
+    },
+    {
+        "question": "¿Cómo se redondea una puntuación a dos decimales en EDSL?",
+        "relevant": (
+            "Round(Score, 2) redondea la puntuación a dos decimales con redondeo al par más cercano; "
+            "para truncar use Trunc(Score, 2)."
+        ),
+        "distractors": [
+            "La puntuación del segmento es la suma de las puntuaciones parciales de cada "
+            "característica evaluada.",
+            "Los decimales de un atributo numérico se fijan en su definición y se validan al cargar "
+            "el registro.",
+            "Score se inicializa a cero al comienzo de cada segmento de la estrategia.",
+            "Format(Score, '0.00') convierte la puntuación en texto con dos decimales para mostrarla "
+            "en el informe.",
+            "La puntuación final se compara con los puntos de corte de la tabla de decisión.",
+        ],
+    },
+    {
+        "question": "¿Cómo declaro una variable local de tipo fecha en una regla EDSL?",
+        "relevant": (
+            "Declare las variables locales al comienzo de la regla con LOCAL nombre AS DATE; su valor "
+            "solo existe durante la ejecución de esa regla."
+        ),
+        "distractors": [
+            "Las variables globales se declaran en la estrategia y conservan su valor entre reglas.",
+            "DateDiff(FechaInicio, FechaFin, 'D') devuelve la diferencia en días entre dos fechas.",
+            "Un atributo de tipo fecha del registro de entrada se lee con el formato definido en el "
+            "diccionario de datos.",
+            "Las reglas se ejecutan en el orden en que aparecen en el segmento.",
+            "Today() devuelve la fecha de ejecución de la estrategia.",
+        ],
+    },
+]
+
+FILLER = (
+    "estrategia segmento puntuación regla variable cliente modelo decisión tabla riesgo "
+    "crédito política límite producto canal oferta evaluación atributo valor resultado"
+).split()
+
+
+def load_dataset(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_candidates(sample: Dict[str, Any], samples: List[Dict[str, Any]], count: int, rng: random.Random) -> List[Document]:
+    # Hard distractors first, then chunks relevant to other questions, then generic text
+    pool = list(sample["distractors"])
+    others = [s["relevant"] for s in samples if s is not sample] + [d for s in samples if s is not sample for d in s["distractors"]]
+    rng.shuffle(others)
+    pool += others
+    texts = pool[:count - 1]
+    while len(texts) < count - 1:
+        texts.append(" ".join(rng.choices(FILLER, k=rng.randint(20, 60))))
+    rng.shuffle(texts)
+    candidates = [Document(page_content=text, id=f"d{i}") for i, text in enumerate(texts)]
+    candidates.insert(rng.randrange(count), Document(page_content=sample["relevant"], id="relevant"))
+    return candidates
+
+
+def run(
+    reranker: Reranker, samples: List[Dict[str, Any]], candidates: int, top_n: int, iterations: int, count_tokens
+) -> Dict[str, float]:
+    rng = random.Random(candidates)
+    latencies, hits, tokens_all, tokens_top = [], 0, [], []
+    for i in range(iterations):
+        sample = samples[i % len(samples)]
+        documents = make_candidates(sample, samples, candidates, rng)
+        started = time.perf_counter()
+        kept = reranker.rerank(sample["question"], documents, top_n)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += any(doc.id == "relevant" for doc in kept)
+        tokens_all.append(sum(count_tokens(doc.page_content) for doc in documents))
+        tokens_top.append(sum(count_tokens(doc.page_content) for doc in kept))
+    return {
+        "candidates": candidates,
+        "top_n": top_n,
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "hit_rate": round(hits / iterations, 3),
+        "baseline_hit_rate": round(min(top_n, candidates) / candidates, 3),
+        "prompt_tokens_all": round(statistics.mean(tokens_all)),
+        "prompt_tokens_top_n": round(statistics.mean(tokens_top)),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the reranking stage.")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 20, 50])
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--cross-encoder", action="store_true", help="Also benchmark the cross-encoder")
+    parser.add_argument("--model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    parser.add_argument("--dataset", help="JSONL file of labelled questions to use instead of the built-in sample")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    samples = load_dataset(args.dataset) if args.dataset else SAMPLES
+
+    rerankers: Dict[str, Reranker] = {"lexical": LexicalOverlapReranker()}
+    if args.cross_encoder:
+        rerankers["cross-encoder"] = CrossEncoderReranker(args.model)
+
+    count_tokens = get_token_counter()
+    results = [
+        {"reranker": name, **run(reranker, samples, count, args.top_n, args.iterations, count_tokens)}
+        for name, reranker in rerankers.items()
+        for count in args.candidates
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"{'reranker':<14}{'cands':>6}{'p50 ms':>9}{'p95 ms':>9}{'hit@N':>7}{'no rerank':>11}{'tokens all':>12}{'tokens N':>10}")
+    for r in results:
+        print(
+            f"{r['reranker']:<14}{r['candidates']:>6}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['hit_rate']:>7}"
+            f"{r['baseline_hit_rate']:>11}{r['prompt_tokens_all']:>12}{r['prompt_tokens_top_n']:>10}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,150 @@
+"""
+LLM router behaviour against local stub providers.
+
+Usage:
+    python -m benchmarks.router_benchmark [--requests 200] [--hedge-after 0.15] [--json]
+
+Each stub answers after a random latency and fails at a given rate, so the
+router's choices can be checked without credentials or network. Scenarios:
+
+- "steady": a fast and a slow provider; traffic should settle on the fast one.
+- "outage": the fast provider fails every call; requests fall over to the
+  slow one and the fast one is taken out of rotation.
+- "tail": the fast provider has a heavy latency tail; with hedging the
+  backup answers those calls and the end-to-end p95 drops.
+
+For each scenario it reports end-to-end p50/p95, failed requests and the
+share of answers per provider.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from app.rag.router import LLMRouter
+from app.utils.stats import percentile
+
+
+class StubProvider(Runnable[Any, str]):
+    """Answers with its own name after a sampled latency, failing at error_rate."""
+
+    def __init__(self, name: str, latency: float, error_rate: float = 0.0,
+                 tail_rate: float = 0.0, tail_latency: float = 0.0, seed: int = 0):
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.rng = random.Random(seed)
+
+    def _delay(self) -> float:
+        if self.rng.random() < self.tail_rate:
+            return self.tail_latency
+        return self.rng.uniform(0.8, 1.2) * self.latency
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> str:
+        time.sleep(self._delay())
+        if self.rng.random() < self.error_rate:
+            raise RuntimeError(f"{self.name} unavailable")
+        return self.name
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> str:
+        await asyncio.sleep(self._delay())
+        if self.rng.random() < self.error_rate:
+            raise RuntimeError(f"{self.name} unavailable")
+        return self.name
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[str]:
+        yield await self.ainvoke(input, config)
+
+
+SCENARIOS = {
+    "steady": lambda: {
+        "fast": StubProvider("fast", 0.05, seed=1),
+        "slow": StubProvider("slow", 0.20, seed=2),
+    },
+    "outage": lambda: {
+        "fast": StubProvider("fast", 0.05, error_rate=1.0, seed=1),
+        "slow": StubProvider("slow", 0.20, seed=2),
+    },
+    "tail": lambda: {
+        "fast": StubProvider("fast", 0.05, tail_rate=0.1, tail_latency=1.0, seed=1),
+        "slow": StubProvider("slow", 0.20, seed=2),
+    },
+}
+
+
+async def run(scenario: str, requests: int, concurrency: int, hedge_after: Optional[float], stream: bool) -> Dict[str, Any]:
+    router = LLMRouter(SCENARIOS[scenario](), hedge_after=hedge_after)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, answers, failures = [], Counter(), 0
+
+    async def one() -> None:
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if stream:
+                    answer = "".join([chunk async for chunk in router.astream("question")])
+                else:
+                    answer = await router.ainvoke("question")
+            except Exception:
+                failures += 1
+                return
+            latencies.append((time.perf_counter() - started) * 1000)
+            answers[answer] += 1
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return {
+        "scenario": scenario,
+        "mode": "stream" if stream else "invoke",
+        "hedge_after": hedge_after,
+        "p50_ms": round(statistics.median(latencies), 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 1) if latencies else None,
+        "failures": failures,
+        "share": {name: round(count / requests, 3) for name, count in sorted(answers.items())},
+    }
+
+
+async def amain(args) -> List[Dict[str, Any]]:
+    results = []
+    for scenario in args.scenarios:
+        for hedge_after in (None, args.hedge_after):
+            for stream in (False, True):
+                results.append(await run(scenario, args.requests, args.concurrency, hedge_after, stream))
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the LLM router against stub providers.")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--hedge-after", type=float, default=0.15, help="Seconds before a hedged request")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(amain(args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"{'scenario':<10}{'mode':<8}{'hedge s':>8}{'p50 ms':>9}{'p95 ms':>9}{'failed':>8}  share")
+    for r in results:
+        share = ", ".join(f"{name} {value:.0%}" for name, value in r["share"].items())
+        print(
+            f"{r['scenario']:<10}{r['mode']:<8}{r['hedge_after']!s:>8}{r['p50_ms']!s:>9}"
+            f"{r['p95_ms']!s:>9}{r['failures']:>8}  {share}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
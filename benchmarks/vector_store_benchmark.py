@@ -0,0 +1,170 @@
+"""
+Vector store backends compared on the same corpus.
+
+Usage:
+    python -m benchmarks.vector_store_benchmark [--sizes 10000 100000] [--dim 768]
+        [--backends numpy-flat numpy-ivf chroma] [--chroma-host localhost] [--json]
+
+Builds a synthetic clustered corpus of normalized embeddings, so no
+embedding model is needed, and writes it into each backend in batches the
+size of the ingestion pipeline's. Queries are perturbed copies of corpus
+vectors. For each backend and corpus size it reports write throughput,
+query p50/p95 and recall@k against exact brute-force search.
+
+Backends: numpy flat, numpy IVF and embedded Chroma by default (select
+them with --backends); Chroma over HTTP when --chroma-host is given.
+Index time is how long the IVF partition takes to train after the writes.
+"""
+import argparse
+import json
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+import sys
+from typing import Any, Callable, Dict
+
+import numpy as np
+
+from app.db.numpy_store import NumpyVectorStore
+from app.utils.stats import percentile
+
+WRITE_BATCH_SIZE = 64
+
+
+def make_corpus(size: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=size)] + 0.5 * rng.standard_normal((size, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(corpus: np.ndarray, count: int, rng: np.random.Generator) -> np.ndarray:
+    queries = corpus[rng.integers(len(corpus), size=count)] + 0.3 * rng.standard_normal((count, corpus.shape[1])).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def numpy_backend(ivf: bool) -> Callable[[str], Any]:
+    def open_store(directory: str):
+        # Searched and written by vector only, so no embedding model
+        store = NumpyVectorStore(directory, ivf_min_rows=0 if ivf else 2 ** 62)
+
+        def search(vector, k):
+            return [doc.id for doc in store.similarity_search_by_vector(vector.tolist(), k)]
+
+        def ready(vector):
+            # Training of the IVF partition starts on the first search and runs in the background
+            store.similarity_search_by_vector(vector.tolist(), 1)
+            store.wait_for_index()
+
+        return store.upsert, search, ready, store.close
+    return open_store
+
+
+def chroma_backend(client_factory: Callable[[str], Any]) -> Callable[[str], Any]:
+    def open_store(directory: str):
+        client = client_factory(directory)
+        name = f"bench_{uuid.uuid4().hex[:8]}"
+        collection = client.create_collection(name, metadata={"hnsw:space": "cosine"})
+        search = lambda vector, k: collection.query(query_embeddings=[vector.tolist()], n_results=k, include=[])["ids"][0]
+        return collection.upsert, search, lambda vector: None, lambda: client.delete_collection(name)
+    return open_store
+
+
+def run(name: str, open_store, corpus: np.ndarray, queries: np.ndarray, k: int) -> Dict[str, Any]:
+    directory = tempfile.mkdtemp(prefix="vsbench_")
+    try:
+        upsert, search, ready, close = open_store(directory)
+        ids = [f"c{i}" for i in range(len(corpus))]
+
+        started = time.perf_counter()
+        for start in range(0, len(corpus), WRITE_BATCH_SIZE):
+            end = start + WRITE_BATCH_SIZE
+            upsert(ids=ids[start:end], embeddings=corpus[start:end].tolist(), documents=["x"] * len(ids[start:end]), metadatas=[{"source": "bench"}] * len(ids[start:end]))
+        write_seconds = time.perf_counter() - started
+
+        # Exact neighbours for recall
+        truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+        started = time.perf_counter()
+        ready(queries[0])
+        index_seconds = time.perf_counter() - started
+        search(queries[0], k)  # warm-up, e.g. mapping the file
+        latencies, recalls = [], []
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            found = search(query, k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            recalls.append(len({f"c{i}" for i in expected} & set(found)) / k)
+        close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "backend": name,
+        "chunks": len(corpus),
+        "writes_per_s": round(len(corpus) / write_seconds),
+        "index_s": round(index_seconds, 2),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        f"recall@{k}": round(statistics.mean(recalls), 3),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the vector store backends.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--backends", nargs="+", choices=["numpy-flat", "numpy-ivf", "chroma"],
+                        default=["numpy-flat", "numpy-ivf", "chroma"])
+    parser.add_argument("--chroma-host", help="Also benchmark a Chroma server at this host")
+    parser.add_argument("--chroma-port", type=int, default=8002)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    backends: Dict[str, Callable[[str], Any]] = {}
+    if "numpy-flat" in args.backends:
+        backends["numpy-flat"] = numpy_backend(ivf=False)
+    if "numpy-ivf" in args.backends:
+        backends["numpy-ivf"] = numpy_backend(ivf=True)
+    if "chroma" in args.backends or args.chroma_host:
+        try:
+            import chromadb
+        except ImportError:
+            print("chromadb is not installed; install it or leave chroma out of --backends", file=sys.stderr)
+            return 2
+        if "chroma" in args.backends:
+            backends["chroma"] = chroma_backend(lambda directory: chromadb.PersistentClient(
+                path=directory, settings=chromadb.Settings(anonymized_telemetry=False)
+            ))
+        if args.chroma_host:
+            backends["chroma-http"] = chroma_backend(lambda directory: chromadb.HttpClient(
+                host=args.chroma_host, port=args.chroma_port, settings=chromadb.Settings(anonymized_telemetry=False)
+            ))
+
+    results = []
+    for size in args.sizes:
+        rng = np.random.default_rng(size)
+        corpus = make_corpus(size, args.dim, clusters=max(8, size // 500), rng=rng)
+        queries = make_queries(corpus, args.queries, rng)
+        for name, open_store in backends.items():
+            results.append(run(name, open_store, corpus, queries, args.k))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    recall = f"recall@{args.k}"
+    print(f"{'backend':<13}{'chunks':>9}{'writes/s':>10}{'index s':>9}{'p50 ms':>9}{'p95 ms':>9}{recall:>11}")
+    for r in results:
+        print(
+            f"{r['backend']:<13}{r['chunks']:>9}{r['writes_per_s']:>10}{r['index_s']:>9}"
+            f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r[recall]:>11}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
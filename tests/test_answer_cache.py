@@ -0,0 +1,115 @@
+import asyncio
+
+from app.rag.answer_cache import AnswerCache, InMemoryCacheBackend, SQLiteCacheBackend, normalize_question
+
+
+class _Embeddings:
+    """Embeds a question as the counts of a few words, so related questions are close."""
+
+    WORDS = ["nulo", "valor", "dictionary", "data"]
+
+    async def aembed_query(self, text):
+        words = text.lower().split()
+        return [float(sum(word.strip("¿?") == w for word in words)) for w in self.WORDS]
+
+
+def _cache(backend=None, version="v1", **kwargs):
+    state = {"version": version}
+    cache = AnswerCache(
+        backend or InMemoryCacheBackend(100),
+        embeddings=_Embeddings(),
+        similarity_threshold=0.9,
+        version_provider=lambda: state["version"],
+        **kwargs,
+    )
+    return cache, state
+
+
+def test_normalization_keeps_case():
+    assert normalize_question("  ¿Cómo   uso IsNull? ") == "Cómo uso IsNull"
+    assert normalize_question("IsNull") != normalize_question("isnull")
+
+
+def test_exact_hit_after_normalization():
+    cache, _ = _cache()
+
+    async def main():
+        await cache.set("general", "¿Qué es un valor nulo?", {"answer": "a"})
+        return await cache.get("general", "  Qué es un valor   nulo ")
+
+    assert asyncio.run(main()) == {"answer": "a"}
+    assert cache.hits == {"exact": 1, "semantic": 0}
+
+
+def test_scopes_are_kept_apart():
+    cache, _ = _cache()
+
+    async def main():
+        await cache.set("delia", "¿Qué es un Data Dictionary?", {"response": "basic"}, "basic")
+        return (
+            await cache.get("delia", "Qué es un Data Dictionary", "basic"),
+            await cache.get("delia", "Qué es un Data Dictionary", "advanced"),
+        )
+
+    assert asyncio.run(main()) == ({"response": "basic"}, None)
+
+
+def test_semantic_tier_serves_general_questions_only():
+    cache, _ = _cache()
+
+    async def main():
+        await cache.set("general", "valor nulo", {"answer": "general"})
+        await cache.set("delia", "valor nulo", {"response": "delia"})
+        return (
+            await cache.get("general", "el valor nulo"),
+            await cache.get("delia", "el valor nulo"),
+        )
+
+    assert asyncio.run(main()) == ({"answer": "general"}, None)
+
+
+def test_distant_question_misses():
+    cache, _ = _cache()
+
+    async def main():
+        await cache.set("general", "valor nulo", {"answer": "a"})
+        return await cache.get("general", "data dictionary")
+
+    assert asyncio.run(main()) is None
+    assert cache.misses == 1
+
+
+def test_new_corpus_version_invalidates_entries():
+    backend = InMemoryCacheBackend(100)
+    cache, state = _cache(backend)
+
+    async def main():
+        await cache.set("general", "valor nulo", {"answer": "old"})
+        state["version"] = "v2"
+        return await cache.get("general", "valor nulo")
+
+    assert asyncio.run(main()) is None
+    # Entries of the old version are purged, not just hidden
+    assert backend.candidates("general\x1f\x1fv1") == []
+
+
+def test_expired_entries_miss():
+    cache, _ = _cache(ttl_seconds=-1)
+
+    async def main():
+        await cache.set("general", "valor nulo", {"answer": "a"})
+        return await cache.get("general", "valor nulo")
+
+    assert asyncio.run(main()) is None
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    writer, _ = _cache(SQLiteCacheBackend(path, 100))
+    reader, _ = _cache(SQLiteCacheBackend(path, 100))
+
+    async def main():
+        await writer.set("delia", "valor nulo", {"response": "r"}, "basic")
+        return await reader.get("delia", "valor nulo", "basic")
+
+    assert asyncio.run(main()) == {"response": "r"}
@@ -0,0 +1,130 @@
+import sqlite3
+from collections import Counter
+
+from langchain_core.documents import Document
+
+from app.db.catalog import DocumentCatalog
+from app.rag.chunking import assign_chunk_ids, chunk_ids
+
+
+def _chunks(*texts):
+    return [Document(page_content=text) for text in texts]
+
+
+def test_chunk_ids_depend_on_file_and_contents_only():
+    first = chunk_ids(_chunks("a", "b"), "file-hash")
+
+    assert chunk_ids(_chunks("a", "b"), "file-hash") == first
+    assert chunk_ids(_chunks("a", "b"), "other-file") != first
+    assert len(set(first)) == 2
+
+
+def test_repeated_text_gets_one_id_per_occurrence():
+    ids = chunk_ids(_chunks("same", "same"), "file-hash")
+
+    assert ids[0] != ids[1]
+
+
+def test_occurrences_are_counted_across_parts():
+    whole = chunk_ids(_chunks("same", "other", "same"), "file-hash")
+    seen = Counter()
+    parts = chunk_ids(_chunks("same", "other"), "file-hash", seen) + chunk_ids(_chunks("same"), "file-hash", seen)
+
+    assert parts == whole
+
+
+def test_assign_chunk_ids_sets_document_ids():
+    chunks = _chunks("a", "b")
+
+    ids = assign_chunk_ids(chunks, "file-hash")
+
+    assert [chunk.id for chunk in chunks] == ids
+
+
+def test_record_document_replaces_its_manifest(tmp_path):
+    catalog = DocumentCatalog(str(tmp_path / "catalog.sqlite3"))
+    catalog.record_document("manual.pdf", "hash-1", ["a", "b"], total_chars=10, size_bytes=100)
+    catalog.record_document("manual.pdf", "hash-2", ["b", "c"], total_chars=12, size_bytes=120)
+
+    assert catalog.get_chunk_ids("manual.pdf") == {"b", "c"}
+    document = catalog.get_document("manual.pdf")
+    assert (document["content_hash"], document["chunk_count"], document["total_chars"]) == ("hash-2", 2, 12)
+    assert catalog.stats()["total_chunks"] == 2
+
+
+def test_chunks_shared_by_identical_files(tmp_path):
+    catalog = DocumentCatalog(str(tmp_path / "catalog.sqlite3"))
+    catalog.record_document("manual.pdf", "hash", ["a", "b"])
+    catalog.record_document("copy of manual.pdf", "hash", ["a", "b"])
+
+    assert catalog.indexed_chunk_ids(["a", "b", "c"]) == {"a", "b"}
+    # Still referenced by the copy, so re-indexing the original must not delete them
+    assert catalog.indexed_chunk_ids(["a", "b"], exclude_source="manual.pdf") == {"a", "b"}
+    catalog.record_document("copy of manual.pdf", "other", ["c"])
+    assert catalog.indexed_chunk_ids(["a", "b"], exclude_source="manual.pdf") == set()
+
+
+def test_list_documents_pages_by_source(tmp_path):
+    catalog = DocumentCatalog(str(tmp_path / "catalog.sqlite3"))
+    for source in ["c.pdf", "a.pdf", "b.pdf"]:
+        catalog.record_document(source, "hash", [source])
+
+    page, cursor = catalog.list_documents(limit=2)
+    rest, last = catalog.list_documents(limit=2, cursor=cursor)
+
+    assert [d["source"] for d in page] == ["a.pdf", "b.pdf"]
+    assert [d["source"] for d in rest] == ["c.pdf"]
+    assert last is None
+
+
+def test_catalog_with_one_source_per_chunk_is_migrated(tmp_path):
+    path = str(tmp_path / "catalog.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE chunks (chunk_id TEXT PRIMARY KEY, source TEXT NOT NULL);
+        INSERT INTO chunks VALUES ('a', 'manual.pdf');
+        """
+    )
+    conn.close()
+
+    catalog = DocumentCatalog(path)
+    catalog.record_document("copy.pdf", "hash", ["a"])
+
+    assert catalog.get_chunk_ids("manual.pdf") == {"a"}
+    assert catalog.get_chunk_ids("copy.pdf") == {"a"}
+
+
+class _Collection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def count(self):
+        return len(self.rows)
+
+    def get(self, include, limit, offset=0):
+        page = self.rows[offset:offset + limit]
+        return {
+            "ids": [row[0] for row in page],
+            "metadatas": [{"source": row[1]} for row in page],
+            "documents": [row[2] for row in page],
+            "embeddings": [[0.0, 1.0, 0.0] for _ in page],
+        }
+
+
+def test_backfill_records_legacy_uploads_under_their_file_name(tmp_path, monkeypatch):
+    rows = [
+        ("a", "temp_docs/0f8fad5b-d9cb-469f-a165-70867728950e_manual.pdf", "text a"),
+        ("b", "temp_docs/0f8fad5b-d9cb-469f-a165-70867728950e_manual.pdf", "text b"),
+        ("c", "guide.txt", "text c"),
+    ]
+    monkeypatch.setattr("app.db.catalog.get_collection", lambda: _Collection(rows))
+    catalog = DocumentCatalog(str(tmp_path / "catalog.sqlite3"))
+
+    catalog.backfill_from_collection()
+
+    assert catalog.get_chunk_ids("manual.pdf") == {"a", "b"}
+    assert catalog.get_chunk_ids("guide.txt") == {"c"}
+    # An empty hash makes the next upload of each file re-index it
+    assert catalog.get_document("manual.pdf")["content_hash"] == ""
+    assert catalog.stats()["embedding_dimension"] == 3
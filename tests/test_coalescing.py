@@ -0,0 +1,138 @@
+import asyncio
+
+from app.rag.coalescing import SingleFlight, StreamFlight
+from app.rag.concurrency import ProviderBusy, current_tenant
+
+
+def _source(state, events=100):
+    async def source():
+        try:
+            for i in range(events):
+                await asyncio.sleep(0.001)
+                state["produced"] += 1
+                yield i
+        finally:
+            state["closed"] = True
+    return source
+
+
+async def _take(stream, n):
+    taken = []
+    async for event in stream:
+        taken.append(event)
+        if len(taken) == n:
+            break
+    await stream.aclose()
+    return taken
+
+
+def test_followers_share_the_leaders_result():
+    flights = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["answer"] * 5
+    assert len(calls) == 1
+    assert len(flights) == 0
+
+
+def test_followers_retry_when_the_leader_is_busy():
+    flights = SingleFlight("test")
+    tenants = []
+
+    async def work():
+        tenants.append(current_tenant.get())
+        await asyncio.sleep(0.01)
+        if len(tenants) == 1:
+            raise ProviderBusy("stub", "user_queue_full", 1)
+        return "answer"
+
+    async def call(user):
+        current_tenant.set(user)
+        try:
+            return await flights.do("key", work)
+        except ProviderBusy:
+            return "busy"
+
+    async def main():
+        return await asyncio.gather(*(call(f"user{i}") for i in range(4)))
+
+    # Only the user whose queue was full sees the error; the next one leads the retry
+    assert asyncio.run(main()) == ["busy", "answer", "answer", "answer"]
+    assert tenants == ["user0", "user1"]
+
+
+def test_every_subscriber_gets_every_event():
+    flights = StreamFlight("test")
+    state = {"produced": 0, "closed": False}
+
+    async def main():
+        return await asyncio.gather(*(_take(flights.stream("key", _source(state, 10)), 100) for _ in range(3)))
+
+    assert asyncio.run(main()) == [list(range(10))] * 3
+    assert state["produced"] == 10
+
+
+def test_source_is_cancelled_when_the_last_subscriber_leaves():
+    flights = StreamFlight("test")
+    state = {"produced": 0, "closed": False}
+
+    async def main():
+        taken = await asyncio.gather(
+            _take(flights.stream("key", _source(state)), 3),
+            _take(flights.stream("key", _source(state)), 5),
+        )
+        await asyncio.sleep(0.01)
+        return taken
+
+    assert [len(events) for events in asyncio.run(main())] == [3, 5]
+    assert state["closed"] and state["produced"] < 100
+    assert len(flights) == 0
+
+
+def test_joiner_leaving_before_the_leader_starts_does_not_cancel_it():
+    flights = StreamFlight("test")
+    state = {"produced": 0, "closed": False}
+
+    async def main():
+        leader = flights.stream("key", _source(state, 10))
+        joiner = flights.stream("key", _source(state, 10))
+        # The joiner comes and goes before the leader has asked for its first event
+        assert await _take(joiner, 1) == [0]
+        return await _take(leader, 100)
+
+    assert asyncio.run(main()) == list(range(10))
+
+
+def test_stream_followers_retry_when_the_leader_is_busy():
+    flights = StreamFlight("test")
+    tenants = []
+
+    def source():
+        async def events():
+            tenants.append(current_tenant.get())
+            await asyncio.sleep(0.01)
+            if len(tenants) == 1:
+                raise ProviderBusy("stub", "user_queue_full", 1)
+            yield "answer"
+        return events()
+
+    async def call(user):
+        current_tenant.set(user)
+        try:
+            return await _take(flights.stream("key", source), 100)
+        except ProviderBusy:
+            return "busy"
+
+    async def main():
+        return await asyncio.gather(*(call(f"user{i}") for i in range(3)))
+
+    assert asyncio.run(main()) == ["busy", ["answer"], ["answer"]]
+    assert tenants == ["user0", "user1"]
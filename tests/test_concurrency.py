@@ -0,0 +1,144 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.rag.concurrency import ProviderBusy, ProviderSemaphore
+
+
+async def _served_order(semaphore, calls):
+    """Queues calls, as (user, label), behind a held slot and returns the order in which they got one."""
+    order = []
+
+    async def call(user, label):
+        await semaphore.acquire(user)
+        order.append(label)
+        await asyncio.sleep(0)
+        semaphore.release()
+
+    await semaphore.acquire("holder")
+    tasks = []
+    for user, label in calls:
+        tasks.append(asyncio.ensure_future(call(user, label)))
+        await asyncio.sleep(0)
+    semaphore.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_limits_calls_in_flight():
+    semaphore = ProviderSemaphore("test", limit=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with semaphore:
+            peak = max(peak, semaphore.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak == 2
+    assert semaphore.in_flight == semaphore.waiting == 0
+
+
+def test_queued_users_take_turns():
+    semaphore = ProviderSemaphore("test", limit=1)
+    calls = [("ana", "ana 1"), ("ana", "ana 2"), ("ana", "ana 3"), ("luis", "luis 1")]
+
+    order = asyncio.run(_served_order(semaphore, calls))
+
+    # Luis queued last but waits behind only the first call of Ana
+    assert order == ["ana 1", "luis 1", "ana 2", "ana 3"]
+
+
+def test_weights_share_slots(monkeypatch):
+    monkeypatch.setattr("app.rag.concurrency.settings.LLM_USER_WEIGHTS", {"ana": 2.0})
+    semaphore = ProviderSemaphore("test", limit=1)
+    calls = [("ana", f"ana {i}") for i in range(1, 5)] + [("luis", f"luis {i}") for i in range(1, 3)]
+
+    order = asyncio.run(_served_order(semaphore, calls))
+
+    assert order == ["ana 1", "luis 1", "ana 2", "ana 3", "luis 2", "ana 4"]
+
+
+def test_full_user_queue_raises_provider_busy():
+    semaphore = ProviderSemaphore("test", limit=1, max_waiting_per_user=1)
+
+    async def main():
+        await semaphore.acquire("ana")
+        waiter = asyncio.ensure_future(semaphore.acquire("ana"))
+        await asyncio.sleep(0)
+        assert semaphore.rejection("ana") == "user_queue_full"
+        assert semaphore.rejection("luis") is None
+        with pytest.raises(ProviderBusy) as busy:
+            await semaphore.acquire("ana")
+        semaphore.release()
+        await waiter
+        semaphore.release()
+        return busy.value
+
+    busy = asyncio.run(main())
+    assert busy.reason == "user_queue_full"
+    assert busy.retry_after > 0
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    semaphore = ProviderSemaphore("test", limit=1)
+
+    async def main():
+        await semaphore.acquire("ana")
+        cancelled = asyncio.ensure_future(semaphore.acquire("luis"))
+        served = asyncio.ensure_future(semaphore.acquire("eva"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        semaphore.release()
+        await served
+        semaphore.release()
+
+    asyncio.run(main())
+    assert semaphore.in_flight == semaphore.waiting == 0
+
+
+def test_threads_and_tasks_share_the_slots():
+    semaphore = ProviderSemaphore("test", limit=2)
+    peak = 0
+    lock = threading.Lock()
+
+    def track():
+        nonlocal peak
+        with lock:
+            peak = max(peak, semaphore.in_flight)
+
+    def sync_call():
+        with semaphore:
+            track()
+            threading.Event().wait(0.01)
+
+    async def async_call():
+        async with semaphore:
+            track()
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(
+            *(asyncio.to_thread(sync_call) for _ in range(4)),
+            *(async_call() for _ in range(4)),
+        )
+
+    asyncio.run(main())
+    assert peak == 2
+    assert semaphore.in_flight == 0
+
+
+def test_sync_acquire_refuses_to_block_the_event_loop():
+    semaphore = ProviderSemaphore("test", limit=1)
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            semaphore.acquire_sync()
+
+    asyncio.run(main())
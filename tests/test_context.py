@@ -0,0 +1,66 @@
+from langchain_core.documents import Document
+
+from app.rag.context import ContextPacker
+
+
+def _count_words(text):
+    return len(text.split())
+
+
+def _chunk(text, source="manual.pdf", page=None):
+    metadata = {"source": f"docs/{source}"}
+    if page is not None:
+        metadata["page"] = page
+    return Document(page_content=text, metadata=metadata)
+
+
+def _words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+def test_passages_are_numbered_with_their_source():
+    packer = ContextPacker(1000, count_tokens=_count_words)
+
+    context = packer.pack([_chunk("EVALUATE WHEN", page=3), _chunk("IsNull", source="guide.txt")])
+
+    assert context == "[1] manual.pdf (p. 3)\nEVALUATE WHEN\n\n[2] guide.txt\nIsNull"
+
+
+def test_context_stays_within_the_budget():
+    packer = ContextPacker(300, count_tokens=_count_words)
+    chunks = [_chunk(_words(f"c{n}w", 100), source=f"{n}.pdf") for n in range(5)]
+
+    context = packer.pack(chunks)
+
+    assert _count_words(context) <= 300
+    # The best ranked chunks are packed first, the first that no longer fits is truncated
+    assert context.startswith("[1] 0.pdf")
+    assert "[3] 2.pdf" in context and "…" in context
+    assert "3.pdf" not in context
+
+
+def test_chunk_too_large_for_the_rest_of_the_budget_is_skipped():
+    packer = ContextPacker(130, count_tokens=_count_words)
+
+    context = packer.pack([_chunk(_words("a", 100), source="a.pdf"), _chunk(_words("b", 100), source="b.pdf")])
+
+    assert "b.pdf" not in context
+
+
+def test_near_duplicates_are_dropped():
+    packer = ContextPacker(1000, count_tokens=_count_words)
+    text = _words("w", 50)
+
+    context = packer.pack([_chunk(text, source="a.pdf"), _chunk(text + " extra", source="b.pdf")])
+
+    assert "b.pdf" not in context
+
+
+def test_overlapping_chunks_of_a_source_are_merged():
+    packer = ContextPacker(1000, count_tokens=_count_words)
+    first = _words("a", 30) + " " + _words("shared", 10)
+    second = _words("shared", 10) + " " + _words("b", 30)
+
+    context = packer.pack([_chunk(first), _chunk(second)])
+
+    assert context == "[1] manual.pdf\n" + _words("a", 30) + " " + _words("shared", 10) + " " + _words("b", 30)
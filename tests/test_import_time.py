@@ -0,0 +1,16 @@
+from benchmarks.import_benchmark import LAZY_MODULES, measure
+
+# app.main imports in about a second; the budget leaves room for slow CI machines
+MAX_IMPORT_SECONDS = 3.0
+
+
+def test_app_imports_within_budget():
+    run = min((measure("app.main") for _ in range(3)), key=lambda run: run["seconds"])
+
+    assert run["seconds"] < MAX_IMPORT_SECONDS
+
+
+def test_app_import_leaves_provider_sdks_unloaded():
+    loaded = set(measure("app.main")["modules"])
+
+    assert [name for name in LAZY_MODULES if name in loaded] == []
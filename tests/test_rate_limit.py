@@ -0,0 +1,48 @@
+from app.core.rate_limit import RateLimiter
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_then_reject_with_time_to_next_token():
+    clock = _Clock()
+    limiter = RateLimiter(rate_per_minute=60, burst=3, clock=clock)
+
+    assert [limiter.acquire("ana") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("ana") == 1.0
+
+
+def test_tokens_refill_over_time_up_to_burst():
+    clock = _Clock()
+    limiter = RateLimiter(rate_per_minute=60, burst=2, clock=clock)
+    limiter.acquire("ana")
+    limiter.acquire("ana")
+
+    clock.now = 1.0
+    assert limiter.acquire("ana") == 0.0
+    assert limiter.acquire("ana") > 0
+
+    clock.now = 100.0
+    assert [limiter.acquire("ana") for _ in range(3)][:2] == [0.0, 0.0]
+
+
+def test_users_have_their_own_buckets():
+    limiter = RateLimiter(rate_per_minute=60, burst=1, clock=_Clock())
+
+    assert limiter.acquire("ana") == 0.0
+    assert limiter.acquire("ana") > 0
+    assert limiter.acquire("luis") == 0.0
+
+
+def test_cost_takes_several_tokens_or_none():
+    limiter = RateLimiter(rate_per_minute=60, burst=5, clock=_Clock())
+
+    assert limiter.acquire("ana", cost=4) == 0.0
+    # Not enough left for the batch: nothing is taken and the wait covers the whole cost
+    assert limiter.acquire("ana", cost=4) == 3.0
+    assert limiter.acquire("ana") == 0.0
@@ -0,0 +1,34 @@
+from langchain_core.documents import Document
+
+from app.rag.retrieval import reciprocal_rank_fusion
+
+
+def _chunk(text, source="manual.pdf", id=None):
+    return Document(page_content=text, metadata={"source": source}, id=id)
+
+
+def test_chunk_in_both_rankings_is_merged():
+    # Dense results come back without ids, lexical results with them
+    dense = [_chunk("EVALUATE WHEN"), _chunk("LDS.Child"), _chunk("dense only")]
+    lexical = [_chunk("LDS.Child", id="b"), _chunk("lexical only", id="c"), _chunk("EVALUATE WHEN", id="a")]
+
+    fused = reciprocal_rank_fusion([dense, lexical], k=10)
+
+    texts = [doc.page_content for doc in fused]
+    assert len(texts) == len(set(texts)) == 4
+    # Found by both searches, so ahead of the chunks only one of them found
+    assert set(texts[:2]) == {"EVALUATE WHEN", "LDS.Child"}
+
+
+def test_same_text_from_different_sources_is_kept_apart():
+    fused = reciprocal_rank_fusion([[_chunk("shared", "a.pdf")], [_chunk("shared", "b.pdf")]], k=10)
+
+    assert [doc.metadata["source"] for doc in fused] == ["a.pdf", "b.pdf"]
+
+
+def test_keeps_top_k():
+    ranking = [_chunk(f"chunk {i}") for i in range(10)]
+
+    fused = reciprocal_rank_fusion([ranking], k=3)
+
+    assert [doc.page_content for doc in fused] == ["chunk 0", "chunk 1", "chunk 2"]
@@ -0,0 +1,116 @@
+import asyncio
+import contextlib
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from app.rag.router import LLMRouter
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _answer(text, delay=0.0):
+    async def call(_):
+        await asyncio.sleep(delay)
+        return text
+    return RunnableLambda(lambda _: text, afunc=call)
+
+
+def _failing():
+    def fail(_):
+        raise RuntimeError("provider down")
+
+    async def afail(_):
+        raise RuntimeError("provider down")
+    return RunnableLambda(fail, afunc=afail)
+
+
+def test_fails_over_to_the_next_provider():
+    router = LLMRouter({"router-test-a": _failing(), "router-test-b": _answer("b")})
+
+    assert router.invoke("question") == "b"
+    assert asyncio.run(router.ainvoke("question")) == "b"
+    assert router.stats()["router-test-a"]["error_rate"] == 1.0
+
+
+def test_raises_the_last_error_when_every_provider_fails():
+    router = LLMRouter({"router-test-a": _failing(), "router-test-b": _failing()})
+
+    with pytest.raises(RuntimeError):
+        router.invoke("question")
+
+
+def test_unhealthy_provider_is_tried_last_until_its_cooldown_ends():
+    clock = _Clock()
+    router = LLMRouter(
+        {"router-test-a": _failing(), "router-test-b": _answer("b")},
+        min_samples=2, max_error_rate=0.5, cooldown=30, clock=clock,
+    )
+    router.invoke("question")
+    router.invoke("question")
+
+    assert router.ranked() == ["router-test-b", "router-test-a"]
+    clock.now = 31
+    assert router.stats()["router-test-a"]["healthy"]
+
+
+def test_unmeasured_provider_is_sampled_then_the_faster_one_leads():
+    clock = _Clock()
+
+    def provider(name, seconds):
+        def call(_):
+            clock.now += seconds
+            return name
+        return RunnableLambda(call)
+
+    router = LLMRouter({"router-test-slow": provider("slow", 2), "router-test-fast": provider("fast", 1)}, clock=clock)
+
+    assert [router.invoke("question") for _ in range(3)] == ["slow", "fast", "fast"]
+    assert router.ranked() == ["router-test-fast", "router-test-slow"]
+
+
+def test_hedged_call_returns_the_first_answer():
+    router = LLMRouter(
+        {"router-test-slow": _answer("slow", delay=1.0), "router-test-fast": _answer("fast")},
+        hedge_after=0.01,
+    )
+
+    async def main():
+        started = asyncio.get_running_loop().time()
+        answer = await router.ainvoke("question")
+        return answer, asyncio.get_running_loop().time() - started
+
+    answer, elapsed = asyncio.run(main())
+    assert answer == "fast"
+    assert elapsed < 0.5
+
+
+def test_stream_fails_over_before_the_first_chunk():
+    router = LLMRouter({"router-test-a": _failing(), "router-test-b": _answer("b")})
+
+    async def main():
+        return [chunk async for chunk in router.astream("question")]
+
+    assert asyncio.run(main()) == ["b"]
+    assert list(router.stream("question")) == ["b"]
+
+
+def test_failed_sync_acquire_records_no_latency(monkeypatch):
+    @contextlib.contextmanager
+    def semaphore(name):
+        if name == "router-test-a":
+            raise RuntimeError("acquire_sync would block the event loop")
+        yield
+
+    monkeypatch.setattr("app.rag.router.get_provider_semaphore", semaphore)
+    router = LLMRouter({"router-test-a": _answer("a"), "router-test-b": _answer("b")})
+
+    assert router.invoke("question") == "b"
+    assert list(router.stream("question")) == ["b"]
+    assert router.stats()["router-test-a"]["calls"] == 0
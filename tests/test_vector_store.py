@@ -0,0 +1,83 @@
+import pytest
+
+from app.db import vector_store
+from app.db.vector_store import (
+    NumpyBackend, _read_pending_drops, _write_pending_drops, get_collection, reset_collection,
+    sweep_dropped_collections,
+)
+
+
+class _LexicalIndex:
+    def clear(self):
+        pass
+
+
+class _Timer:
+    def __init__(self, *args, **kwargs):
+        self.daemon = False
+
+    def start(self):
+        pass
+
+
+@pytest.fixture
+def numpy_store(tmp_path, monkeypatch):
+    """Points the vector store module at an empty numpy backend under tmp_path."""
+    monkeypatch.setattr(vector_store, "ACTIVE_COLLECTION_FILE", tmp_path / "active_collection")
+    monkeypatch.setattr(vector_store, "PENDING_DROPS_FILE", tmp_path / "pending_drops.json")
+    monkeypatch.setattr(vector_store, "get_embeddings", lambda: None)
+    monkeypatch.setattr(vector_store, "get_lexical_index", lambda: _LexicalIndex())
+    monkeypatch.setattr(vector_store.threading, "Timer", _Timer)
+    monkeypatch.setattr(vector_store, "_backend", NumpyBackend(tmp_path / "numpy"))
+    monkeypatch.setattr(vector_store, "_vector_store", None)
+    monkeypatch.setattr(vector_store.settings, "VECTOR_STORE_DROP_GRACE_SECONDS", 60)
+    return tmp_path / "numpy"
+
+
+def _add_chunks(count):
+    get_collection().upsert(
+        ids=[f"chunk-{i}" for i in range(count)],
+        embeddings=[[1.0, float(i)] for i in range(count)],
+        documents=[f"text {i}" for i in range(count)],
+    )
+
+
+def test_reset_swaps_to_an_empty_collection(numpy_store):
+    _add_chunks(3)
+    old_name = get_collection().name
+
+    assert reset_collection() == 3
+
+    assert get_collection().count() == 0
+    assert get_collection().name != old_name
+    assert vector_store.ACTIVE_COLLECTION_FILE.read_text() == get_collection().name
+
+
+def test_replaced_collection_is_dropped_after_the_grace_period(numpy_store):
+    _add_chunks(3)
+    old_name = get_collection().name
+    reset_collection()
+
+    # Still within the grace period: queries that started before the swap can finish
+    sweep_dropped_collections()
+    assert old_name in _read_pending_drops()
+    assert (numpy_store / old_name).exists()
+
+    _write_pending_drops({old_name: 0})
+    sweep_dropped_collections()
+    assert _read_pending_drops() == {}
+    assert not (numpy_store / old_name).exists()
+
+
+def test_drops_interrupted_by_an_exit_are_swept_later(numpy_store):
+    _add_chunks(1)
+    old_name = get_collection().name
+    reset_collection()
+    # A new process finds the drop recorded and past due
+    _write_pending_drops({old_name: 0})
+    vector_store._vector_store = None
+
+    sweep_dropped_collections()
+
+    assert not (numpy_store / old_name).exists()
+    assert get_collection().count() == 0